@@ -2,7 +2,13 @@ from .conf import plugin, BasicConfig
 from .handlers import *
 from .db_sync import *
 from .validators import validate_data_with_models, repair_data_models
+from .reconcile import start_background_reconcile, stop_background_reconcile
+from .data_manager import build_search_indexes, migrate_record_encoding
+from .history import start_history_compaction, stop_history_compaction, flush_history
 from fastapi import APIRouter
+from contextlib import suppress
+from typing import Optional
+import asyncio
 
 from nekro_agent.core.logger import logger
 
@@ -10,27 +16,39 @@ __all__ = ["plugin"]
 
 config: BasicConfig = plugin.get_config(BasicConfig)
 
+# 校验完成后建立索引和转换编码的后台任务
+_after_reconcile_task: Optional["asyncio.Task[None]"] = None
+
 @plugin.mount_init_method()
 async def initialize_plugin():
-    """插件初始化函数，用于同步、验证和修复数据。"""
-    # 1. 验证数据模型
-    all_valid = await validate_data_with_models(plugin.store)
-    if all_valid:
-        logger.info("Attitude 插件数据模型验证通过。")
-    else:
-        logger.warning("Attitude 插件数据模型验证失败，尝试自动修复...")
-        # 3. 如果验证失败，尝试修复
-        repair_successful = await repair_data_models(plugin.store)
-        if repair_successful:
-            logger.info("Attitude 插件数据模型自动修复成功。")
-        else:
-            logger.error("Attitude 插件数据模型自动修复失败，插件初始化失败。")
-            raise RuntimeError("Attitude 插件数据模型自动修复失败，插件初始化失败。")
-
-    # 2. 同步数据
-    await SyncData(plugin.store)
-
-    
+    """插件初始化函数，在后台同步、验证和修复数据。
+
+    校验完成前插件即可使用，缺失或格式错误的数据会在访问时按需修复，
+    进度可通过 /status 路由查询。校验结束后在后台建立搜索索引，
+    并把记录转换为配置的存储编码，变更历史的清理同样在后台定期执行。
+    """
+    global _after_reconcile_task
+    reconcile_task = start_background_reconcile(plugin.store)
+    _after_reconcile_task = asyncio.create_task(_after_reconcile(reconcile_task))
+    start_history_compaction()
+
+
+async def _after_reconcile(reconcile_task: "asyncio.Task[None]") -> None:
+    await reconcile_task
+    await build_search_indexes(plugin.store)
+    await migrate_record_encoding(plugin.store)
+
+
+@plugin.mount_cleanup_method()
+async def cleanup_plugin():
+    """插件卸载时停止后台任务，并写入缓冲中的态度变更历史"""
+    await stop_background_reconcile()
+    if _after_reconcile_task is not None and not _after_reconcile_task.done():
+        _after_reconcile_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _after_reconcile_task
+    await flush_history()
+    await stop_history_compaction()
 
 
 @plugin.mount_router()
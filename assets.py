@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+@File: assets.py
+@Desc: WebUI 静态资源模块，启动时一次性加载并预压缩
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只提供 gzip
+    brotli = None
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web")
+
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+}
+
+# 页面本身每次都重新验证；脚本和样式的地址带有内容哈希，可以长期缓存
+PAGE_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 按优先级排列的可用压缩编码
+_ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 请求头，返回编码到权重的映射"""
+    weights: Dict[str, float] = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        weight = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[token.strip().lower()] = weight
+    return weights
+
+
+class StaticAsset:
+    """驻留内存的静态资源，包含原始内容和预先压缩的各编码版本"""
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants: Dict[str, bytes] = {"identity": body}
+        compressed: List[Tuple[str, bytes]] = [("gzip", gzip.compress(body, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            compressed.append(("br", brotli.compress(body, quality=11)))
+        for encoding, data in compressed:
+            # 压缩后没有变小的编码不值得提供
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+    def etag(self, encoding: str) -> str:
+        """不同编码的内容字节不同，各自使用独立的强 ETag"""
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest[:32]}{suffix}"'
+
+    def negotiate(self, accept_encoding: str) -> str:
+        """按 Accept-Encoding 选择要发送的编码"""
+        weights = _parse_accept_encoding(accept_encoding)
+        for encoding in _ENCODING_PREFERENCE:
+            if encoding in self.variants and weights.get(encoding, weights.get("*", 0.0)) > 0:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        """生成响应，客户端缓存有效时返回 304"""
+        encoding = self.negotiate(request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": self.etag(encoding),
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+        if if_none_match & {self.etag(variant) for variant in self.variants}:
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variants[encoding], media_type=self.media_type, headers=headers)
+
+
+def _read(filename: str) -> bytes:
+    with open(os.path.join(WEB_DIR, filename), "rb") as f:
+        return f.read()
+
+
+def load_assets() -> Dict[str, StaticAsset]:
+    """加载 WebUI 的全部静态资源
+
+    页面中引用的脚本和样式地址会附加内容哈希，资源更新后浏览器会请求新的地址。
+
+    Returns:
+        Dict[str, StaticAsset]: 文件名到静态资源的映射
+    """
+    assets: Dict[str, StaticAsset] = {}
+    page = _read("index.html")
+    for filename in ("style.css", "script.js"):
+        asset = StaticAsset(_read(filename), MEDIA_TYPES[os.path.splitext(filename)[1]], ASSET_CACHE_CONTROL)
+        assets[filename] = asset
+        for attribute in ("href", "src"):
+            page = page.replace(
+                f'{attribute}="{filename}"'.encode(),
+                f'{attribute}="{filename}?v={asset.digest[:12]}"'.encode(),
+            )
+    assets["index.html"] = StaticAsset(page, MEDIA_TYPES[".html"], PAGE_CACHE_CONTROL)
+    return assets
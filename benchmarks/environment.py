@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+@File: environment.py
+@Desc: 基准测试和负载模拟共用的运行环境：加载插件、初始化数据库、生成数据集
+"""
+
+import importlib.util
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional
+
+from tortoise import Tortoise
+
+import standins
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PLUGIN_MODULE = "nekro_plugin_attitude"
+# 批量插入测试数据时每批的行数
+SEED_BATCH_SIZE = 1000
+
+
+def load_plugin() -> ModuleType:
+    """在替身环境中以包的形式导入插件，不依赖插件目录的名称"""
+    if PLUGIN_MODULE in sys.modules:
+        return sys.modules[PLUGIN_MODULE]
+    standins.install()
+    spec = importlib.util.spec_from_file_location(
+        PLUGIN_MODULE, PLUGIN_DIR / "__init__.py", submodule_search_locations=[str(PLUGIN_DIR)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PLUGIN_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def git_commit() -> Optional[str]:
+    """当前插件目录的提交号，写入结果以便比较不同提交"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PLUGIN_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法计算已排序数据的分位数"""
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def init_database(db_url: str = "sqlite://:memory:") -> None:
+    """初始化替身数据库并建表"""
+    await Tortoise.init(db_url=db_url, modules={"models": ["standins"]})
+    await Tortoise.generate_schemas()
+
+
+async def close_database() -> None:
+    await Tortoise.close_connections()
+
+
+@dataclass
+class Dataset:
+    """生成的测试数据"""
+
+    users: int
+    user_keys: List[str] = field(default_factory=list)
+    # 每个会话规模对应的会话ID列表
+    chats: Dict[int, List[str]] = field(default_factory=dict)
+    # 每个会话的发言人
+    members: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def user_key(index: int) -> str:
+    return str(100000 + index)
+
+
+async def seed_dataset(users: int, participants: List[int], chats_per_size: int = 5, messages_per_participant: int = 2) -> Dataset:
+    """写入用户、群组和最近消息
+
+    Args:
+        users: 用户数量
+        participants: 需要生成的会话规模（每个会话的发言人数），不能超过用户数量
+        chats_per_size: 每种规模生成的会话数量
+        messages_per_participant: 每位发言人在会话中的最近消息数
+
+    Returns:
+        Dataset: 生成的用户ID和各规模的会话ID
+    """
+    dataset = Dataset(users=users)
+    # ID 为 1 的用户是 NekroAgent 的系统用户，插件会跳过它
+    await standins.DBUser.create(id=1, username="system", platform_userid="-1")
+    batch: List[standins.DBUser] = []
+    for index in range(users):
+        dataset.user_keys.append(user_key(index))
+        batch.append(standins.DBUser(username=f"用户{index}", platform_userid=user_key(index)))
+        if len(batch) >= SEED_BATCH_SIZE:
+            await standins.DBUser.bulk_create(batch)
+            batch = []
+    if batch:
+        await standins.DBUser.bulk_create(batch)
+
+    now = int(time.time())
+    messages: List[standins.DBChatMessage] = []
+    chat_index = 0
+    for size in participants:
+        dataset.chats[size] = []
+        for _ in range(chats_per_size):
+            chat_index += 1
+            group_id = f"group_{chat_index}"
+            chat_key = f"onebot_v11-{group_id}"
+            dataset.chats[size].append(chat_key)
+            await standins.DBChatChannel.create(
+                chat_key=chat_key, channel_id=group_id, channel_name=f"群组{chat_index}", channel_type="group"
+            )
+            # 不同会话的发言人错开，避免所有会话共用同一批用户的缓存
+            first = (chat_index * 7919) % max(1, users - size)
+            dataset.members[chat_key] = [user_key(first + offset) for offset in range(size)]
+            for offset in range(size * messages_per_participant):
+                messages.append(standins.DBChatMessage(
+                    sender_id=dataset.members[chat_key][offset % size],
+                    chat_key=chat_key,
+                    send_timestamp=now - offset,
+                ))
+    for start in range(0, len(messages), SEED_BATCH_SIZE):
+        await standins.DBChatMessage.bulk_create(messages[start:start + SEED_BATCH_SIZE])
+    return dataset
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+@File: load_simulator.py
+@Desc: 并发负载模拟，同时模拟大量会话的提示词注入、AI 更新工具调用和 WebUI 编辑，统计吞吐量和延迟分位数
+
+用法:
+    python benchmarks/load_simulator.py --duration 30 --prompt-rate 200 --user-tool-rate 50 --burst-every 5
+
+各类操作按泊松过程以给定速率开环到达，不等待前一个操作完成，因此能反映排队造成的延迟。
+会话的热度服从 Zipf 分布，另可周期性地让某个会话爆发大量消息，模拟群聊中的突发流量。
+通过 --store-latency 和 --store-failure-rate 让替身 store 表现得像远程数据库，
+可以观察按键锁的竞争、写入合并以及 retry_on_failure 的重试和熔断行为。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import environment
+import standins
+
+log = logging.getLogger("benchmarks")
+
+
+class LatencyRecorder:
+    """按操作类型记录延迟和结果"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Counter] = {}
+
+    def record(self, op: str, latency: float, outcome: str) -> None:
+        self.latencies.setdefault(op, []).append(latency)
+        self.outcomes.setdefault(op, Counter())[outcome] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        """各操作以及全部操作的吞吐量和延迟分位数（秒）"""
+        result: Dict[str, Dict[str, Any]] = {}
+        everything: List[float] = []
+        for op, samples in sorted(self.latencies.items()):
+            everything.extend(samples)
+            result[op] = {**self._stats(samples, elapsed), "outcomes": dict(self.outcomes[op])}
+        if everything:
+            result["all"] = self._stats(everything, elapsed)
+        return result
+
+    @staticmethod
+    def _stats(samples: List[float], elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "throughput": len(ordered) / elapsed if elapsed > 0 else None,
+            "p50": environment.percentile(ordered, 0.50),
+            "p95": environment.percentile(ordered, 0.95),
+            "p99": environment.percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+
+
+class LockSampler:
+    """定期采样按键锁的占用和排队情况"""
+
+    def __init__(self, locks: Dict[str, Any], interval: float = 0.01):
+        self.locks = locks
+        self.interval = interval
+        self.peak_keys: Dict[str, int] = {name: 0 for name in locks}
+        self.peak_waiting: Dict[str, int] = {name: 0 for name in locks}
+        self.contended_samples: Dict[str, int] = {name: 0 for name in locks}
+        self.samples = 0
+
+    async def run(self) -> None:
+        while True:
+            self.samples += 1
+            for name, lock in self.locks.items():
+                waiting = lock.waiting()
+                self.peak_keys[name] = max(self.peak_keys[name], len(lock))
+                self.peak_waiting[name] = max(self.peak_waiting[name], waiting)
+                if waiting:
+                    self.contended_samples[name] += 1
+            await asyncio.sleep(self.interval)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "peak_keys": self.peak_keys[name],
+                "peak_waiting": self.peak_waiting[name],
+                # 有协程在排队的采样点占比
+                "contended_ratio": self.contended_samples[name] / self.samples if self.samples else 0.0,
+            }
+            for name in self.locks
+        }
+
+
+class ChatPicker:
+    """按 Zipf 分布选取会话，排名靠前的会话更活跃"""
+
+    def __init__(self, chat_keys: List[str], skew: float):
+        self.chat_keys = chat_keys
+        self.weights = [1 / (rank + 1) ** skew for rank in range(len(chat_keys))]
+
+    def pick(self) -> str:
+        return random.choices(self.chat_keys, weights=self.weights)[0]
+
+
+async def simulate(args: argparse.Namespace) -> Dict[str, Any]:
+    environment.load_plugin()
+    import httpx
+    from fastapi import FastAPI
+    from nekro_plugin_attitude import data_manager, history, prompt_injection
+    from nekro_plugin_attitude.conf import plugin, config
+    from nekro_plugin_attitude.db_sync import SyncData
+    from nekro_plugin_attitude.decorators import db_circuit_breaker
+    from nekro_plugin_attitude.metrics import metrics
+    from nekro_plugin_attitude.tools import update_user_attitude_tool, update_group_attitude_tool
+
+    config.PromptMaxUsers = args.prompt_max_users
+    config.WebUi = True
+    if args.coalesce_window is not None:
+        config.WriteCoalesceWindow = args.coalesce_window
+    store = plugin.store
+
+    await environment.init_database()
+    dataset = await environment.seed_dataset(args.users, [args.participants], chats_per_size=args.chats)
+    await SyncData(store)
+    await data_manager.build_search_indexes(store)
+    chat_keys = dataset.chats[args.participants]
+    picker = ChatPicker(chat_keys, args.skew)
+
+    # 数据准备完成后再启用模拟的数据库延迟和故障
+    standins.PluginStore.latency = args.store_latency / 1000
+    standins.PluginStore.failure_rate = args.store_failure_rate
+
+    recorder = LatencyRecorder()
+    app = FastAPI()
+    app.include_router(plugin.router_factory())
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://simulator")
+    sequence = iter(range(1 << 62))
+
+    def member_of(chat_key: str) -> str:
+        return random.choice(dataset.members[chat_key])
+
+    async def prompt_build(chat_key: str) -> str:
+        await prompt_injection.attitude(standins.AgentCtx(chat_key))
+        return "ok"
+
+    async def user_tool(chat_key: str) -> str:
+        await update_user_attitude_tool(
+            standins.AgentCtx(chat_key), member_of(chat_key), attitude=f"态度{next(sequence)}", relationship="群友"
+        )
+        return "ok"
+
+    async def group_tool(chat_key: str) -> str:
+        await update_group_attitude_tool(standins.AgentCtx(chat_key), chat_key, attitude=f"氛围{next(sequence)}")
+        return "ok"
+
+    async def webui_put(path: str, body: Dict[str, Any]) -> str:
+        # 与 WebUI 相同：先读取记录得到版本号，再带着版本号提交修改
+        response = await client.get(path)
+        if response.is_success:
+            response = await client.put(path, json={**body, "version": response.json()["version"]})
+        if response.status_code == 409:
+            return "conflict"
+        return "ok" if response.is_success else f"http_{response.status_code}"
+
+    async def webui_put_user(chat_key: str) -> str:
+        return await webui_put(f"/users/{member_of(chat_key)}", {"other": f"备注{next(sequence)}"})
+
+    async def webui_put_group(chat_key: str) -> str:
+        return await webui_put(f"/groups/{chat_key.split('-')[1]}", {"other": f"备注{next(sequence)}"})
+
+    operations: Dict[str, Callable[[str], Awaitable[str]]] = {
+        "prompt_build": prompt_build,
+        "user_tool": user_tool,
+        "group_tool": group_tool,
+        "webui_put_user": webui_put_user,
+        "webui_put_group": webui_put_group,
+    }
+    rates = {
+        "prompt_build": args.prompt_rate,
+        "user_tool": args.user_tool_rate,
+        "group_tool": args.group_tool_rate,
+        "webui_put_user": args.webui_user_rate,
+        "webui_put_group": args.webui_group_rate,
+    }
+
+    in_flight: set = set()
+
+    async def timed(op: str, chat_key: str) -> None:
+        started = time.perf_counter()
+        try:
+            outcome = await operations[op](chat_key)
+        except Exception as e:
+            outcome = type(e).__name__
+        recorder.record(op, time.perf_counter() - started, outcome)
+
+    def launch(op: str, chat_key: str) -> None:
+        task = asyncio.ensure_future(timed(op, chat_key))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    async def arrivals(op: str, rate: float, stop_at: float) -> None:
+        """以泊松过程按给定速率发起操作"""
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if time.perf_counter() >= stop_at:
+                return
+            launch(op, picker.pick())
+
+    async def bursts(stop_at: float) -> None:
+        """周期性地让一个会话同时收到大量消息：每条消息触发一次提示词注入，部分触发 AI 更新"""
+        while True:
+            await asyncio.sleep(args.burst_every)
+            if time.perf_counter() >= stop_at:
+                return
+            chat_key = picker.pick()
+            for _ in range(args.burst_size):
+                launch("prompt_build", chat_key)
+                if random.random() < args.burst_update_ratio:
+                    launch("user_tool", chat_key)
+
+    sampler = LockSampler({"user": data_manager.user_locks, "group": data_manager.group_locks})
+    sampler_task = asyncio.ensure_future(sampler.run())
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    generators = [arrivals(op, rate, stop_at) for op, rate in rates.items() if rate > 0]
+    if args.burst_every > 0 and args.burst_size > 0:
+        generators.append(bursts(stop_at))
+    await asyncio.gather(*generators)
+
+    # 停止发起新操作后等待已发起的操作完成
+    if in_flight:
+        _, pending = await asyncio.wait(set(in_flight), timeout=args.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            log.warning(f"{len(pending)} 个操作在 {args.drain_timeout} 秒内未完成，已取消")
+    elapsed = time.perf_counter() - started
+    sampler_task.cancel()
+    await client.aclose()
+    standins.PluginStore.latency = 0.0
+    standins.PluginStore.failure_rate = 0.0
+    await history.flush_history()
+    await environment.close_database()
+
+    tool_names = ("update_user_attitude_tool", "update_group_attitude_tool")
+    return {
+        "elapsed": elapsed,
+        "operations": recorder.summary(elapsed),
+        "locks": sampler.summary(),
+        "retries": {
+            name: {
+                "retries": metrics.get("retries_total", operation=name),
+                "exhausted": metrics.get("retry_exhausted_total", operation=name),
+                "deadline_exceeded": metrics.get("retry_deadline_exceeded_total", operation=name),
+                "budget_exhausted": metrics.get("retry_budget_exhausted_total", operation=name),
+            }
+            for name in tool_names
+        },
+        "circuit_breaker": {
+            "state": db_circuit_breaker.state,
+            "rejections": metrics.get("circuit_breaker_rejections_total", breaker=db_circuit_breaker.name),
+        },
+        "writes": {
+            kind: {
+                "written": metrics.get("writes_total", kind=kind),
+                "coalesced": metrics.get("writes_coalesced_total", kind=kind),
+            }
+            for kind in ("user", "group")
+        },
+    }
+
+
+def print_summary(report: Dict[str, Any]) -> None:
+    """把主要结果以表格形式输出到标准错误"""
+    log.info(f"{'操作':<16}{'次数':>8}{'吞吐/秒':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  结果")
+    for op, stats in report["operations"].items():
+        outcomes = ", ".join(f"{name}={count}" for name, count in stats.get("outcomes", {}).items())
+        log.info(
+            f"{op:<16}{stats['count']:>8}{stats['throughput']:>10.1f}"
+            f"{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}  {outcomes}"
+        )
+    for name, stats in report["locks"].items():
+        log.info(
+            f"{name} 锁: 同时持有的键最多 {stats['peak_keys']} 个，排队最多 {stats['peak_waiting']} 个，"
+            f"{stats['contended_ratio']:.1%} 的采样点存在排队"
+        )
+    for name, stats in report["retries"].items():
+        log.info(f"{name}: " + ", ".join(f"{key}={value:g}" for key, value in stats.items()))
+    breaker = report["circuit_breaker"]
+    log.info(f"熔断器: 状态 {breaker['state']}，拒绝 {breaker['rejections']:g} 次")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="态度插件并发负载模拟")
+    parser.add_argument("--users", type=int, default=10000, help="用户数量")
+    parser.add_argument("--chats", type=int, default=50, help="会话数量")
+    parser.add_argument("--participants", type=int, default=50, help="每个会话的发言人数")
+    parser.add_argument("--duration", type=float, default=10.0, help="发起操作的持续时间（秒）")
+    parser.add_argument("--prompt-rate", type=float, default=200.0, help="提示词注入的速率（次/秒）")
+    parser.add_argument("--user-tool-rate", type=float, default=50.0, help="update_user_attitude 工具调用的速率（次/秒）")
+    parser.add_argument("--group-tool-rate", type=float, default=10.0, help="update_group_attitude 工具调用的速率（次/秒）")
+    parser.add_argument("--webui-user-rate", type=float, default=2.0, help="WebUI 修改用户态度的速率（次/秒）")
+    parser.add_argument("--webui-group-rate", type=float, default=1.0, help="WebUI 修改群组态度的速率（次/秒）")
+    parser.add_argument("--skew", type=float, default=1.0, help="会话热度 Zipf 分布的指数，0 表示均匀")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="每隔多少秒产生一次突发流量，0 表示不产生")
+    parser.add_argument("--burst-size", type=int, default=100, help="每次突发中的消息数")
+    parser.add_argument("--burst-update-ratio", type=float, default=0.3, help="突发消息中触发 AI 更新用户态度的比例")
+    parser.add_argument("--store-latency", type=float, default=1.0, help="模拟的 store 单次操作延迟（毫秒）")
+    parser.add_argument("--store-failure-rate", type=float, default=0.0, help="模拟的 store 操作失败概率")
+    parser.add_argument("--coalesce-window", type=int, help="WriteCoalesceWindow 配置（毫秒），默认使用插件默认值")
+    parser.add_argument("--prompt-max-users", type=int, default=0, help="PromptMaxUsers 配置，默认 0 即注入全部发言人")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="停止发起后等待进行中操作完成的最长时间（秒）")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    parser.add_argument("--output", help="JSON 结果写入的文件，默认输出到标准输出")
+    parser.add_argument("--log-level", default="INFO", help="日志级别，插件自身的日志固定为 ERROR 以免影响测量")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, stream=sys.stderr, format="%(message)s")
+    # 注入故障时插件会大量输出重试日志，只保留错误
+    standins.logger.setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(simulate(args))
+    print_summary(report)
+    report["meta"] = {
+        "commit": environment.git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
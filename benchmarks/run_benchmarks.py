@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+@File: run_benchmarks.py
+@Desc: 离线基准测试，无需 NekroAgent 实例即可测量插件各路径随数据规模的耗时
+
+用法:
+    python benchmarks/run_benchmarks.py --users 1000,10000 --participants 1,20,200 --output results.json
+
+每个用户规模在独立的子进程中运行，互不共享缓存和数据库。结果为 JSON，
+每条记录包含用例名、参数以及单次操作耗时的统计（秒），可直接在不同提交之间比较。
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import environment
+import standins
+
+
+def summarize(samples: List[float], ops_per_sample: int) -> Dict[str, Any]:
+    """把每轮耗时换算为单次操作耗时并统计"""
+    per_op = sorted(sample / ops_per_sample for sample in samples)
+    return {
+        "samples": len(samples),
+        "ops_per_sample": ops_per_sample,
+        "min": per_op[0],
+        "median": statistics.median(per_op),
+        "mean": statistics.fmean(per_op),
+        "p95": environment.percentile(per_op, 0.95),
+        "max": per_op[-1],
+        "ops_per_sec": ops_per_sample * len(samples) / sum(samples) if sum(samples) > 0 else None,
+    }
+
+
+class Runner:
+    """按名称筛选并执行用例，收集结果"""
+
+    def __init__(self, repeat: int, patterns: List[str]):
+        self.repeat = repeat
+        self.patterns = patterns
+        self.results: List[Dict[str, Any]] = []
+
+    def selected(self, name: str) -> bool:
+        return not self.patterns or any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    async def measure(
+        self,
+        name: str,
+        params: Dict[str, Any],
+        run: Callable[[int], Awaitable[None]],
+        ops: int = 1,
+        repeat: Optional[int] = None,
+        setup: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        """执行 repeat 轮，每轮调用 run(轮次) 完成 ops 次操作，setup 不计入耗时"""
+        if not self.selected(name):
+            return
+        samples: List[float] = []
+        for round_index in range(repeat or self.repeat):
+            if setup is not None:
+                await setup()
+            started = time.perf_counter()
+            await run(round_index)
+            samples.append(time.perf_counter() - started)
+        result = {"case": name, "params": params, **summarize(samples, ops)}
+        self.results.append(result)
+        logging.getLogger("benchmarks").info(
+            f"{name} {params}: median {result['median'] * 1000:.3f} ms, p95 {result['p95'] * 1000:.3f} ms"
+        )
+
+
+async def run_worker(users: int, participants: List[int], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """在当前进程中针对一个用户规模运行全部用例"""
+    environment.load_plugin()
+    import httpx
+    from fastapi import FastAPI
+    from nekro_plugin_attitude import data_manager, history, prompt_injection
+    from nekro_plugin_attitude.cache import user_cache, group_cache, prompt_cache
+    from nekro_plugin_attitude.conf import plugin, config
+    from nekro_plugin_attitude.db_sync import SyncData
+    from nekro_plugin_attitude.participants import participant_tracker
+    from nekro_plugin_attitude.validators import validate_data_with_models, repair_data_models
+
+    config.PromptMaxUsers = args.prompt_max_users
+    config.CompactEncoding = args.compact_encoding
+    config.WebUi = True
+    store = plugin.store
+    runner = Runner(args.repeat, args.cases)
+
+    await environment.init_database()
+    participants = [size for size in participants if size <= users]
+    dataset = await environment.seed_dataset(users, participants, chats_per_size=args.chats)
+    base = {"users": users}
+
+    # 启动同步：首次为全部用户建立记录，之后为无变化的重复同步
+    await runner.measure("sync_data_initial", base, lambda _: SyncData(store), repeat=1)
+    if not runner.selected("sync_data_initial"):
+        await SyncData(store)
+    await runner.measure("sync_data_steady", base, lambda _: SyncData(store))
+    await runner.measure("validate_data_with_models", base, lambda _: validate_data_with_models(store))
+    await runner.measure("repair_data_models", base, lambda _: repair_data_models(store))
+
+    # 写入路径，每轮写入不同的用户并使用新的取值，避免被跳过
+    update_ops = min(args.update_ops, users)
+
+    async def single_updates(round_index: int) -> None:
+        for offset in range(update_ops):
+            user_key = dataset.user_keys[(round_index * update_ops + offset) % users]
+            await data_manager.update_user_attitude(store, user_key, attitude=f"态度{round_index}", relationship="朋友")
+
+    await runner.measure("update_user_attitude", base, single_updates, ops=update_ops)
+
+    batch_size = min(args.batch_size, users)
+
+    async def bulk_updates(round_index: int) -> None:
+        start = round_index * batch_size
+        keys = [dataset.user_keys[(start + offset) % users] for offset in range(batch_size)]
+        await data_manager.bulk_update_user_attitudes(store, {key: {"attitude": f"批量{round_index}"} for key in keys})
+
+    await runner.measure("bulk_update_user_attitudes", {**base, "batch": batch_size}, bulk_updates, ops=batch_size)
+
+    # 提示词注入：为所有参与者写入内容，使渲染的文本接近真实情况
+    speakers = {key for members in dataset.members.values() for key in members}
+    await data_manager.bulk_update_user_attitudes(
+        store,
+        {key: {"attitude": "友好", "relationship": "群友", "other": "经常分享有用的信息"} for key in speakers},
+    )
+    for size, chat_keys in dataset.chats.items():
+        params = {**base, "participants": size, "chats": len(chat_keys)}
+
+        async def build_all(_: int, chat_keys: List[str] = chat_keys) -> None:
+            for chat_key in chat_keys:
+                await prompt_injection.attitude(standins.AgentCtx(chat_key))
+
+        async def cold() -> None:
+            for chat_key in dataset.chats[size]:
+                participant_tracker.forget(chat_key)
+            prompt_cache.clear()
+            user_cache.clear()
+            group_cache.clear()
+
+        async def stale_prompt() -> None:
+            prompt_cache.clear()
+
+        # 冷启动：参与者、记录和提示词都需要从数据库读取
+        await runner.measure("attitude_cold", params, build_all, ops=len(chat_keys), setup=cold)
+        # 记录已缓存，只重新渲染提示词
+        await runner.measure("attitude_rerender", params, build_all, ops=len(chat_keys), setup=stale_prompt)
+        # 参与者和记录都未变化，直接复用上次的提示词
+        await build_all(0)
+        await runner.measure("attitude_cached", params, build_all, ops=len(chat_keys))
+
+    # WebUI 列表接口
+    await data_manager.build_search_indexes(store)
+    app = FastAPI()
+    app.include_router(plugin.router_factory())
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        endpoints = {
+            "router_list_users_page": "/users?page=2&limit=50",
+            "router_list_users_sorted": "/users?page=1&limit=50&sort=username&order=desc",
+            "router_list_users_filtered": "/users?page=1&limit=50&search=用户12",
+            "router_list_users_all": "/users",
+            "router_list_groups": "/groups",
+            "router_search_users": "/search?q=用户12&scope=users&limit=20",
+        }
+        for name, path in endpoints.items():
+
+            async def request(_: int, path: str = path) -> None:
+                for _ in range(args.request_ops):
+                    response = await client.get(path)
+                    response.raise_for_status()
+
+            await runner.measure(name, {**base, "path": path}, request, ops=args.request_ops)
+
+    await history.flush_history()
+    await environment.close_database()
+    return runner.results
+
+
+def _parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="态度插件离线基准测试")
+    parser.add_argument("--users", type=_parse_sizes, default=[1000, 10000], help="以逗号分隔的用户规模，如 1000,10000,100000")
+    parser.add_argument("--participants", type=_parse_sizes, default=[1, 20, 200], help="以逗号分隔的每个会话的发言人数")
+    parser.add_argument("--chats", type=int, default=5, help="每种会话规模生成的会话数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例重复的轮数")
+    parser.add_argument("--update-ops", type=int, default=100, help="update_user_attitude 每轮写入的用户数")
+    parser.add_argument("--batch-size", type=int, default=500, help="bulk_update_user_attitudes 每轮的批量大小")
+    parser.add_argument("--request-ops", type=int, default=10, help="路由用例每轮的请求数")
+    parser.add_argument("--prompt-max-users", type=int, default=0, help="PromptMaxUsers 配置，默认 0 即注入全部发言人")
+    parser.add_argument("--compact-encoding", action="store_true", help="以紧凑格式保存态度记录（CompactEncoding 配置）")
+    parser.add_argument("--cases", type=lambda value: [p for p in value.split(",") if p], default=[], help="只运行名称匹配的用例，支持通配符，如 attitude_*,router_*")
+    parser.add_argument("--output", help="结果写入的文件，默认输出到标准输出")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--log-level", default="INFO", help="日志级别，插件自身的日志固定为 WARNING 以免影响测量")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, stream=sys.stderr, format="%(message)s")
+    standins.logger.setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.worker is not None:
+        results = asyncio.run(run_worker(args.worker, args.participants, args))
+        json.dump(results, sys.stdout, ensure_ascii=False)
+        return
+
+    results: List[Dict[str, Any]] = []
+    passthrough = _strip_options(argv if argv is not None else sys.argv[1:], ("--users", "--output"))
+    for users in args.users:
+        logging.getLogger("benchmarks").info(f"== {users} 位用户")
+        completed = subprocess.run(
+            [sys.executable, __file__, *passthrough, "--worker", str(users)],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        results.extend(json.loads(completed.stdout))
+
+    report = {
+        "meta": {
+            "commit": environment.git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("worker", "output")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+
+
+def _strip_options(argv: List[str], options: tuple) -> List[str]:
+    """去掉由主进程处理的参数，其余参数原样传给子进程"""
+    stripped: List[str] = []
+    skip = False
+    for argument in argv:
+        if skip:
+            skip = False
+            continue
+        if argument in options:
+            skip = True
+            continue
+        if argument.split("=", 1)[0] in options:
+            continue
+        stripped.append(argument)
+    return stripped
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+@File: standins.py
+@Desc: 离线运行插件所需的 NekroAgent / NoneBot 替身模块
+
+只实现插件实际用到的接口：插件对象、配置基类、以 SQLite 为后端的 store，
+以及用户、频道、消息和插件数据四张表。store 的读写语义与 NekroAgent 一致，
+直接操作插件数据表的批量路径因此可以与 store 共用同一份数据。
+"""
+
+import asyncio
+import datetime
+import logging
+import random
+import sys
+import types
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+from tortoise import fields
+from tortoise.exceptions import OperationalError
+from tortoise.models import Model
+
+logger = logging.getLogger("nekro_agent")
+
+
+class NAConfig:
+    """NekroAgent 全局配置中插件读取的部分"""
+
+    AI_CHAT_CONTEXT_EXPIRE_SECONDS = 3600
+    AI_CHAT_CONTEXT_MAX_LENGTH = 1024
+
+
+NA_config = NAConfig()
+
+
+class DBUser(Model):
+    id = fields.IntField(pk=True)
+    username = fields.CharField(max_length=128)
+    platform_userid = fields.CharField(max_length=256, index=True)
+
+    class Meta:
+        table = "user"
+
+
+class DBChatChannel(Model):
+    id = fields.IntField(pk=True)
+    chat_key = fields.CharField(max_length=64, index=True)
+    channel_id = fields.CharField(max_length=64, index=True)
+    channel_name = fields.CharField(max_length=64, default="")
+    channel_type = fields.CharField(max_length=32, default="group")
+    conversation_start_time = fields.DatetimeField(default=lambda: datetime.datetime.fromtimestamp(0, tz=datetime.timezone.utc))
+
+    @classmethod
+    async def get_channel(cls, chat_key: str) -> "DBChatChannel":
+        return await cls.get(chat_key=chat_key)
+
+    class Meta:
+        table = "chat_channel"
+
+
+class DBChatMessage(Model):
+    id = fields.IntField(pk=True)
+    sender_id = fields.CharField(max_length=128)
+    chat_key = fields.CharField(max_length=64, index=True)
+    send_timestamp = fields.IntField(index=True)
+    content_text = fields.TextField(default="")
+
+    class Meta:
+        table = "chat_message"
+
+
+class DBPluginData(Model):
+    id = fields.IntField(pk=True)
+    plugin_key = fields.CharField(max_length=128, index=True)
+    target_chat_key = fields.CharField(max_length=128, index=True)
+    target_user_key = fields.CharField(max_length=128, index=True)
+    data_key = fields.CharField(max_length=128, index=True)
+    data_value = fields.TextField()
+    create_time = fields.DatetimeField(auto_now_add=True)
+    update_time = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "plugin_data"
+
+
+class PluginStore:
+    """与 NekroAgent 相同语义的插件 store，数据保存在插件数据表中
+
+    latency 和 failure_rate 用于模拟远程数据库：每次操作前等待 latency 秒，
+    并以 failure_rate 的概率抛出 OperationalError。
+    """
+
+    latency: float = 0.0
+    failure_rate: float = 0.0
+
+    def __init__(self, plugin_key: str):
+        self.plugin_key = plugin_key
+
+    async def _simulate(self) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate > 0 and random.random() < self.failure_rate:
+            raise OperationalError("模拟的数据库故障")
+
+    def _filter(self, chat_key: str, user_key: str, store_key: str):
+        return DBPluginData.filter(
+            plugin_key=self.plugin_key, target_chat_key=chat_key, target_user_key=user_key, data_key=store_key
+        )
+
+    async def set(self, chat_key: str = "", user_key: str = "", store_key: str = "", value: str = "") -> int:
+        await self._simulate()
+        data = await self._filter(chat_key, user_key, store_key).first()
+        if data:
+            data.data_value = value
+            await data.save(update_fields=["data_value", "update_time"])
+        else:
+            await DBPluginData.create(
+                plugin_key=self.plugin_key,
+                target_chat_key=chat_key,
+                target_user_key=user_key,
+                data_key=store_key,
+                data_value=value,
+            )
+        return 0
+
+    async def get(self, chat_key: str = "", user_key: str = "", store_key: str = "") -> Optional[str]:
+        await self._simulate()
+        data = await self._filter(chat_key, user_key, store_key).first()
+        return data.data_value if data else None
+
+    async def delete(self, chat_key: str = "", user_key: str = "", store_key: str = "") -> int:
+        await self._simulate()
+        await self._filter(chat_key, user_key, store_key).delete()
+        return 0
+
+
+class ConfigBase(BaseModel):
+    pass
+
+
+class SandboxMethodType(str, Enum):
+    TOOL = "tool"
+    AGENT = "agent"
+    BEHAVIOR = "behavior"
+
+
+class NekroPlugin:
+    """只记录挂载内容的插件对象，由基准测试直接调用挂载的函数"""
+
+    def __init__(self, name: str, module_name: str, description: str, author: str, version: str, url: str, support_adapter=None):
+        self.name = name
+        self.key = f"{author}.{module_name}"
+        self.store = PluginStore(self.key)
+        self._configs: Dict[type, Any] = {}
+        self.init_method: Optional[Callable] = None
+        self.cleanup_method: Optional[Callable] = None
+        self.router_factory: Optional[Callable] = None
+        self.prompt_inject_methods: Dict[str, Callable] = {}
+        self.sandbox_methods: Dict[str, Callable] = {}
+
+    def _register(self, setter: Callable[[Callable], None]):
+        def decorator(func):
+            setter(func)
+            return func
+        return decorator
+
+    def mount_config(self):
+        return self._register(lambda cls: None)
+
+    def get_config(self, cls):
+        if cls not in self._configs:
+            self._configs[cls] = cls()
+        return self._configs[cls]
+
+    def mount_init_method(self):
+        return self._register(lambda func: setattr(self, "init_method", func))
+
+    def mount_cleanup_method(self):
+        return self._register(lambda func: setattr(self, "cleanup_method", func))
+
+    def mount_router(self):
+        return self._register(lambda func: setattr(self, "router_factory", func))
+
+    def mount_prompt_inject_method(self, name: str, description: str = ""):
+        return self._register(lambda func: self.prompt_inject_methods.__setitem__(name, func))
+
+    def mount_sandbox_method(self, method_type, name: str, description: str = ""):
+        return self._register(lambda func: self.sandbox_methods.__setitem__(name, func))
+
+
+class AgentCtx:
+    def __init__(self, from_chat_key: str):
+        self.from_chat_key = from_chat_key
+
+
+class _Matcher:
+    def handle(self):
+        return lambda func: func
+
+
+async def get_chat_info_old(event) -> tuple:
+    return event.chat_key, "group"
+
+
+def _module(name: str, **attrs: Any) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    # 标记为包，`from a.b import c` 形式的导入才能找到子模块
+    module.__path__ = []
+    return module
+
+
+def install() -> None:
+    """把替身模块注册到 sys.modules，之后插件的 nekro_agent / nonebot 导入都会解析到这里"""
+    if getattr(sys.modules.get("nekro_agent.api.plugin"), "__standin__", False):
+        return
+    modules: List[types.ModuleType] = [
+        _module("nekro_agent"),
+        _module("nekro_agent.api"),
+        _module("nekro_agent.api.plugin", __standin__=True, NekroPlugin=NekroPlugin, ConfigBase=ConfigBase, SandboxMethodType=SandboxMethodType),
+        _module("nekro_agent.api.core", logger=logger, config=NA_config),
+        _module("nekro_agent.api.schemas", AgentCtx=AgentCtx),
+        _module("nekro_agent.core"),
+        _module("nekro_agent.core.logger", logger=logger),
+        _module("nekro_agent.models"),
+        _module("nekro_agent.models.db_user", DBUser=DBUser),
+        _module("nekro_agent.models.db_chat_channel", DBChatChannel=DBChatChannel),
+        _module("nekro_agent.models.db_chat_message", DBChatMessage=DBChatMessage),
+        _module("nekro_agent.models.db_plugin_data", DBPluginData=DBPluginData),
+        _module("nekro_agent.adapters"),
+        _module("nekro_agent.adapters.onebot_v11"),
+        _module("nekro_agent.adapters.onebot_v11.tools"),
+        _module("nekro_agent.adapters.onebot_v11.tools.onebot_util", get_chat_info_old=get_chat_info_old),
+        _module("nonebot", on_command=lambda *args, **kwargs: _Matcher(), on_message=lambda *args, **kwargs: _Matcher()),
+        _module("nonebot.adapters", Bot=type("Bot", (), {}), Message=type("Message", (), {})),
+        _module("nonebot.adapters.onebot"),
+        _module("nonebot.adapters.onebot.v11", MessageEvent=type("MessageEvent", (), {})),
+        _module("nonebot.matcher", Matcher=type("Matcher", (), {})),
+        _module("nonebot.params", CommandArg=lambda: None),
+    ]
+    for module in modules:
+        sys.modules[module.__name__] = module
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@File: cache.py
+@Desc: 态度记录缓存模块
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from .conf import plugin, BasicConfig
+from .model import UserAttitude, GroupAttitude
+
+config: BasicConfig = plugin.get_config(BasicConfig)
+
+T = TypeVar("T")
+
+# 所有缓存共享的单调递增版本号，删除后重建的记录也不会复用旧版本号；
+# 以进程启动时的微秒时间戳为起点，重启后签发的版本号也大于重启前签发的
+_version_counter = itertools.count(time.time_ns() // 1000)
+
+
+class AttitudeCache(Generic[T]):
+    """带容量上限和过期时间的进程内 LRU 缓存
+
+    所有写入 store 的路径都应调用 `write`/`delete` 同步本缓存，
+    以保证提示注入等热路径读取到的数据与数据库一致；
+    从数据库读取后填充缓存则使用 `fill`，不会改变记录版本号，
+    读取期间记录被写入或删除时放弃填充，避免旧数据覆盖新写入的条目。
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        """
+        Args:
+            maxsize: 最大缓存条目数，超出后淘汰最久未使用的条目
+            ttl: 条目存活时间（秒），小于等于 0 表示永不过期
+        """
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+        # 记录版本号独立于缓存条目保存，条目被淘汰后版本号依然有效
+        self._versions: Dict[Hashable, int] = {}
+        # 本进程中数据集版本的起点，早于它的变更无从追溯
+        self._base_version = next(_version_counter)
+        self._latest_version = self._base_version
+        # 记录写入或删除时的回调，参数为 (键, 新值, 旧值)，删除时新值为 None，旧值未缓存时为 None
+        self._listeners: List[Callable[[Hashable, Optional[T], Optional[T]], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """读取缓存条目，未命中或已过期时返回 None"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if self.ttl > 0 and expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: T) -> None:
+        """写入缓存条目，必要时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def fill(self, key: Hashable, value: T, version: int) -> bool:
+        """以从数据库读取的值填充缓存条目
+
+        Args:
+            key: 记录键
+            value: 读取到的记录
+            version: 读取数据库之前通过 `version` 取得的版本号
+
+        Returns:
+            bool: 是否已填充，读取期间记录被写入或删除（版本号已变化）时为 False
+        """
+        if self._versions.get(key, 0) != version:
+            return False
+        self.set(key, value)
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """使指定条目失效"""
+        self._data.pop(key, None)
+
+    def add_listener(self, listener: Callable[[Hashable, Optional[T], Optional[T]], None]) -> None:
+        """登记记录写入或删除时的回调，用于维护依赖记录内容的派生数据"""
+        self._listeners.append(listener)
+
+    def _peek(self, key: Hashable) -> Optional[T]:
+        """读取条目的当前值，不计入命中统计也不检查过期（所有写入都经过本缓存，过期条目仍是最后写入的值）"""
+        entry = self._data.get(key)
+        return entry[1] if entry is not None else None
+
+    def _bump(self, key: Hashable) -> None:
+        version = next(_version_counter)
+        self._versions[key] = version
+        self._latest_version = version
+
+    def write(self, key: Hashable, value: T) -> None:
+        """记录已写入 store：更新缓存条目并递增其版本号"""
+        previous = self._peek(key)
+        self.set(key, value)
+        self._bump(key)
+        for listener in self._listeners:
+            listener(key, value, previous)
+
+    def delete(self, key: Hashable) -> None:
+        """记录已从 store 删除：使缓存条目失效并递增其版本号"""
+        previous = self._peek(key)
+        self.invalidate(key)
+        self._bump(key)
+        for listener in self._listeners:
+            listener(key, None, previous)
+
+    def version(self, key: Hashable) -> int:
+        """返回记录的版本号，从未写入过的记录为 0"""
+        return self._versions.get(key, 0)
+
+    def dataset_version(self) -> int:
+        """返回整个数据集的版本号，任一记录写入或删除后都会增大"""
+        return self._latest_version
+
+    def changed_since(self, version: int) -> Optional[List[Hashable]]:
+        """返回版本号大于 version 的记录键，按版本号升序排列
+
+        Returns:
+            Optional[List[Hashable]]: 变更（包括删除）过的记录键；
+            version 早于本进程的起点或晚于当前版本时无法计算增量，返回 None
+        """
+        if version < self._base_version or version > self._latest_version:
+            return None
+        changed = [(key_version, key) for key, key_version in self._versions.items() if key_version > version]
+        return [key for _, key in sorted(changed)]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存的命中、未命中和淘汰统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+user_cache: AttitudeCache[UserAttitude] = AttitudeCache(config.CacheMaxSize, config.CacheTTL)
+group_cache: AttitudeCache[GroupAttitude] = AttitudeCache(config.CacheMaxSize, config.CacheTTL)
+# 按会话缓存最终注入的提示词，值为 (签名, 提示词, 超出预算而省略的用户数, 注入的用户数)
+prompt_cache: AttitudeCache[Tuple[Hashable, str, int, int]] = AttitudeCache(config.CacheMaxSize, config.CacheTTL)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """返回用户、群组和提示词缓存的统计信息"""
+    return {
+        "user": user_cache.stats(),
+        "group": group_cache.stats(),
+        "prompt": prompt_cache.stats(),
+    }
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+@File: codec.py
+@Desc: 态度记录的存储编码
+
+记录有两种编码，读取时按首字符自动识别：
+- JSON 对象（旧格式）: {"id":1,"user_id":"123",...}
+- 紧凑格式: 以布局版本号开头、按固定字段顺序排列的 JSON 数组，如 [1,1,"123",...]
+
+紧凑格式省去了每条记录中重复的字段名，仍然是 JSON 文本，
+因此 data_value 的文本粗筛和人工排查方式不变。写入使用哪种编码由 CompactEncoding 配置决定。
+
+批量读取时使用 decode_records，同一批记录只经过一次 pydantic 校验调用，
+分摊了逐条调用的固定开销；批量校验失败时退回逐条解码，格式错误的记录不影响同批的其他记录。
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, TypeVar, Union
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pydantic_core import from_json
+
+from .conf import config
+from .model import UserAttitude, GroupAttitude
+
+M = TypeVar("M", bound=BaseModel)
+
+# 紧凑格式当前的布局版本
+COMPACT_LAYOUT_VERSION = 1
+
+# 各模型每个布局版本的字段顺序。已写入的布局不能修改，
+# 模型增删字段时新增一个布局版本，旧版本的记录缺少的字段按模型默认值补齐
+_LAYOUTS: Dict[Type[BaseModel], Dict[int, Tuple[str, ...]]] = {
+    UserAttitude: {
+        1: ("id", "user_id", "username", "nickname", "attitude", "relationship", "other", "version"),
+    },
+    GroupAttitude: {
+        1: ("id", "group_id", "channel_name", "attitude", "other", "version"),
+    },
+}
+
+for _model, _layouts in _LAYOUTS.items():
+    if _layouts[COMPACT_LAYOUT_VERSION] != tuple(_model.model_fields):
+        raise RuntimeError(f"{_model.__name__} 的字段与紧凑格式布局 {COMPACT_LAYOUT_VERSION} 不一致，需要新增布局版本")
+
+# 各模型的列表校验器，用于批量解码
+_LIST_ADAPTERS: Dict[Type[BaseModel], TypeAdapter] = {model: TypeAdapter(List[model]) for model in _LAYOUTS}
+
+
+def is_compact(value: str) -> bool:
+    """判断存储的值是否为紧凑格式"""
+    return value[:1] == "["
+
+
+def is_current_encoding(value: str) -> bool:
+    """判断存储的值是否已是当前配置的编码，不是时应在下次写入或后台校验时重写"""
+    return is_compact(value) == config.CompactEncoding
+
+
+def encode_record(record: BaseModel) -> str:
+    """按当前配置的编码序列化记录"""
+    if not config.CompactEncoding:
+        return record.model_dump_json()
+    layout = _LAYOUTS[type(record)][COMPACT_LAYOUT_VERSION]
+    values = [COMPACT_LAYOUT_VERSION, *(getattr(record, field) for field in layout)]
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+
+
+def _unpack(model: Type[BaseModel], value: str) -> Optional[Dict[str, Any]]:
+    """把紧凑格式还原为字段字典，无法识别时返回 None"""
+    try:
+        values = from_json(value)
+    except ValueError:
+        return None
+    if not values or not isinstance(values, list):
+        return None
+    layout = _LAYOUTS[model].get(values[0]) if type(values[0]) is int else None
+    if layout is None or len(values) - 1 != len(layout):
+        return None
+    return dict(zip(layout, values[1:]))
+
+
+def decode_record(model: Type[M], value: str) -> M:
+    """反序列化任意一种编码的记录
+
+    Raises:
+        ValidationError: 数据格式错误，与 `model_validate_json` 相同
+    """
+    if is_compact(value):
+        fields = _unpack(model, value)
+        if fields is not None:
+            return model.model_validate(fields)
+    # JSON 对象，或无法识别的紧凑格式（由 model_validate_json 给出格式错误）
+    return model.model_validate_json(value)
+
+
+def _decode_batch(model: Type[M], values: Sequence[str]) -> Optional[List[M]]:
+    """一次校验整批记录，任意一条无法解析或校验失败时返回 None"""
+    adapter = _LIST_ADAPTERS[model]
+    objects = [value for value in values if not is_compact(value)]
+    unpacked = []
+    for value in values:
+        if is_compact(value):
+            fields = _unpack(model, value)
+            if fields is None:
+                return None
+            unpacked.append(fields)
+    try:
+        # 旧格式的记录本身是 JSON 对象，拼接为数组后交给 pydantic-core 一次解析并校验
+        decoded_objects = adapter.validate_json(f"[{','.join(objects)}]") if objects else []
+        decoded_compact = adapter.validate_python(unpacked) if unpacked else []
+    except ValidationError:
+        return None
+    # 数量不一致说明某条记录不是单个 JSON 值，拼接后改变了数组的结构
+    if len(decoded_objects) != len(objects):
+        return None
+    objects_iter, compact_iter = iter(decoded_objects), iter(decoded_compact)
+    return [next(compact_iter) if is_compact(value) else next(objects_iter) for value in values]
+
+
+def decode_records(model: Type[M], values: Sequence[str]) -> List[Union[M, ValidationError]]:
+    """批量反序列化记录，结果与 values 一一对应
+
+    Returns:
+        List[Union[M, ValidationError]]: 解码成功的记录，格式错误的位置为对应的 ValidationError
+    """
+    decoded = _decode_batch(model, values)
+    if decoded is not None:
+        return decoded
+    results: List[Union[M, ValidationError]] = []
+    for value in values:
+        try:
+            results.append(decode_record(model, value))
+        except ValidationError as e:
+            results.append(e)
+    return results
+
+
+def load_fields(model: Type[BaseModel], value: str) -> Optional[Dict[str, Any]]:
+    """不经校验地读出记录的字段，用于搜索匹配和从格式错误的数据中恢复字段
+
+    Returns:
+        Optional[Dict[str, Any]]: 字段字典，无法解析时返回 None
+    """
+    if is_compact(value):
+        return _unpack(model, value)
+    try:
+        fields = json.loads(value)
+    except json.JSONDecodeError:
+        return None
+    return fields if isinstance(fields, dict) else None
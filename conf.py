@@ -25,5 +25,53 @@ class BasicConfig(ConfigBase):
         title="提示词语言",
         description="设置AI提示词的语言，CN为中文，EN为英文",
     )
-    
+
+    PromptMaxUsers: int = Field(
+        default=0,
+        title="注入用户数量上限",
+        description="每次最多向提示词注入多少位用户的态度，按最近发言和发言频率排序，0 表示不限制",
+    )
+
+    PromptMaxChars: int = Field(
+        default=0,
+        title="注入字符数上限",
+        description="用户态度提示词的总字符数上限（约 1.5 个中文字符或 4 个英文字符对应 1 个 token），0 表示不限制",
+    )
+
+    CacheMaxSize: int = Field(
+        default=4096,
+        title="缓存容量",
+        description="用户和群组态度记录的内存缓存最大条目数",
+    )
+
+    CacheTTL: int = Field(
+        default=300,
+        title="缓存过期时间",
+        description="内存缓存条目的存活时间（秒），0 表示永不过期",
+    )
+
+    WriteCoalesceWindow: int = Field(
+        default=200,
+        title="写入合并窗口",
+        description="AI 更新态度时，同一用户或群组在该时间（毫秒）内的多次更新会合并为一次写入，0 表示不合并",
+    )
+
+    HistoryRetentionDays: int = Field(
+        default=180,
+        title="变更历史保留天数",
+        description="态度变更历史的保留时间（天），超出的条目在后台定期清理，0 表示永久保留",
+    )
+
+    HistoryMaxEntries: int = Field(
+        default=1000,
+        title="单条记录历史条目上限",
+        description="每个用户或群组最多保留的变更历史条目数，超出时清理最早的条目，0 表示不限制",
+    )
+
+    CompactEncoding: bool = Field(
+        default=False,
+        title="紧凑存储编码",
+        description="以省去字段名的紧凑格式保存态度记录，减少存储占用；旧格式的记录仍可读取，并在后台校验时转换",
+    )
+
 config: BasicConfig = plugin.get_config(BasicConfig)
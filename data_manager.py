@@ -5,11 +5,499 @@
 @File: data_manager.py
 @Desc: 数据管理模块
 """
-from typing import Optional, Tuple
-from .model import UserAttitude, GroupAttitude
-from .db_sync import SyncData
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+from .model import UserAttitude, GroupAttitude, BatchItemResult
+from .db_sync import SyncData, bulk_write_atomic
+from .reconcile import reconcile_user, reconcile_group, build_user_record, build_group_record
+from .cache import user_cache, group_cache
+from .locks import KeyedLocks, user_locks, group_locks
+from .codec import decode_record, decode_records, encode_record, is_current_encoding, load_fields
+from .search_index import SearchIndex, user_index, group_index
+from .history import change_source
+from .conf import plugin, config
+from .metrics import metrics
 
 from nekro_agent.api.core import logger
+from nekro_agent.models.db_plugin_data import DBPluginData
+from nekro_agent.models.db_user import DBUser
+from nekro_agent.models.db_chat_channel import DBChatChannel
+from pydantic import BaseModel, ValidationError
+
+# 单条 IN 查询携带的最大键数量，避免超出数据库的参数个数限制
+_IN_QUERY_CHUNK_SIZE = 500
+
+# 导出时每批从数据库读取的记录数
+EXPORT_CHUNK_SIZE = 500
+
+# 后台转换记录编码时每批处理的记录数
+MIGRATION_CHUNK_SIZE = 500
+
+# 列表查询中可用于文本搜索的字段
+USER_SEARCH_FIELDS = ("user_id", "username", "nickname", "relationship")
+GROUP_SEARCH_FIELDS = ("group_id", "channel_name")
+
+# 正在进行中的数据创建/修复任务，用于合并同一键的并发未命中
+_pending_user_syncs: Dict[str, "asyncio.Future[Optional[UserAttitude]]"] = {}
+_pending_group_syncs: Dict[str, "asyncio.Future[Optional[GroupAttitude]]"] = {}
+
+# 合并窗口内尚未写入的更新: 键 -> (合并后的字段, 写入任务)
+_coalescing_user_updates: Dict[str, Tuple[Dict[str, str], "asyncio.Future[None]"]] = {}
+_coalescing_group_updates: Dict[str, Tuple[Dict[str, str], "asyncio.Future[None]"]] = {}
+
+
+class VersionConflictError(Exception):
+    """写入时记录的版本号与调用方读取时的版本号不一致"""
+
+    def __init__(self, key: str, expected: int, actual: int):
+        super().__init__(f"记录 {key} 已被修改: 期望版本 {expected}，当前版本 {actual}")
+        self.key = key
+        self.expected = expected
+        self.actual = actual
+
+
+async def _join_pending(pending_map: Dict[str, "asyncio.Future"], key: str, factory) -> Any:
+    """同一键的并发调用共享同一个任务"""
+    pending = pending_map.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(factory())
+        pending_map[key] = pending
+        pending.add_done_callback(lambda _: pending_map.pop(key, None))
+    # 使用 shield 防止某个调用方被取消时连带取消其他调用方共享的任务
+    return await asyncio.shield(pending)
+
+
+async def get_user_attitude(store, user_key: str) -> Optional[UserAttitude]:
+    """获取用户态度数据，优先从缓存读取
+
+    Args:
+        store: 存储对象
+        user_key: 用户ID
+
+    Returns:
+        Optional[UserAttitude]: 用户态度数据，不存在时返回 None
+    """
+    user_attitude = user_cache.get(user_key)
+    if user_attitude is not None:
+        return user_attitude
+
+    # 读取时不持有锁，记录在读取期间被写入时不用读到的旧值填充缓存
+    version = user_cache.version(user_key)
+    stored_user_json = await store.get(user_key=user_key, store_key="user_info")
+    if not stored_user_json:
+        return None
+    user_attitude = decode_record(UserAttitude, stored_user_json)
+    user_cache.fill(user_key, user_attitude, version)
+    return user_attitude
+
+
+async def _reconcile_user_locked(store, user_key: str) -> Optional[UserAttitude]:
+    async with user_locks.hold(user_key):
+        return await reconcile_user(store, user_key)
+
+
+async def _reconcile_group_locked(store, chat_key: str) -> Optional[GroupAttitude]:
+    async with group_locks.hold(chat_key):
+        return await reconcile_group(store, chat_key)
+
+
+async def ensure_user_attitude(store, user_key: str) -> Optional[UserAttitude]:
+    """获取用户态度数据，缺失时只为该用户创建记录，格式错误时只修复该记录
+
+    同一用户的并发调用会共享同一个创建任务，不会重复查询和写入。
+
+    Args:
+        store: 存储对象
+        user_key: 用户ID
+
+    Returns:
+        Optional[UserAttitude]: 用户态度数据，数据库中不存在该用户或修复失败时返回 None
+    """
+    try:
+        user_attitude = await get_user_attitude(store, user_key)
+    except ValidationError as e:
+        logger.warning(f"用户态度数据格式错误，尝试修复: user_key={user_key}, error={e}")
+        user_attitude = None
+    if user_attitude is not None:
+        return user_attitude
+    return await _join_pending(_pending_user_syncs, user_key, lambda: _reconcile_user_locked(store, user_key))
+
+
+async def ensure_group_attitude(store, chat_key: str) -> Optional[GroupAttitude]:
+    """获取群组态度数据，缺失时只为该群组创建记录，格式错误时只修复该记录
+
+    Args:
+        store: 存储对象
+        chat_key: 群组ID
+
+    Returns:
+        Optional[GroupAttitude]: 群组态度数据，数据库中不存在该群组或修复失败时返回 None
+    """
+    try:
+        group_attitude = await get_group_attitude(store, chat_key)
+    except ValidationError as e:
+        logger.warning(f"群组态度数据格式错误，尝试修复: chat_key={chat_key}, error={e}")
+        group_attitude = None
+    if group_attitude is not None:
+        return group_attitude
+    return await _join_pending(_pending_group_syncs, chat_key, lambda: _reconcile_group_locked(store, chat_key))
+
+
+async def get_group_attitude(store, chat_key: str) -> Optional[GroupAttitude]:
+    """获取群组态度数据，优先从缓存读取
+
+    Args:
+        store: 存储对象
+        chat_key: 群组ID
+
+    Returns:
+        Optional[GroupAttitude]: 群组态度数据，不存在时返回 None
+    """
+    group_attitude = group_cache.get(chat_key)
+    if group_attitude is not None:
+        return group_attitude
+
+    # 读取时不持有锁，记录在读取期间被写入时不用读到的旧值填充缓存
+    version = group_cache.version(chat_key)
+    stored_group_json = await store.get(chat_key=chat_key, store_key="group_info")
+    if not stored_group_json:
+        return None
+    group_attitude = decode_record(GroupAttitude, stored_group_json)
+    group_cache.fill(chat_key, group_attitude, version)
+    return group_attitude
+
+
+async def get_user_attitudes(store, user_keys: Iterable[str]) -> Dict[str, UserAttitude]:
+    """批量获取用户态度数据
+
+    缓存命中的记录直接返回，其余记录通过 `IN` 查询一次性从数据库中取出。
+
+    Args:
+        store: 存储对象
+        user_keys: 用户ID列表
+
+    Returns:
+        Dict[str, UserAttitude]: 用户ID到用户态度数据的映射，不存在或格式错误的用户不会出现在结果中
+    """
+    result: Dict[str, UserAttitude] = {}
+    missing: List[str] = []
+    for user_key in dict.fromkeys(user_keys):
+        user_attitude = user_cache.get(user_key)
+        if user_attitude is not None:
+            result[user_key] = user_attitude
+        else:
+            missing.append(user_key)
+
+    for start in range(0, len(missing), _IN_QUERY_CHUNK_SIZE):
+        chunk = missing[start:start + _IN_QUERY_CHUNK_SIZE]
+        # 查询期间被写入的记录不用读到的旧值填充缓存
+        versions = {user_key: user_cache.version(user_key) for user_key in chunk}
+        rows = await DBPluginData.filter(
+            plugin_key=plugin.key,
+            data_key="user_info",
+            target_chat_key="",
+            target_user_key__in=chunk,
+        ).values_list("target_user_key", "data_value")
+        rows = [(user_key, value) for user_key, value in rows if value]
+        decoded = decode_records(UserAttitude, [value for _, value in rows])
+        for (user_key, _), user_attitude in zip(rows, decoded):
+            if isinstance(user_attitude, ValidationError):
+                logger.error(f"用户态度数据格式错误: user_key={user_key}, error={user_attitude}")
+                continue
+            user_cache.fill(user_key, user_attitude, versions[user_key])
+            result[user_key] = user_attitude
+
+    return result
+
+
+async def get_group_attitudes(store, chat_keys: Iterable[str]) -> Dict[str, GroupAttitude]:
+    """批量获取群组态度数据
+
+    Args:
+        store: 存储对象
+        chat_keys: 群组ID列表
+
+    Returns:
+        Dict[str, GroupAttitude]: 群组ID到群组态度数据的映射，不存在或格式错误的群组不会出现在结果中
+    """
+    result: Dict[str, GroupAttitude] = {}
+    missing: List[str] = []
+    for chat_key in dict.fromkeys(chat_keys):
+        group_attitude = group_cache.get(chat_key)
+        if group_attitude is not None:
+            result[chat_key] = group_attitude
+        else:
+            missing.append(chat_key)
+
+    for start in range(0, len(missing), _IN_QUERY_CHUNK_SIZE):
+        chunk = missing[start:start + _IN_QUERY_CHUNK_SIZE]
+        # 查询期间被写入的记录不用读到的旧值填充缓存
+        versions = {chat_key: group_cache.version(chat_key) for chat_key in chunk}
+        rows = await DBPluginData.filter(
+            plugin_key=plugin.key,
+            data_key="group_info",
+            target_user_key="",
+            target_chat_key__in=chunk,
+        ).values_list("target_chat_key", "data_value")
+        rows = [(chat_key, value) for chat_key, value in rows if value]
+        decoded = decode_records(GroupAttitude, [value for _, value in rows])
+        for (chat_key, _), group_attitude in zip(rows, decoded):
+            if isinstance(group_attitude, ValidationError):
+                logger.error(f"群组态度数据格式错误: chat_key={chat_key}, error={group_attitude}")
+                continue
+            group_cache.fill(chat_key, group_attitude, versions[chat_key])
+            result[chat_key] = group_attitude
+
+    return result
+
+
+def _matches(record: Dict[str, Any], search: Optional[str], search_fields: Tuple[str, ...], filters: Dict[str, str]) -> bool:
+    """判断记录是否满足搜索词和字段筛选（均为不区分大小写的包含匹配）"""
+    if search:
+        term = search.lower()
+        if not any(term in str(record.get(field, "")).lower() for field in search_fields):
+            return False
+    for field, value in filters.items():
+        if value.lower() not in str(record.get(field, "")).lower():
+            return False
+    return True
+
+
+def _sort_value(record: Dict[str, Any], field: str) -> Any:
+    value = record.get(field)
+    if field == "id":
+        return value if isinstance(value, int) else 0
+    return str(value) if value is not None else ""
+
+
+async def _query_records(
+    model: Type[BaseModel],
+    data_key: str,
+    key_column: str,
+    key_field: str,
+    search_fields: Tuple[str, ...],
+    index: SearchIndex,
+    search: Optional[str],
+    filters: Optional[Dict[str, str]],
+    sort: Optional[str],
+    descending: bool,
+    offset: int,
+    limit: Optional[int],
+) -> Tuple[int, List[Any]]:
+    """在服务端完成列表的筛选、排序和分页，只校验当前页的记录"""
+    filters = {field: value for field, value in (filters or {}).items() if value}
+    empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+    queryset = DBPluginData.filter(plugin_key=plugin.key, data_key=data_key, **{empty_column: ""})
+
+    # 无筛选且按主键排序时，计数、排序和分页全部交给数据库完成
+    if not search and not filters and sort in (None, key_field):
+        order_column = key_column if sort == key_field else "id"
+        total = await queryset.count()
+        page_query = queryset.order_by(f"-{order_column}" if descending else order_column).offset(offset)
+        if limit is not None:
+            page_query = page_query.limit(limit)
+        rows = await page_query.values_list("data_value", flat=True)
+        page = decode_records(model, [value for value in rows if value])
+        for record in page:
+            if isinstance(record, ValidationError):
+                raise record
+        return total, page
+
+    records: List[Dict[str, Any]] = []
+    # 索引中的记录已经校验过，按字段字典匹配后直接返回原对象，不再转换和重新校验
+    validated: Dict[int, BaseModel] = {}
+    if search and index.ready:
+        # 搜索索引就绪时直接由索引给出命中记录，结果恢复为按 id 排列
+        _, hits = index.search(search, fields=search_fields)
+        for hit, _ in hits:
+            record = hit.__dict__
+            if _matches(record, None, search_fields, filters):
+                records.append(record)
+                validated[id(record)] = hit
+        records.sort(key=lambda record: _sort_value(record, "id"))
+    else:
+        # 先在数据库中按原始 JSON 文本粗筛（两种编码中字段值的写法相同），再在内存中按字段精确匹配
+        for term in ([search] if search else []) + list(filters.values()):
+            if not any(char in term for char in '"\\') and term.isprintable():
+                queryset = queryset.filter(data_value__icontains=term)
+
+        for value in await queryset.values_list("data_value", flat=True):
+            if not value:
+                continue
+            record = load_fields(model, value)
+            if record is not None and _matches(record, search, search_fields, filters):
+                records.append(record)
+
+    if sort:
+        records.sort(key=lambda record: _sort_value(record, sort), reverse=descending)
+    elif descending:
+        records.reverse()
+
+    page = records[offset:offset + limit] if limit is not None else records[offset:]
+    return len(records), [validated.get(id(record)) or model.model_validate(record) for record in page]
+
+
+async def query_user_attitudes(
+    store,
+    search: Optional[str] = None,
+    filters: Optional[Dict[str, str]] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[int, List[UserAttitude]]:
+    """分页查询用户态度列表
+
+    Args:
+        store: 存储对象
+        search: 在 USER_SEARCH_FIELDS 中搜索的关键词
+        filters: 字段名到关键词的映射，要求对应字段包含该关键词
+        sort: 排序字段，None 表示按写入顺序
+        descending: 是否倒序
+        offset: 跳过的记录数
+        limit: 返回的最大记录数，None 表示不限制
+
+    Returns:
+        Tuple[int, List[UserAttitude]]: (满足条件的总数, 当前页的用户态度列表)
+    """
+    return await _query_records(
+        UserAttitude, "user_info", "target_user_key", "user_id", USER_SEARCH_FIELDS, user_index,
+        search, filters, sort, descending, offset, limit,
+    )
+
+
+async def query_group_attitudes(
+    store,
+    search: Optional[str] = None,
+    filters: Optional[Dict[str, str]] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[int, List[GroupAttitude]]:
+    """分页查询群组态度列表
+
+    参数含义与 `query_user_attitudes` 相同，搜索字段为 GROUP_SEARCH_FIELDS。
+
+    Returns:
+        Tuple[int, List[GroupAttitude]]: (满足条件的总数, 当前页的群组态度列表)
+    """
+    return await _query_records(
+        GroupAttitude, "group_info", "target_chat_key", "group_id", GROUP_SEARCH_FIELDS, group_index,
+        search, filters, sort, descending, offset, limit,
+    )
+
+
+async def _iter_records(model: Type[BaseModel], data_key: str, key_column: str, chunk_size: int) -> AsyncIterator[Any]:
+    """按主键顺序分批读取全部记录，每批以上一批最后的主键为起点，内存占用与记录总数无关"""
+    empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+    last_id = 0
+    while True:
+        rows = await DBPluginData.filter(
+            plugin_key=plugin.key, data_key=data_key, id__gt=last_id, **{empty_column: ""}
+        ).order_by("id").limit(chunk_size).values_list("id", key_column, "data_value")
+        chunk = [(key, value) for _, key, value in rows if value]
+        for (key, _), record in zip(chunk, decode_records(model, [value for _, value in chunk])):
+            if isinstance(record, ValidationError):
+                logger.error(f"导出时跳过格式错误的记录: {data_key}={key}, error={record}")
+            else:
+                yield record
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+def iter_user_attitudes(store, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[UserAttitude]:
+    """逐条迭代全部用户态度数据，用于流式导出
+
+    Args:
+        store: 存储对象
+        chunk_size: 每批从数据库读取的记录数
+
+    Returns:
+        AsyncIterator[UserAttitude]: 按创建顺序排列的用户态度数据，格式错误的记录会被跳过
+    """
+    return _iter_records(UserAttitude, "user_info", "target_user_key", chunk_size)
+
+
+def iter_group_attitudes(store, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[GroupAttitude]:
+    """逐条迭代全部群组态度数据，用于流式导出，参数含义与 `iter_user_attitudes` 相同"""
+    return _iter_records(GroupAttitude, "group_info", "target_chat_key", chunk_size)
+
+
+async def build_search_indexes(store) -> None:
+    """从数据库加载全部记录，建立用户和群组的搜索索引"""
+    try:
+        await asyncio.gather(
+            user_index.ensure_built(lambda: iter_user_attitudes(store)),
+            group_index.ensure_built(lambda: iter_group_attitudes(store)),
+        )
+        logger.info(f"Attitude 插件搜索索引已建立: 用户 {len(user_index)}，群组 {len(group_index)}")
+    except Exception as e:
+        logger.error(f"建立搜索索引失败，将在首次搜索时重试: {e}")
+
+
+async def search_user_attitudes(
+    store, query: str, offset: int = 0, limit: Optional[int] = None
+) -> Tuple[int, List[Tuple[UserAttitude, float]]]:
+    """按相关度搜索用户态度数据
+
+    在QQ号、用户名、称呼、关系、态度和其他信息中做不区分大小写的包含匹配，
+    索引尚未建立时会先从数据库加载。
+
+    Args:
+        store: 存储对象
+        query: 搜索词
+        offset: 跳过的结果数量
+        limit: 返回的最大数量，None 表示全部
+
+    Returns:
+        Tuple[int, List[Tuple[UserAttitude, float]]]: (命中总数, 当前页的 (用户态度, 得分) 列表)
+    """
+    await user_index.ensure_built(lambda: iter_user_attitudes(store))
+    return user_index.search(query, offset, limit)
+
+
+async def search_group_attitudes(
+    store, query: str, offset: int = 0, limit: Optional[int] = None
+) -> Tuple[int, List[Tuple[GroupAttitude, float]]]:
+    """按相关度搜索群组态度数据，参数与返回值含义同 `search_user_attitudes`"""
+    await group_index.ensure_built(lambda: iter_group_attitudes(store))
+    return group_index.search(query, offset, limit)
+
+
+async def get_user_changes(store, since: int) -> Optional[Tuple[List[UserAttitude], List[str]]]:
+    """获取数据集版本 since 之后变更过的用户态度数据
+
+    Args:
+        store: 存储对象
+        since: 上次获取时的数据集版本号
+
+    Returns:
+        Optional[Tuple[List[UserAttitude], List[str]]]: (新增或更新的记录, 已删除的用户ID)，
+        无法计算增量时返回 None，调用方应改为获取全部记录
+    """
+    user_keys = user_cache.changed_since(since)
+    if user_keys is None:
+        return None
+    user_attitudes = await get_user_attitudes(store, user_keys)
+    return (
+        [user_attitudes[user_key] for user_key in user_keys if user_key in user_attitudes],
+        [user_key for user_key in user_keys if user_key not in user_attitudes],
+    )
+
+
+async def get_group_changes(store, since: int) -> Optional[Tuple[List[GroupAttitude], List[str]]]:
+    """获取数据集版本 since 之后变更过的群组态度数据，参数与返回值含义同 `get_user_changes`"""
+    chat_keys = group_cache.changed_since(since)
+    if chat_keys is None:
+        return None
+    group_attitudes = await get_group_attitudes(store, chat_keys)
+    return (
+        [group_attitudes[chat_key] for chat_key in chat_keys if chat_key in group_attitudes],
+        [chat_key for chat_key in chat_keys if chat_key not in group_attitudes],
+    )
+
 
 async def update_user_attitude(
     store, 
@@ -18,27 +506,67 @@ async def update_user_attitude(
     nickname: Optional[str] = None,
     attitude: Optional[str] = None,
     relationship: Optional[str] = None,
-    other: Optional[str] = None
+    other: Optional[str] = None,
+    expected_version: Optional[int] = None,
+) -> None:
+    """更新用户态度数据，值为 None 的字段保持不变，更新后与已存储的数据相同时跳过写入
+
+    同一用户的更新在锁内串行执行；传入 expected_version 时，
+    记录的当前版本号不一致会抛出 VersionConflictError，不存在的记录版本号视为 0。
+    """
+    with metrics.timer("write_seconds", kind="user", source=change_source.get()):
+        async with user_locks.hold(user_key):
+            await _update_user_attitude_locked(
+                store, user_key, username, nickname, attitude, relationship, other, expected_version
+            )
+
+
+async def _update_user_attitude_locked(
+    store,
+    user_key: str,
+    username: Optional[str],
+    nickname: Optional[str],
+    attitude: Optional[str],
+    relationship: Optional[str],
+    other: Optional[str],
+    expected_version: Optional[int],
 ) -> None:
-    """更新用户态度数据"""
+    # 在锁内直接读取已存储的记录而不经过缓存，版本号检查和合并都基于数据库中的最新值
     stored_user_json = await store.get(user_key=user_key, store_key="user_info")
-    logger.debug(f"更新用户 {user_key} 的数据，原始数据: {stored_user_json}")
-    if stored_user_json:
-        user_attitude = UserAttitude.model_validate_json(stored_user_json)
-        if attitude is not None:
-            user_attitude.attitude = attitude
-        if username is not None:
-            user_attitude.username = username
-        if nickname is not None:
-            user_attitude.nickname = nickname
-        if relationship is not None:
-            user_attitude.relationship = relationship
-        if other is not None:
-            user_attitude.other = other
-        await store.set(user_key=user_key, store_key="user_info", value=user_attitude.model_dump_json())
+    try:
+        user_attitude = decode_record(UserAttitude, stored_user_json) if stored_user_json else None
+    except ValidationError:
+        logger.warning(f"用户 {user_key} 的数据格式错误，尝试修复...")
+        user_attitude = None
+    if user_attitude is None:
+        # 数据缺失或格式错误时，先按数据库中的用户信息创建或修复该记录
+        user_attitude = await reconcile_user(store, user_key)
+    current_version = user_attitude.version if user_attitude is not None else 0
+    if expected_version is not None and expected_version != current_version:
+        raise VersionConflictError(user_key, expected_version, current_version)
+
+    updates = {
+        field: value
+        for field, value in (
+            ("username", username),
+            ("nickname", nickname),
+            ("attitude", attitude),
+            ("relationship", relationship),
+            ("other", other),
+        )
+        if value is not None
+    }
+    if user_attitude is not None:
+        updated = user_attitude.model_copy(update=updates)
+        if updated == user_attitude:
+            logger.debug(f"用户 {user_key} 的态度数据没有变化，跳过写入")
+            metrics.inc("writes_skipped_total", kind="user")
+            return
+        updated.version = current_version + 1
     else:
         # 如果用户不存在，则创建新的用户态度对象
-        user_attitude = UserAttitude(
+        updated = UserAttitude(
+            id=0,  # 数据库中不存在该用户，没有对应的ID
             user_id=user_key,
             username=username or "",
             nickname=nickname or "",
@@ -46,34 +574,130 @@ async def update_user_attitude(
             relationship=relationship or "",
             other=other or ""
         )
-        await store.set(user_key=user_key, store_key="user_info", value=user_attitude.model_dump_json())
+    await store.set(user_key=user_key, store_key="user_info", value=encode_record(updated))
+    user_cache.write(user_key, updated)
+    metrics.inc("writes_total", kind="user")
 
 
 async def update_group_attitude(
     store, 
     chat_key: str, 
     attitude: Optional[str] = None, 
-    other: Optional[str] = None
+    other: Optional[str] = None,
+    expected_version: Optional[int] = None,
 ) -> None:
-    """更新群组态度数据"""
+    """更新群组态度数据，值为 None 的字段保持不变，更新后与已存储的数据相同时跳过写入
+
+    并发控制与 `update_user_attitude` 相同。
+    """
+    with metrics.timer("write_seconds", kind="group", source=change_source.get()):
+        async with group_locks.hold(chat_key):
+            await _update_group_attitude_locked(store, chat_key, attitude, other, expected_version)
+
+
+async def _update_group_attitude_locked(
+    store,
+    chat_key: str,
+    attitude: Optional[str],
+    other: Optional[str],
+    expected_version: Optional[int],
+) -> None:
+    # 在锁内直接读取已存储的记录而不经过缓存，版本号检查和合并都基于数据库中的最新值
     stored_group_json = await store.get(chat_key=chat_key, store_key="group_info")
+    try:
+        group_attitude = decode_record(GroupAttitude, stored_group_json) if stored_group_json else None
+    except ValidationError:
+        logger.warning(f"群组 {chat_key} 的数据格式错误，尝试修复...")
+        group_attitude = None
+    if group_attitude is None:
+        # 数据缺失或格式错误时，先按数据库中的群组信息创建或修复该记录
+        group_attitude = await reconcile_group(store, chat_key)
+    current_version = group_attitude.version if group_attitude is not None else 0
+    if expected_version is not None and expected_version != current_version:
+        raise VersionConflictError(chat_key, expected_version, current_version)
 
-    if stored_group_json:
-        group_attitude = GroupAttitude.model_validate_json(stored_group_json)
-        if attitude is not None:
-            group_attitude.attitude = attitude
-        if other is not None:
-            group_attitude.other = other
-        await store.set(chat_key=chat_key, store_key="group_info", value=group_attitude.model_dump_json())
+    updates = {field: value for field, value in (("attitude", attitude), ("other", other)) if value is not None}
+    if group_attitude is not None:
+        updated = group_attitude.model_copy(update=updates)
+        if updated == group_attitude:
+            logger.debug(f"群组 {chat_key} 的态度数据没有变化，跳过写入")
+            metrics.inc("writes_skipped_total", kind="group")
+            return
+        updated.version = current_version + 1
     else:
         # 如果群组不存在，则创建新的群组态度对象
-        group_attitude = GroupAttitude(
+        updated = GroupAttitude(
+            id=0,  # 数据库中不存在该群组，没有对应的ID
             group_id=chat_key,
             channel_name="", # 默认值，后续可能需要从其他地方获取
             attitude=attitude or "",
             other=other or ""
         )
-        await store.set(chat_key=chat_key, store_key="group_info", value=group_attitude.model_dump_json())
+    await store.set(chat_key=chat_key, store_key="group_info", value=encode_record(updated))
+    group_cache.write(chat_key, updated)
+    metrics.inc("writes_total", kind="group")
+
+
+async def _coalesce(
+    pending_map: Dict[str, Tuple[Dict[str, str], "asyncio.Future[None]"]],
+    key: str,
+    fields: Dict[str, Optional[str]],
+    writer: Callable[[Dict[str, str]], Awaitable[None]],
+    kind: str,
+) -> None:
+    """在合并窗口内把同一键的多次更新合并为一次写入，后到的字段覆盖先到的"""
+    fields = {field: value for field, value in fields.items() if value is not None}
+    window = config.WriteCoalesceWindow / 1000
+    if window <= 0:
+        await writer(fields)
+        return
+
+    entry = pending_map.get(key)
+    if entry is not None:
+        entry[0].update(fields)
+        metrics.inc("writes_coalesced_total", kind=kind)
+        flush = entry[1]
+    else:
+        merged = dict(fields)
+
+        async def flush_later() -> None:
+            await asyncio.sleep(window)
+            # 先移出等待表，写入期间到达的更新会开启新的窗口
+            pending_map.pop(key, None)
+            await writer(merged)
+
+        flush = asyncio.ensure_future(flush_later())
+        pending_map[key] = (merged, flush)
+    # 使用 shield 防止某个调用方被取消时连带取消合并后的写入
+    await asyncio.shield(flush)
+
+
+async def queue_user_attitude_update(store, user_key: str, **fields: Optional[str]) -> None:
+    """在合并窗口内合并同一用户的更新后再写入，用于 AI 频繁调用的更新工具
+
+    Args:
+        store: 存储对象
+        user_key: 用户ID
+        **fields: 需要更新的字段，与 `update_user_attitude` 的参数相同，值为 None 的字段保持不变
+    """
+    await _coalesce(
+        _coalescing_user_updates,
+        user_key,
+        fields,
+        lambda merged: update_user_attitude(store, user_key, **merged),
+        "user",
+    )
+
+
+async def queue_group_attitude_update(store, chat_key: str, **fields: Optional[str]) -> None:
+    """在合并窗口内合并同一群组的更新后再写入，参数含义同 `queue_user_attitude_update`"""
+    await _coalesce(
+        _coalescing_group_updates,
+        chat_key,
+        fields,
+        lambda merged: update_group_attitude(store, chat_key, **merged),
+        "group",
+    )
 
 
 async def delete_user_attitude(store, user_key: str) -> Tuple[bool, str]:
@@ -86,24 +710,26 @@ async def delete_user_attitude(store, user_key: str) -> Tuple[bool, str]:
     Returns:
         Tuple[bool, str]: (是否成功, 消息)
     """
-    try:
-        # 检查用户是否存在
-        stored_user_json = await store.get(user_key=user_key, store_key="user_info")
-        if not stored_user_json:
-            return False, f"用户 {user_key} 不存在"
+    async with user_locks.hold(user_key):
+        try:
+            # 检查用户是否存在
+            stored_user_json = await store.get(user_key=user_key, store_key="user_info")
+            if not stored_user_json:
+                return False, f"用户 {user_key} 不存在"
         
-        # 从数据库中删除用户态度数据
-        a = await store.delete(user_key=user_key, store_key="user_info")
+            # 从数据库中删除用户态度数据
+            a = await store.delete(user_key=user_key, store_key="user_info")
+            user_cache.delete(user_key)
         
-        if a == 0:
-            logger.debug(f"成功删除用户 {user_key} 的态度数据")
-            return True, f"成功删除用户 {user_key} 的态度数据"
-        else:
-            logger.warning(f"未能删除用户 {user_key} 的态度数据")
-            return False, f"未能删除用户 {user_key} 的态度数据"
-    except Exception as e:
-        logger.error(f"删除用户 {user_key} 的态度数据时出错: {e}")
-        return False, f"删除用户态度数据时出错: {e}"
+            if a == 0:
+                logger.debug(f"成功删除用户 {user_key} 的态度数据")
+                return True, f"成功删除用户 {user_key} 的态度数据"
+            else:
+                logger.warning(f"未能删除用户 {user_key} 的态度数据")
+                return False, f"未能删除用户 {user_key} 的态度数据"
+        except Exception as e:
+            logger.error(f"删除用户 {user_key} 的态度数据时出错: {e}")
+            return False, f"删除用户态度数据时出错: {e}"
 
 
 async def delete_group_attitude(store, chat_key: str) -> Tuple[bool, str]:
@@ -116,22 +742,335 @@ async def delete_group_attitude(store, chat_key: str) -> Tuple[bool, str]:
     Returns:
         Tuple[bool, str]: (是否成功, 消息)
     """
-    try:
-        # 检查群组是否存在
-        stored_group_json = await store.get(chat_key=chat_key, store_key="group_info")
-        if not stored_group_json:
-            return False, f"群组 {chat_key} 不存在"
+    async with group_locks.hold(chat_key):
+        try:
+            # 检查群组是否存在
+            stored_group_json = await store.get(chat_key=chat_key, store_key="group_info")
+            if not stored_group_json:
+                return False, f"群组 {chat_key} 不存在"
         
-        # 从数据库中删除群组态度数据
-        a = await store.delete(chat_key=chat_key, store_key="group_info")
+            # 从数据库中删除群组态度数据
+            a = await store.delete(chat_key=chat_key, store_key="group_info")
+            group_cache.delete(chat_key)
 
         
-        if a == 0:
-            logger.debug(f"成功删除群组 {chat_key} 的态度数据")
-            return True, f"成功删除群组 {chat_key} 的态度数据"
+            if a == 0:
+                logger.debug(f"成功删除群组 {chat_key} 的态度数据")
+                return True, f"成功删除群组 {chat_key} 的态度数据"
+            else:
+                logger.warning(f"未能删除群组 {chat_key} 的态度数据")
+                return False, f"未能删除群组 {chat_key} 的态度数据"
+        except Exception as e:
+            logger.error(f"删除群组 {chat_key} 的态度数据时出错: {e}")
+            return False, f"删除群组态度数据时出错: {e}"
+
+
+async def _load_rows(data_key: str, key_column: str, keys: List[str]) -> Dict[str, List[DBPluginData]]:
+    """分块 IN 查询取出指定键的全部记录，每个键的记录按 id 升序排列，第一条与 store.get 读取的一致"""
+    empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+    rows: Dict[str, List[DBPluginData]] = {}
+    for start in range(0, len(keys), _IN_QUERY_CHUNK_SIZE):
+        for row in await DBPluginData.filter(
+            plugin_key=plugin.key,
+            data_key=data_key,
+            **{empty_column: "", f"{key_column}__in": keys[start:start + _IN_QUERY_CHUNK_SIZE]},
+        ).order_by("id"):
+            rows.setdefault(getattr(row, key_column), []).append(row)
+    return rows
+
+
+def _stage_record(
+    data_key: str,
+    key: str,
+    row: Optional[DBPluginData],
+    record: BaseModel,
+    to_create: List[DBPluginData],
+    to_update: List[DBPluginData],
+) -> None:
+    """将记录加入待新增或待更新列表"""
+    if row is None:
+        to_create.append(DBPluginData(
+            plugin_key=plugin.key,
+            target_chat_key="" if data_key == "user_info" else key,
+            target_user_key=key if data_key == "user_info" else "",
+            data_key=data_key,
+            data_value=encode_record(record),
+        ))
+    else:
+        row.data_value = encode_record(record)
+        to_update.append(row)
+
+
+async def bulk_update_user_attitudes(
+    store,
+    updates: Dict[str, Dict[str, Optional[str]]],
+    expected_versions: Optional[Dict[str, int]] = None,
+) -> List[BatchItemResult]:
+    """批量新增或更新用户态度数据
+
+    值为 None 的字段保持不变。记录缺失或格式错误时按数据库中的用户信息创建或修复；
+    store 和数据库中都不存在的用户不会创建，action 为 not_found，与 WebUI 的单条更新一致。
+    所有写入在同一个事务中分块批量执行，执行期间持有全部相关用户的锁。
+
+    Args:
+        store: 存储对象
+        updates: 用户ID到需要更新的字段的映射
+        expected_versions: 用户ID到调用方读取时的版本号的映射，版本号不一致的项 action 为 conflict
+
+    Returns:
+        List[BatchItemResult]: 与 updates 顺序一致的逐项结果
+    """
+    with metrics.timer("write_seconds", kind="user_batch", source=change_source.get()):
+        async with user_locks.hold_many(updates):
+            return await _bulk_update_user_attitudes_locked(updates, expected_versions or {})
+
+
+async def _bulk_update_user_attitudes_locked(
+    updates: Dict[str, Dict[str, Optional[str]]],
+    expected_versions: Dict[str, int],
+) -> List[BatchItemResult]:
+    user_keys = list(updates)
+    rows = await _load_rows("user_info", "target_user_key", user_keys)
+
+    # 记录缺失或格式错误的用户需要数据库中的用户信息
+    records: Dict[str, UserAttitude] = {}
+    for user_key in user_keys:
+        row = rows.get(user_key, [None])[0]
+        if row is not None and row.data_value:
+            try:
+                records[user_key] = decode_record(UserAttitude, row.data_value)
+            except ValidationError:
+                logger.warning(f"用户 {user_key} 的数据格式错误，尝试修复...")
+    missing = [user_key for user_key in user_keys if user_key not in records]
+    db_users: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(missing), _IN_QUERY_CHUNK_SIZE):
+        for user in await DBUser.filter(
+            platform_userid__in=missing[start:start + _IN_QUERY_CHUNK_SIZE], id__not=1
+        ).values("id", "platform_userid", "username"):
+            db_users[user["platform_userid"]] = user
+
+    results: List[BatchItemResult] = []
+    to_create: List[DBPluginData] = []
+    to_update: List[DBPluginData] = []
+    written: Dict[str, UserAttitude] = {}
+    for user_key, fields in updates.items():
+        row = rows.get(user_key, [None])[0]
+        user_attitude = records.get(user_key)
+        if user_attitude is None:
+            if row is None and user_key not in db_users:
+                results.append(BatchItemResult(key=user_key, success=False, action="not_found", message=f"用户 {user_key} 不存在"))
+                continue
+            # 已有记录但数据库中已不存在该用户时以默认值修复，没有对应的ID
+            db_user = db_users.get(user_key, {"id": 0, "username": ""})
+            user_attitude = build_user_record(user_key, db_user["id"], db_user["username"], row.data_value if row else None)
+            if user_attitude is None:
+                results.append(BatchItemResult(key=user_key, success=False, action="failed", message=f"用户 {user_key} 的数据格式错误且无法修复"))
+                continue
+        current_version = records[user_key].version if user_key in records else 0
+        expected_version = expected_versions.get(user_key)
+        if expected_version is not None and expected_version != current_version:
+            results.append(BatchItemResult(
+                key=user_key, success=False, action="conflict",
+                message=f"用户 {user_key} 已被修改: 期望版本 {expected_version}，当前版本 {current_version}",
+            ))
+            continue
+        updated = user_attitude.model_copy(update={field: value for field, value in fields.items() if value is not None})
+        if user_key in records and updated == user_attitude:
+            metrics.inc("writes_skipped_total", kind="user")
+            results.append(BatchItemResult(key=user_key, success=True, action="unchanged", message=f"用户 {user_key} 的数据没有变化"))
+            continue
+        if user_key in records:
+            updated.version = current_version + 1
+        user_attitude = updated
+        _stage_record("user_info", user_key, row, user_attitude, to_create, to_update)
+        written[user_key] = user_attitude
+        if row is None:
+            results.append(BatchItemResult(key=user_key, success=True, action="created", message=f"用户 {user_key} 已创建"))
         else:
-            logger.warning(f"未能删除群组 {chat_key} 的态度数据")
-            return False, f"未能删除群组 {chat_key} 的态度数据"
+            results.append(BatchItemResult(key=user_key, success=True, action="updated", message=f"用户 {user_key} 已更新"))
+
+    await bulk_write_atomic(to_create, to_update)
+    for user_key, user_attitude in written.items():
+        user_cache.write(user_key, user_attitude)
+    metrics.inc("writes_total", len(written), kind="user")
+    logger.debug(f"批量写入用户态度数据: 新增 {len(to_create)}，更新 {len(to_update)}")
+    return results
+
+
+async def bulk_update_group_attitudes(
+    store,
+    updates: Dict[str, Dict[str, Optional[str]]],
+    expected_versions: Optional[Dict[str, int]] = None,
+) -> List[BatchItemResult]:
+    """批量新增或更新群组态度数据，参数与返回值含义同 `bulk_update_user_attitudes`"""
+    with metrics.timer("write_seconds", kind="group_batch", source=change_source.get()):
+        async with group_locks.hold_many(updates):
+            return await _bulk_update_group_attitudes_locked(updates, expected_versions or {})
+
+
+async def _bulk_update_group_attitudes_locked(
+    updates: Dict[str, Dict[str, Optional[str]]],
+    expected_versions: Dict[str, int],
+) -> List[BatchItemResult]:
+    chat_keys = list(updates)
+    rows = await _load_rows("group_info", "target_chat_key", chat_keys)
+
+    # 记录缺失或格式错误的群组需要数据库中的群组信息
+    records: Dict[str, GroupAttitude] = {}
+    for chat_key in chat_keys:
+        row = rows.get(chat_key, [None])[0]
+        if row is not None and row.data_value:
+            try:
+                records[chat_key] = decode_record(GroupAttitude, row.data_value)
+            except ValidationError:
+                logger.warning(f"群组 {chat_key} 的数据格式错误，尝试修复...")
+    missing = [chat_key for chat_key in chat_keys if chat_key not in records]
+    db_groups: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(missing), _IN_QUERY_CHUNK_SIZE):
+        for group in await DBChatChannel.filter(
+            channel_id__in=missing[start:start + _IN_QUERY_CHUNK_SIZE], channel_type="group"
+        ).values("id", "channel_id", "channel_name"):
+            db_groups[group["channel_id"]] = group
+
+    results: List[BatchItemResult] = []
+    to_create: List[DBPluginData] = []
+    to_update: List[DBPluginData] = []
+    written: Dict[str, GroupAttitude] = {}
+    for chat_key, fields in updates.items():
+        row = rows.get(chat_key, [None])[0]
+        group_attitude = records.get(chat_key)
+        if group_attitude is None:
+            if row is None and chat_key not in db_groups:
+                results.append(BatchItemResult(key=chat_key, success=False, action="not_found", message=f"群组 {chat_key} 不存在"))
+                continue
+            # 已有记录但数据库中已不存在该群组时以默认值修复，没有对应的ID
+            db_group = db_groups.get(chat_key, {"id": 0, "channel_name": ""})
+            group_attitude = build_group_record(chat_key, db_group["id"], db_group["channel_name"], row.data_value if row else None)
+            if group_attitude is None:
+                results.append(BatchItemResult(key=chat_key, success=False, action="failed", message=f"群组 {chat_key} 的数据格式错误且无法修复"))
+                continue
+        current_version = records[chat_key].version if chat_key in records else 0
+        expected_version = expected_versions.get(chat_key)
+        if expected_version is not None and expected_version != current_version:
+            results.append(BatchItemResult(
+                key=chat_key, success=False, action="conflict",
+                message=f"群组 {chat_key} 已被修改: 期望版本 {expected_version}，当前版本 {current_version}",
+            ))
+            continue
+        updated = group_attitude.model_copy(update={field: value for field, value in fields.items() if value is not None})
+        if chat_key in records and updated == group_attitude:
+            metrics.inc("writes_skipped_total", kind="group")
+            results.append(BatchItemResult(key=chat_key, success=True, action="unchanged", message=f"群组 {chat_key} 的数据没有变化"))
+            continue
+        if chat_key in records:
+            updated.version = current_version + 1
+        group_attitude = updated
+        _stage_record("group_info", chat_key, row, group_attitude, to_create, to_update)
+        written[chat_key] = group_attitude
+        if row is None:
+            results.append(BatchItemResult(key=chat_key, success=True, action="created", message=f"群组 {chat_key} 已创建"))
+        else:
+            results.append(BatchItemResult(key=chat_key, success=True, action="updated", message=f"群组 {chat_key} 已更新"))
+
+    await bulk_write_atomic(to_create, to_update)
+    for chat_key, group_attitude in written.items():
+        group_cache.write(chat_key, group_attitude)
+    metrics.inc("writes_total", len(written), kind="group")
+    logger.debug(f"批量写入群组态度数据: 新增 {len(to_create)}，更新 {len(to_update)}")
+    return results
+
+
+async def _bulk_delete(
+    data_key: str, key_column: str, keys: Iterable[str], entity: str, cache, locks: KeyedLocks
+) -> List[BatchItemResult]:
+    """在同一个事务中删除指定键的全部记录（包括重复记录）"""
+    keys = list(dict.fromkeys(keys))
+    async with locks.hold_many(keys):
+        rows = await _load_rows(data_key, key_column, keys)
+        await bulk_write_atomic([], [], [row.id for key_rows in rows.values() for row in key_rows])
+
+    results: List[BatchItemResult] = []
+    for key in keys:
+        if key in rows:
+            cache.delete(key)
+            results.append(BatchItemResult(key=key, success=True, action="deleted", message=f"成功删除{entity} {key} 的态度数据"))
+        else:
+            results.append(BatchItemResult(key=key, success=False, action="not_found", message=f"{entity} {key} 不存在"))
+    logger.debug(f"批量删除{entity}态度数据: {len(rows)} / {len(keys)}")
+    return results
+
+
+async def bulk_delete_user_attitudes(store, user_keys: Iterable[str]) -> List[BatchItemResult]:
+    """批量删除用户态度数据
+
+    Args:
+        store: 存储对象
+        user_keys: 用户ID列表
+
+    Returns:
+        List[BatchItemResult]: 逐项结果，不存在的用户 action 为 not_found
+    """
+    return await _bulk_delete("user_info", "target_user_key", user_keys, "用户", user_cache, user_locks)
+
+
+async def bulk_delete_group_attitudes(store, chat_keys: Iterable[str]) -> List[BatchItemResult]:
+    """批量删除群组态度数据，参数与返回值含义同 `bulk_delete_user_attitudes`"""
+    return await _bulk_delete("group_info", "target_chat_key", chat_keys, "群组", group_cache, group_locks)
+
+
+async def _migrate_encoding(model: Type[BaseModel], data_key: str, key_column: str, locks: KeyedLocks) -> int:
+    """把不是当前编码的记录按当前编码重写，返回重写的记录数
+
+    每批先找出需要转换的记录，持有对应键的锁后重新读取再写回，
+    不会覆盖转换期间发生的更新。格式错误的记录留给校验修复。
+    """
+    empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+    queryset = DBPluginData.filter(plugin_key=plugin.key, data_key=data_key, **{empty_column: ""})
+    # 紧凑格式以 "[" 开头，在数据库中筛出编码与配置不一致的记录
+    if config.CompactEncoding:
+        queryset = queryset.exclude(data_value__startswith="[")
+    else:
+        queryset = queryset.filter(data_value__startswith="[")
+
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = await queryset.filter(id__gt=last_id).order_by("id").limit(MIGRATION_CHUNK_SIZE).values_list("id", key_column)
+        if not rows:
+            return migrated
+        last_id = rows[-1][0]
+        async with locks.hold_many(key for _, key in rows):
+            to_update: List[DBPluginData] = []
+            for row in await DBPluginData.filter(id__in=[row_id for row_id, _ in rows]):
+                if not row.data_value or is_current_encoding(row.data_value):
+                    continue
+                try:
+                    row.data_value = encode_record(decode_record(model, row.data_value))
+                except ValidationError:
+                    continue
+                to_update.append(row)
+            await bulk_write_atomic([], to_update)
+        migrated += len(to_update)
+
+
+async def migrate_record_encoding(store) -> int:
+    """在后台把全部用户和群组记录转换为 CompactEncoding 配置的编码
+
+    转换不改变记录内容和版本号，也不影响缓存。
+
+    Args:
+        store: 存储对象
+
+    Returns:
+        int: 重写的记录数量，转换失败时为 0
+    """
+    try:
+        migrated = await _migrate_encoding(UserAttitude, "user_info", "target_user_key", user_locks)
+        migrated += await _migrate_encoding(GroupAttitude, "group_info", "target_chat_key", group_locks)
     except Exception as e:
-        logger.error(f"删除群组 {chat_key} 的态度数据时出错: {e}")
-        return False, f"删除群组态度数据时出错: {e}"
+        logger.error(f"转换态度记录编码失败，将在下次启动时继续: {e}", exc_info=True)
+        return 0
+    if migrated:
+        encoding = "紧凑格式" if config.CompactEncoding else "JSON"
+        logger.info(f"已将 {migrated} 条态度记录转换为{encoding}")
+    return migrated
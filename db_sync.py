@@ -6,77 +6,278 @@
 @Desc: 数据库同步模块
 """
 
-from typing import Any, Dict, List
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from nekro_agent.api.core import logger
 from nekro_agent.models.db_user import DBUser
 from nekro_agent.models.db_chat_channel import DBChatChannel
+from nekro_agent.models.db_plugin_data import DBPluginData
+from pydantic import BaseModel, ValidationError
+from tortoise.transactions import in_transaction
 
-from .model import UserAttitude, GroupAttitude
+from .conf import plugin
+from .model import UserAttitude, GroupAttitude, SyncCounts, SyncReport
+from .cache import AttitudeCache, user_cache, group_cache
+from .locks import KeyedLocks, user_locks, group_locks
+from .codec import decode_record, encode_record
 
-async def SyncData(store):
+# 批量写入时每个分块（事务）包含的最大记录数
+BULK_CHUNK_SIZE = 500
+
+def _sync_user_record(
+    user_key: str,
+    user_data: Dict[str, Any],
+    stored_json: Optional[str],
+    counts: Optional[SyncCounts] = None,
+) -> Optional[UserAttitude]:
+    """按数据库中的用户信息同步单条用户记录，返回需要写回的记录，无需写回时返回 None"""
+    counts = counts if counts is not None else SyncCounts()
+    user_attitude = UserAttitude(
+        id=user_data["id"],
+        user_id=user_key,
+        username=user_data["username"],
+        nickname="",  # 默认值
+        attitude="",  # 默认值
+        relationship="",  # 默认值
+        other=""  # 默认值
+    )
+
+    if not stored_json:
+        logger.debug(f"用户 {user_key} 在 store 中不存在，正在添加...")
+        counts.added += 1
+        return user_attitude
+
+    try:
+        stored_user = decode_record(UserAttitude, stored_json)
+    except ValidationError as e:
+        logger.error(f"用户 {user_key} 的数据验证失败，跳过同步: {e}")
+        counts.invalid += 1
+        return None
+
+    if stored_user.username != user_data["username"]:
+        logger.debug(f"用户 {user_key} 的数据不一致，正在更新...")
+        # 保留已存在的 attitude, relationship, other, nickname 字段，版本号在原记录的基础上递增
+        user_attitude.attitude = stored_user.attitude
+        user_attitude.relationship = stored_user.relationship
+        user_attitude.other = stored_user.other
+        user_attitude.nickname = stored_user.nickname
+        user_attitude.version = stored_user.version + 1
+        counts.updated += 1
+        return user_attitude
+
+    counts.unchanged += 1
+    return None
+
+
+def _sync_group_record(
+    group_key: str,
+    group_data: Dict[str, Any],
+    stored_json: Optional[str],
+    counts: Optional[SyncCounts] = None,
+) -> Optional[GroupAttitude]:
+    """按数据库中的群组信息同步单条群组记录，参数与返回值含义同 `_sync_user_record`"""
+    counts = counts if counts is not None else SyncCounts()
+    group_attitude = GroupAttitude(
+        id=group_data["id"],
+        group_id=group_key,
+        channel_name=group_data["channel_name"],
+        attitude="",  # 默认值
+        other=""  # 默认值
+    )
+
+    if not stored_json:
+        logger.debug(f"群组 {group_key} 在 store 中不存在，正在添加...")
+        counts.added += 1
+        return group_attitude
+
+    try:
+        stored_group = decode_record(GroupAttitude, stored_json)
+    except ValidationError as e:
+        logger.error(f"群组 {group_key} 的数据验证失败，跳过同步: {e}")
+        counts.invalid += 1
+        return None
+
+    if stored_group.channel_name != group_data["channel_name"]:
+        logger.debug(f"群组 {group_key} 的数据不一致，正在更新...")
+        # 保留已存在的 attitude 和 other 字段，版本号在原记录的基础上递增
+        group_attitude.attitude = stored_group.attitude
+        group_attitude.other = stored_group.other
+        group_attitude.version = stored_group.version + 1
+        counts.updated += 1
+        return group_attitude
+
+    counts.unchanged += 1
+    return None
+
+
+async def SyncData(store) -> SyncReport:
     """
     同步用户和群组数据到 store。
     如果数据不存在，则添加。
     如果数据已存在但信息不一致，则更新。
+
+    已存在的记录通过一次查询全部读出，在内存中与用户/群组表比对后，
+    以分块的批量插入和批量更新写回。每个分块持有相关键的锁并在独立的事务中执行，
+    不会覆盖同步期间其他路径写入的记录。
+
+    Returns:
+        SyncReport: 新增、更新、未变化的数量以及耗时。
     """
+    started = time.perf_counter()
+    report = SyncReport()
+
+    # 一次性读取所有已存在的用户和群组记录
+    existing_users: Dict[str, DBPluginData] = {}
+    existing_groups: Dict[str, DBPluginData] = {}
+    rows = await DBPluginData.filter(
+        plugin_key=plugin.key,
+        data_key__in=["user_info", "group_info"],
+    ).order_by("-id")
+    for row in rows:
+        # 按 id 倒序遍历，重复记录中保留 id 最小的一条，与 store.get 的行为一致
+        if row.data_key == "user_info" and not row.target_chat_key:
+            existing_users[row.target_user_key] = row
+        elif row.data_key == "group_info" and not row.target_user_key:
+            existing_groups[row.target_chat_key] = row
 
     # 同步用户数据
-    users_raw_data = await get_user_data()
-    for user_data in users_raw_data:
-        user_key = user_data["platform_userid"]
-        stored_user_json = await store.get(user_key=user_key, store_key="user_info")
-
-        user_attitude = UserAttitude(
-            id=user_data["id"],
-            user_id=user_key,
-            username=user_data["username"],
-            nickname="",  # 默认值
-            attitude="",  # 默认值
-            relationship="",  # 默认值
-            other=""  # 默认值
-        )
-
-        if not stored_user_json:
-            logger.debug(f"用户 {user_key} 在 store 中不存在，正在添加...")
-            await store.set(user_key=user_key, store_key="user_info", value=user_attitude.model_dump_json())
-        else:
-            stored_user = UserAttitude.model_validate_json(stored_user_json)
-            # 保留已存在的 attitude, relationship, other, nickname 字段
-            user_attitude.attitude = stored_user.attitude
-            user_attitude.relationship = stored_user.relationship
-            user_attitude.other = stored_user.other
-            user_attitude.nickname = stored_user.nickname
-            if stored_user.username != user_data["username"]:
-                logger.debug(f"用户 {user_key} 的数据不一致，正在更新...")
-                await store.set(user_key=user_key, store_key="user_info", value=user_attitude.model_dump_json())
+    users_raw_data: Dict[str, Dict[str, Any]] = {
+        user_data["platform_userid"]: user_data for user_data in await get_user_data()
+    }
+    staged_users: Dict[str, Tuple[Optional[str], UserAttitude]] = {}
+    for user_key, user_data in users_raw_data.items():
+        row = existing_users.get(user_key)
+        stored_json = row.data_value if row else None
+        user_attitude = _sync_user_record(user_key, user_data, stored_json, report.users)
+        if user_attitude is not None:
+            staged_users[user_key] = (stored_json, user_attitude)
 
     # 同步群组数据
-    groups_raw_data = await get_group_data()
-    for group_data in groups_raw_data:
-        group_key = group_data["channel_id"]
-        stored_group_json = await store.get(chat_key=group_key, store_key="group_info")
-
-        group_attitude = GroupAttitude(
-            id=group_data["id"],
-            group_id=group_key,
-            channel_name=group_data["channel_name"],
-            attitude="",  # 默认值
-            other=""  # 默认值
-        )
-
-        if not stored_group_json:
-            logger.debug(f"群组 {group_key} 在 store 中不存在，正在添加...")
-            await store.set(chat_key=group_key, store_key="group_info", value=group_attitude.model_dump_json())
-        else:
-            stored_group = GroupAttitude.model_validate_json(stored_group_json)
-            # 保留已存在的 attitude 和 other 字段
-            group_attitude.attitude = stored_group.attitude
-            group_attitude.other = stored_group.other
-            if stored_group.channel_name != group_data["channel_name"]:
-                logger.debug(f"群组 {group_key} 的数据不一致，正在更新...")
-                await store.set(chat_key=group_key, store_key="group_info", value=group_attitude.model_dump_json())
-
-    logger.debug("态度数据已同步。")
+    groups_raw_data: Dict[str, Dict[str, Any]] = {
+        group_data["channel_id"]: group_data for group_data in await get_group_data()
+    }
+    staged_groups: Dict[str, Tuple[Optional[str], GroupAttitude]] = {}
+    for group_key, group_data in groups_raw_data.items():
+        row = existing_groups.get(group_key)
+        stored_json = row.data_value if row else None
+        group_attitude = _sync_group_record(group_key, group_data, stored_json, report.groups)
+        if group_attitude is not None:
+            staged_groups[group_key] = (stored_json, group_attitude)
+
+    await write_staged_records(
+        "user_info", "target_user_key", staged_users,
+        lambda user_key, stored_json: _sync_user_record(user_key, users_raw_data[user_key], stored_json),
+        user_locks, user_cache,
+    )
+    await write_staged_records(
+        "group_info", "target_chat_key", staged_groups,
+        lambda group_key, stored_json: _sync_group_record(group_key, groups_raw_data[group_key], stored_json),
+        group_locks, group_cache,
+    )
+
+    report.elapsed = time.perf_counter() - started
+    logger.info(
+        f"态度数据已同步: 用户 新增 {report.users.added} / 更新 {report.users.updated} / "
+        f"未变化 {report.users.unchanged} / 跳过 {report.users.invalid}，"
+        f"群组 新增 {report.groups.added} / 更新 {report.groups.updated} / "
+        f"未变化 {report.groups.unchanged} / 跳过 {report.groups.invalid}，"
+        f"耗时 {report.elapsed:.3f} 秒"
+    )
+    return report
+
+async def write_staged_records(
+    data_key: str,
+    key_column: str,
+    staged: Dict[str, Tuple[Optional[str], BaseModel]],
+    rebuild: Callable[[str, Optional[str]], Optional[BaseModel]],
+    locks: KeyedLocks,
+    cache: AttitudeCache,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    on_written: Optional[Callable[[int], None]] = None,
+) -> None:
+    """分块写回按快照计算出的记录
+
+    每个分块持有相关键的锁后重新读取记录：读取快照之后已被其他路径写入的记录
+    由 rebuild 按当前的值重新计算，已存在的记录只更新不新增。
+    每个分块在独立的事务中写入，提交后才更新缓存。
+
+    Args:
+        data_key: 记录类型，user_info 或 group_info
+        key_column: 记录键所在的列
+        staged: 键到 (快照中的原始数据, 需要写回的记录) 的映射
+        rebuild: 以 (键, 当前的原始数据) 重新计算需要写回的记录，无需写回时返回 None
+        locks: 该类记录的键锁
+        cache: 该类记录的缓存
+        semaphore: 限制同时执行的分块事务数量，默认逐块执行
+        on_written: 每个分块提交后以该分块的键数量调用，用于汇报进度
+    """
+    semaphore = semaphore or asyncio.Semaphore(1)
+    empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+
+    async def write_chunk(keys: List[str]) -> None:
+        async with semaphore, locks.hold_many(keys):
+            current: Dict[str, DBPluginData] = {}
+            # 按 id 倒序遍历，重复记录中保留 id 最小的一条，与 store.get 的行为一致
+            for row in await DBPluginData.filter(
+                plugin_key=plugin.key, data_key=data_key, **{empty_column: "", f"{key_column}__in": keys}
+            ).order_by("-id"):
+                current[getattr(row, key_column)] = row
+
+            to_create: List[DBPluginData] = []
+            to_update: List[DBPluginData] = []
+            written: Dict[str, BaseModel] = {}
+            for key in keys:
+                snapshot_json, record = staged[key]
+                row = current.get(key)
+                stored_json = row.data_value if row else None
+                if stored_json != snapshot_json:
+                    record = rebuild(key, stored_json)
+                    if record is None:
+                        continue
+                if row is None:
+                    to_create.append(DBPluginData(
+                        plugin_key=plugin.key,
+                        data_key=data_key,
+                        data_value=encode_record(record),
+                        **{key_column: key, empty_column: ""},
+                    ))
+                else:
+                    row.data_value = encode_record(record)
+                    to_update.append(row)
+                written[key] = record
+
+            await bulk_write_atomic(to_create, to_update)
+            for key, record in written.items():
+                cache.write(key, record)
+        if on_written:
+            on_written(len(keys))
+
+    keys = list(staged)
+    await asyncio.gather(*(
+        write_chunk(keys[start:start + BULK_CHUNK_SIZE]) for start in range(0, len(keys), BULK_CHUNK_SIZE)
+    ))
+
+async def bulk_write_atomic(
+    to_create: List[DBPluginData],
+    to_update: List[DBPluginData],
+    to_delete: Optional[List[int]] = None,
+) -> None:
+    """在同一个事务中分块批量写入和删除插件数据，任一分块失败则全部回滚。
+
+    Args:
+        to_create: 需要插入的新记录。
+        to_update: 需要更新 data_value 的已有记录。
+        to_delete: 需要删除的记录 id。
+    """
+    to_delete = to_delete or []
+    async with in_transaction() as conn:
+        for start in range(0, len(to_create), BULK_CHUNK_SIZE):
+            await DBPluginData.bulk_create(to_create[start:start + BULK_CHUNK_SIZE], using_db=conn)
+        for start in range(0, len(to_update), BULK_CHUNK_SIZE):
+            await DBPluginData.bulk_update(to_update[start:start + BULK_CHUNK_SIZE], fields=["data_value"], using_db=conn)
+        for start in range(0, len(to_delete), BULK_CHUNK_SIZE):
+            await DBPluginData.filter(id__in=to_delete[start:start + BULK_CHUNK_SIZE]).using_db(conn).delete()
 
 async def get_user_data() -> List[Dict[str, Any]]:
     """获取所有用户信息（不包括ID为1的用户）。"""
@@ -4,36 +4,199 @@
 """
 
 import asyncio
+import random
+import time
 from functools import wraps
+from typing import Optional
 from tortoise.exceptions import OperationalError
 from nekro_agent.api.core import logger
 
+from .metrics import metrics
 
-def retry_on_failure(max_retries: int = 3, delay: float = 1.0):
+# 可以重试的异常类型，均表示数据库暂时不可用
+RETRYABLE_EXCEPTIONS = (OperationalError, ConnectionError)
+
+# 熔断器状态在 circuit_breaker_state 指标中的取值
+_BREAKER_STATE_VALUES = {"closed": 0, "open": 1, "half_open": 2}
+
+
+class CircuitOpenError(OperationalError):
+    """熔断器处于打开状态，请求未执行即失败"""
+
+
+class RetryBudget:
+    """多个调用方共享的重试预算
+
+    每次调用存入 ratio 个令牌，每次重试取出一个，令牌数不超过 max_tokens。
+    数据库整体不可用时预算很快耗尽，重试总量被限制在调用量的一定比例内，
+    避免所有调用同时重试把故障放大。
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        """
+        Args:
+            ratio: 每次调用存入的令牌数，即长期来看允许的重试比例
+            max_tokens: 令牌上限，决定允许的突发重试次数
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        """登记一次调用"""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """申请一次重试，预算不足时返回 False"""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到 failure_threshold 次后打开，打开期间的调用直接失败；
+    经过 reset_timeout 秒后进入半开状态，只放行一次探测调用，
+    探测成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            name: 熔断器名称，用作指标标签
+            failure_threshold: 打开熔断器所需的连续失败次数
+            reset_timeout: 打开后等待多久（秒）开始探测恢复
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set("circuit_breaker_state", _BREAKER_STATE_VALUES[self.state], breaker=name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"熔断器 {self.name} 状态变化: {self.state} -> {state}")
+        self.state = state
+        metrics.set("circuit_breaker_state", _BREAKER_STATE_VALUES[state], breaker=self.name)
+        metrics.inc("circuit_breaker_transitions_total", breaker=self.name, to=state)
+
+    def allow(self) -> bool:
+        """判断本次调用是否可以执行"""
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                metrics.inc("circuit_breaker_rejections_total", breaker=self.name)
+                return False
+            self._transition("half_open")
+        if self.state == "half_open":
+            # 半开状态下同一时间只允许一次探测
+            if self._probing:
+                metrics.inc("circuit_breaker_rejections_total", breaker=self.name)
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        """登记一次成功的调用"""
+        self._probing = False
+        self.failures = 0
+        self._transition("closed")
+
+    def record_failure(self) -> None:
+        """登记一次失败的调用"""
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition("open")
+
+    def release(self) -> None:
+        """调用因与数据库无关的原因结束时释放探测名额，不改变状态"""
+        self._probing = False
+
+
+# 所有数据库操作共享的重试预算和熔断器
+db_retry_budget = RetryBudget()
+db_circuit_breaker = CircuitBreaker("database")
+
+
+def retry_on_failure(
+    max_retries: int = 3,
+    delay: float = 1.0,
+    max_delay: float = 8.0,
+    deadline: Optional[float] = None,
+    budget: Optional[RetryBudget] = db_retry_budget,
+    breaker: Optional[CircuitBreaker] = db_circuit_breaker,
+):
     """重试装饰器，用于处理数据库操作失败的情况
-    
+
+    重试间隔采用完全抖动的指数退避，即在 [0, min(max_delay, delay * 2^n)] 内随机取值，
+    避免大量调用在同一时刻重试。重试还受整体截止时间和共享重试预算的限制，
+    熔断器打开时直接抛出 CircuitOpenError，不执行被装饰的函数。
+
     Args:
         max_retries: 最大重试次数
-        delay: 重试间隔时间（秒）
+        delay: 退避的基础间隔时间（秒）
+        max_delay: 单次重试间隔的上限（秒）
+        deadline: 包括所有重试在内的总耗时上限（秒），None 表示不限制
+        budget: 共享的重试预算，None 表示不限制
+        breaker: 熔断器，None 表示不使用
     """
     def decorator(func):
+        name = func.__name__
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            last_exception = None
+            started = time.monotonic()
+            if budget is not None:
+                budget.deposit()
             for attempt in range(max_retries + 1):
+                if breaker is not None and not breaker.allow():
+                    raise CircuitOpenError(f"数据库暂时不可用，熔断器 {breaker.name} 已打开")
                 try:
-                    return await func(*args, **kwargs)
-                except (OperationalError, ConnectionError) as e:
-                    last_exception = e
-                    if attempt < max_retries:
-                        logger.warning(f"数据库操作失败，第{attempt + 1}次重试: {e}")
-                        await asyncio.sleep(delay * (2 ** attempt))  # 指数退避
-                    else:
+                    result = await func(*args, **kwargs)
+                except CircuitOpenError:
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                except RETRYABLE_EXCEPTIONS as e:
+                    if breaker is not None:
+                        breaker.record_failure()
+                    if attempt >= max_retries:
                         logger.error(f"数据库操作重试{max_retries}次后仍然失败: {e}")
+                        metrics.inc("retry_exhausted_total", operation=name)
                         raise
-                except Exception as e:
-                    # 对于其他类型的异常，不进行重试
+                    backoff = random.uniform(0, min(max_delay, delay * (2 ** attempt)))
+                    if deadline is not None and time.monotonic() - started + backoff > deadline:
+                        logger.error(f"数据库操作失败且超出截止时间 {deadline} 秒，不再重试: {e}")
+                        metrics.inc("retry_deadline_exceeded_total", operation=name)
+                        raise
+                    if budget is not None and not budget.withdraw():
+                        logger.error(f"数据库操作失败且重试预算已耗尽，不再重试: {e}")
+                        metrics.inc("retry_budget_exhausted_total", operation=name)
+                        raise
+                    logger.warning(f"数据库操作失败，{backoff:.2f} 秒后第{attempt + 1}次重试: {e}")
+                    metrics.inc("retries_total", operation=name)
+                    await asyncio.sleep(backoff)
+                except Exception:
+                    # 对于其他类型的异常，不进行重试，也不计入熔断器
+                    if breaker is not None:
+                        breaker.release()
                     raise
-            raise last_exception
+                except BaseException:
+                    # 调用被取消（如工具调用超时）时同样释放探测名额，否则半开状态会一直拒绝后续调用
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                else:
+                    if breaker is not None:
+                        breaker.record_success()
+                    return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+@File: events.py
+@Desc: 态度变更事件发布模块
+"""
+
+import asyncio
+from typing import Callable, Hashable, Optional, Set
+
+from pydantic import BaseModel
+
+from .cache import AttitudeCache, user_cache, group_cache
+from .model import ChangeEvent
+
+# 每个订阅者最多积压的事件数量，超出后丢弃积压并通知其重新同步
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class ChangeFeed:
+    """进程内的变更事件发布者
+
+    由缓存的写入/删除回调驱动，因此覆盖所有写入路径；每个订阅者持有独立的有界队列，
+    队列中的 None 表示事件有丢失，订阅者需要重新获取数据。
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set["asyncio.Queue[Optional[ChangeEvent]]"] = set()
+
+    def subscribe(self) -> "asyncio.Queue[Optional[ChangeEvent]]":
+        """登记一个订阅者，返回其事件队列"""
+        queue: "asyncio.Queue[Optional[ChangeEvent]]" = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Optional[ChangeEvent]]") -> None:
+        """注销订阅者"""
+        self._subscribers.discard(queue)
+
+    def publish(self, event: ChangeEvent) -> None:
+        """向所有订阅者发布事件，不会阻塞写入路径"""
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 消费过慢的订阅者丢弃积压的事件，改为通知其重新同步
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def listener(self, kind: str, cache: AttitudeCache) -> Callable[[Hashable, Optional[BaseModel], Optional[BaseModel]], None]:
+        """生成挂在缓存上的回调，把记录的写入和删除转换为只包含变化字段的事件"""
+
+        def on_change(key: Hashable, record: Optional[BaseModel], previous: Optional[BaseModel]) -> None:
+            if not self._subscribers:
+                return
+            if record is None:
+                self.publish(ChangeEvent(kind=kind, key=str(key), op="delete", version=cache.version(key)))
+                return
+            new_data = record.model_dump()
+            old_data = previous.model_dump() if previous is not None else {}
+            fields = {field: value for field, value in new_data.items() if field not in old_data or old_data[field] != value}
+            if fields:
+                self.publish(ChangeEvent(kind=kind, key=str(key), op="upsert", version=cache.version(key), fields=fields))
+
+        return on_change
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+change_feed = ChangeFeed()
+user_cache.add_listener(change_feed.listener("user", user_cache))
+group_cache.add_listener(change_feed.listener("group", group_cache))
@@ -6,17 +6,20 @@
 - decorators.py: 装饰器功能
 - tools.py: 工具函数
 - prompt_injection.py: 提示注入功能
+- participants.py: 会话参与者追踪功能
 """
 
 # 导入所有子模块的功能以保持向后兼容性
 from .decorators import retry_on_failure
 from .tools import update_user_attitude_tool, update_group_attitude_tool
 from .prompt_injection import attitude
+from .participants import participant_tracker
 
 # 为了向后兼容，重新导出所有函数
 __all__ = [
     'retry_on_failure',
     'update_user_attitude_tool',
     'update_group_attitude_tool',
-    'attitude'
+    'attitude',
+    'participant_tracker'
 ]
\ No newline at end of file
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+@File: history.py
+@Desc: 态度变更历史模块，只追加的变更日志及其定期清理
+"""
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Hashable, Iterator, List, Optional, Tuple
+
+from nekro_agent.api.core import logger
+from nekro_agent.models.db_plugin_data import DBPluginData
+from pydantic import BaseModel
+from tortoise import timezone
+from tortoise.functions import Count
+
+from .cache import user_cache, group_cache
+from .conf import plugin, config
+from .db_sync import BULK_CHUNK_SIZE
+from .model import HistoryEntry
+
+# 变更来源
+SOURCE_TOOL = "tool"
+SOURCE_WEBUI = "webui"
+SOURCE_SYNC = "sync"
+# 启动时的全量校验：为全部用户补齐记录、同步用户名，不是对态度的编辑，不记入历史
+SOURCE_RECONCILE = "reconcile"
+
+# 缓冲的历史条目最多等待多久（秒）写入数据库，积压超过 HISTORY_FLUSH_SIZE 条时立即写入
+HISTORY_FLUSH_INTERVAL = 1.0
+HISTORY_FLUSH_SIZE = 500
+# 后台清理的执行间隔（秒）
+HISTORY_COMPACT_INTERVAL = 3600
+
+# 当前写入的来源，未设置时视为后台同步
+change_source: ContextVar[str] = ContextVar("attitude_change_source", default=SOURCE_SYNC)
+
+_compact_task: Optional["asyncio.Task[None]"] = None
+
+
+@contextmanager
+def recording_source(source: str) -> Iterator[None]:
+    """在上下文内把写入记为来自 source 的变更"""
+    token = change_source.set(source)
+    try:
+        yield
+    finally:
+        change_source.reset(token)
+
+
+class HistoryLog:
+    """只追加的变更日志
+
+    每次变更在插件数据表中新增一行（data_key 为 `user_history`/`group_history`），
+    已有条目从不改写，追加的代价与历史长度无关。条目由缓存的写入/删除回调产生，
+    先在内存中缓冲，再以批量插入写入数据库；读取按条目ID倒序做键集分页，
+    每次只扫描一页，历史增长到数百万条也不受影响。
+    """
+
+    def __init__(self, data_key: str, key_column: str):
+        """
+        Args:
+            data_key: 历史条目在插件数据表中的 data_key
+            key_column: 保存用户ID或群组ID的列
+        """
+        self.data_key = data_key
+        self.key_column = key_column
+        self._empty_column = "target_chat_key" if key_column == "target_user_key" else "target_user_key"
+        self._buffer: List[DBPluginData] = []
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._lock = asyncio.Lock()
+
+    def _filter(self, **filters):
+        return DBPluginData.filter(plugin_key=plugin.key, data_key=self.data_key, **filters)
+
+    def on_change(self, key: Hashable, record: Optional[BaseModel], previous: Optional[BaseModel]) -> None:
+        """缓存写入/删除回调，只记录发生变化的字段"""
+        source = change_source.get()
+        if source == SOURCE_RECONCILE:
+            return
+        entry = {"t": round(time.time(), 3), "s": source}
+        if record is None:
+            entry["o"] = "delete"
+        else:
+            # 版本号每次写入都会变化，单独保存，不算作字段变化
+            new_data = record.model_dump(exclude={"version"})
+            old_data = previous.model_dump(exclude={"version"}) if previous is not None else {}
+            fields = {field: value for field, value in new_data.items() if field not in old_data or old_data[field] != value}
+            if not fields:
+                return
+            entry.update(o="upsert", v=getattr(record, "version", 0), f=fields)
+        self._buffer.append(DBPluginData(
+            plugin_key=plugin.key,
+            data_key=self.data_key,
+            data_value=json.dumps(entry, ensure_ascii=False, separators=(",", ":")),
+            **{self.key_column: str(key), self._empty_column: ""},
+        ))
+        if len(self._buffer) >= HISTORY_FLUSH_SIZE:
+            asyncio.ensure_future(self._flush_logged())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(HISTORY_FLUSH_INTERVAL)
+        await self._flush_logged()
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"写入态度变更历史失败，将在下次写入时重试: {e}")
+
+    async def flush(self) -> None:
+        """把缓冲的条目批量写入数据库，失败时条目留在缓冲区等待下次写入"""
+        async with self._lock:
+            rows, self._buffer = self._buffer, []
+            for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                try:
+                    await DBPluginData.bulk_create(rows[start:start + BULK_CHUNK_SIZE])
+                except Exception:
+                    # 未写入的条目按原顺序放回缓冲区开头
+                    self._buffer[:0] = rows[start:]
+                    raise
+
+    async def read(self, key: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[HistoryEntry], Optional[int]]:
+        """按时间倒序读取一页历史条目
+
+        Args:
+            key: 用户ID或群组ID
+            before: 只返回ID小于该值的条目，用于翻页
+            limit: 返回的最大条目数
+
+        Returns:
+            Tuple[List[HistoryEntry], Optional[int]]: (当前页的条目, 下一页的 before 参数，没有更多时为 None)
+        """
+        # 先写入缓冲的条目，保证刚发生的变更可以立即读到
+        if self._buffer:
+            await self.flush()
+        query = self._filter(**{self.key_column: key, self._empty_column: ""})
+        if before is not None:
+            query = query.filter(id__lt=before)
+        rows = await query.order_by("-id").limit(limit + 1).values("id", "data_value")
+
+        entries: List[HistoryEntry] = []
+        for row in rows[:limit]:
+            try:
+                data = json.loads(row["data_value"])
+            except json.JSONDecodeError:
+                logger.warning(f"跳过格式错误的变更历史条目: {row['id']}")
+                continue
+            entries.append(HistoryEntry(
+                id=row["id"],
+                time=data.get("t", 0),
+                source=data.get("s", ""),
+                op=data.get("o", "upsert"),
+                version=data.get("v", 0),
+                fields=data.get("f", {}),
+            ))
+        next_before = rows[limit - 1]["id"] if len(rows) > limit else None
+        return entries, next_before
+
+    async def compact(self, retention_days: int, max_entries: int) -> int:
+        """清理超过保留时间的条目，以及超出单条记录条目上限的最早条目
+
+        Args:
+            retention_days: 保留天数，0 表示不按时间清理
+            max_entries: 每个键最多保留的条目数，0 表示不限制
+
+        Returns:
+            int: 删除的条目数量
+        """
+        deleted = 0
+        if retention_days > 0:
+            cutoff = timezone.now() - timedelta(days=retention_days)
+            deleted += await self._filter(create_time__lt=cutoff).delete()
+        if max_entries > 0:
+            # 只有条目数超出上限的键需要处理，每个键通过一次定位和一次范围删除完成
+            over_limit = await (
+                self._filter()
+                .annotate(entry_count=Count("id"))
+                .group_by(self.key_column)
+                .filter(entry_count__gt=max_entries)
+                .values_list(self.key_column, flat=True)
+            )
+            for key in over_limit:
+                key_filter = {self.key_column: key}
+                boundary = await self._filter(**key_filter).order_by("-id").offset(max_entries - 1).limit(1).values_list("id", flat=True)
+                if boundary:
+                    deleted += await self._filter(id__lt=boundary[0], **key_filter).delete()
+        return deleted
+
+
+user_history = HistoryLog("user_history", "target_user_key")
+group_history = HistoryLog("group_history", "target_chat_key")
+user_cache.add_listener(user_history.on_change)
+group_cache.add_listener(group_history.on_change)
+
+
+async def flush_history() -> None:
+    """写入所有缓冲的历史条目"""
+    await asyncio.gather(user_history.flush(), group_history.flush())
+
+
+async def compact_history() -> int:
+    """按配置清理用户和群组的变更历史，返回删除的条目数量"""
+    deleted = 0
+    for history in (user_history, group_history):
+        deleted += await history.compact(config.HistoryRetentionDays, config.HistoryMaxEntries)
+    if deleted:
+        logger.info(f"已清理 {deleted} 条态度变更历史")
+    return deleted
+
+
+async def _run_history_compaction(interval: float) -> None:
+    while True:
+        try:
+            await compact_history()
+        except Exception as e:
+            logger.error(f"清理态度变更历史失败: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def start_history_compaction(interval: float = HISTORY_COMPACT_INTERVAL) -> "asyncio.Task[None]":
+    """在后台定期清理变更历史，已在运行时直接返回该任务"""
+    global _compact_task
+    if _compact_task is None or _compact_task.done():
+        _compact_task = asyncio.create_task(_run_history_compaction(interval))
+    return _compact_task
+
+
+async def stop_history_compaction() -> None:
+    """停止后台的定期清理并等待其结束，用于插件卸载"""
+    global _compact_task
+    if _compact_task is None:
+        return
+    _compact_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await _compact_task
+    _compact_task = None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+@File: locks.py
+@Desc: 按键分配的写入锁，所有修改同一条记录的路径共用
+"""
+
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, Iterable, List
+
+
+class KeyedLocks:
+    """按键分配的 asyncio 锁，同一键的读-改-写串行执行，不同键之间完全并行
+
+    锁在没有持有者和等待者时立即回收，占用的内存只与正在进行的操作数量有关。
+    """
+
+    def __init__(self):
+        # 键 -> [锁, 持有和等待该锁的协程数量]
+        self._locks: Dict[Hashable, List[Any]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """持有单个键的锁"""
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    @asynccontextmanager
+    async def hold_many(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        """按固定顺序持有多个键的锁，避免批量操作之间互相死锁"""
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys), key=str):
+                await stack.enter_async_context(self.hold(key))
+            yield
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def waiting(self) -> int:
+        """正在排队等待锁的协程数量，用于观察锁竞争"""
+        return sum(count - 1 for _, count in self._locks.values())
+
+
+user_locks = KeyedLocks()
+group_locks = KeyedLocks()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+@File: metrics.py
+@Desc: 运行指标模块
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# 指标键: (指标名, 排序后的标签元组)
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# 耗时直方图的默认分桶上界（秒），覆盖从缓存命中到数据库超时的范围
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _key(name: str, labels: Dict[str, str]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """固定分桶的直方图，各桶只保存落入该区间的次数，导出时再累加"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # 最后一个位置对应 +Inf 桶
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """进程内计数器、仪表盘和直方图指标，可导出为 Prometheus 文本格式"""
+
+    def __init__(self, prefix: str = "nekro_attitude"):
+        self.prefix = prefix
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """为指标登记说明文字"""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """累加计数器"""
+        key = _key(name, labels)
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """设置仪表盘的当前值"""
+        self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """向直方图登记一次观测值"""
+        key = _key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """把上下文内代码的耗时（秒）登记到直方图，出现异常时同样登记"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """读取直方图，不存在时返回空直方图"""
+        return self._histograms.get(_key(name, labels)) or Histogram()
+
+    def get(self, name: str, **labels: str) -> float:
+        """读取计数器或仪表盘的当前值"""
+        key = _key(name, labels)
+        return self._counters.get(key, self._gauges.get(key, 0.0))
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric_type, series in (("counter", self._counters), ("gauge", self._gauges)):
+            names = sorted({name for name, _ in series})
+            for name in names:
+                full_name = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name != name:
+                        continue
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        for name in sorted({name for name, _ in self._histograms}):
+            full_name = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for (series_name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+metrics = Metrics()
+metrics.describe("prompt_participants_dropped_total", "超出提示词预算而未注入的用户数")
+metrics.describe("writes_total", "实际写入 store 的态度更新次数")
+metrics.describe("writes_skipped_total", "与已存储数据相同而跳过写入的态度更新次数")
+metrics.describe("writes_coalesced_total", "在合并窗口内并入其他更新的态度更新次数")
+metrics.describe("retries_total", "数据库操作失败后发起的重试次数")
+metrics.describe("retry_exhausted_total", "重试次数用尽后仍然失败的调用次数")
+metrics.describe("retry_deadline_exceeded_total", "因超出截止时间而放弃重试的调用次数")
+metrics.describe("retry_budget_exhausted_total", "因共享重试预算耗尽而放弃重试的调用次数")
+metrics.describe("circuit_breaker_state", "熔断器状态: 0 关闭，1 打开，2 半开")
+metrics.describe("circuit_breaker_transitions_total", "熔断器状态变化次数")
+metrics.describe("circuit_breaker_rejections_total", "熔断器打开期间直接拒绝的调用次数")
+metrics.describe("prompt_stage_seconds", "态度提示词注入各阶段的耗时（秒）")
+metrics.describe("prompt_injections_total", "态度提示词注入次数，按结果区分")
+metrics.describe("prompt_participants_total", "注入提示词的用户数")
+metrics.describe("prompt_chars_total", "注入的提示词字符数")
+metrics.describe("prompt_errors_total", "态度提示词注入各阶段发生的错误次数，按异常类型区分")
+metrics.describe("write_seconds", "态度写入的耗时（秒），按来源区分，包括等待同一记录的锁的时间")
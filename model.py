@@ -1,3 +1,5 @@
+from typing import Any, Dict, List, Optional, Union
+
 from pydantic import BaseModel, Field
 
 
@@ -10,6 +12,7 @@ class UserAttitude(BaseModel):
     attitude: str = Field(..., description="用户态度")
     relationship: str = Field(..., description="关系")
     other: str = Field(description="其他,会注入提示词")
+    version: int = Field(0, description="记录版本号，每次写入递增")
 
 class GroupAttitude(BaseModel):
     """聊群态度模型"""
@@ -17,4 +20,110 @@ class GroupAttitude(BaseModel):
     group_id: str = Field(..., description="群ID")
     channel_name: str = Field(..., description="聊群名称")
     attitude: str = Field(..., description="群态度")
-    other: str = Field(description="其他,会注入提示词")
\ No newline at end of file
+    other: str = Field(description="其他,会注入提示词")
+    version: int = Field(0, description="记录版本号，每次写入递增")
+
+class SyncCounts(BaseModel):
+    """同步计数模型"""
+    added: int = Field(0, description="新增数量")
+    updated: int = Field(0, description="更新数量")
+    unchanged: int = Field(0, description="未变化数量")
+    invalid: int = Field(0, description="格式错误而跳过的数量")
+
+class SyncReport(BaseModel):
+    """数据同步报告模型"""
+    users: SyncCounts = Field(default_factory=SyncCounts, description="用户同步计数")
+    groups: SyncCounts = Field(default_factory=SyncCounts, description="群组同步计数")
+    elapsed: float = Field(0.0, description="耗时（秒）")
+
+class ReconcileCounts(BaseModel):
+    """启动校验计数模型"""
+    total: int = Field(0, description="检查的记录数量")
+    added: int = Field(0, description="缺失而新增的数量")
+    repaired: int = Field(0, description="格式错误而修复的数量")
+    updated: int = Field(0, description="信息不一致而更新的数量")
+    unchanged: int = Field(0, description="有效且无需变更的数量")
+    failed: int = Field(0, description="修复失败的数量")
+
+class ReconcileReport(BaseModel):
+    """启动校验报告模型"""
+    users: ReconcileCounts = Field(default_factory=ReconcileCounts, description="用户校验计数")
+    groups: ReconcileCounts = Field(default_factory=ReconcileCounts, description="群组校验计数")
+    elapsed: float = Field(0.0, description="耗时（秒）")
+
+    @property
+    def success(self) -> bool:
+        """所有记录是否都已有效"""
+        return self.users.failed == 0 and self.groups.failed == 0
+
+class ReconcileProgress(BaseModel):
+    """后台校验进度模型"""
+    state: str = Field("pending", description="状态: pending/running/ready/failed")
+    phase: str = Field("", description="当前阶段: loading/checking/writing")
+    checked: int = Field(0, description="已检查的记录数量")
+    total: int = Field(0, description="需要检查的记录总数")
+    written: int = Field(0, description="已写入的记录数量")
+    to_write: int = Field(0, description="需要写入的记录总数")
+    started_at: Optional[float] = Field(None, description="开始时间戳")
+    finished_at: Optional[float] = Field(None, description="结束时间戳")
+    error: Optional[str] = Field(None, description="失败原因")
+    report: Optional[ReconcileReport] = Field(None, description="完成后的校验报告")
+
+    @property
+    def ready(self) -> bool:
+        """后台校验是否已完成"""
+        return self.state == "ready"
+
+class BatchItemResult(BaseModel):
+    """批量操作单项结果模型"""
+    key: str = Field(..., description="用户ID或群组ID")
+    success: bool = Field(..., description="是否成功")
+    action: str = Field(..., description="执行的操作: created/updated/unchanged/deleted/not_found/conflict/failed")
+    message: str = Field("", description="结果说明")
+
+class UserAttitudeDelta(BaseModel):
+    """用户态度增量模型"""
+    version: int = Field(..., description="当前数据集版本号，下次请求时作为 since 传入")
+    full: bool = Field(False, description="无法计算增量时为 true，此时 changed 为全部记录")
+    changed: List[UserAttitude] = Field(default_factory=list, description="新增或更新的记录")
+    deleted: List[str] = Field(default_factory=list, description="已删除的用户ID")
+
+class GroupAttitudeDelta(BaseModel):
+    """群组态度增量模型"""
+    version: int = Field(..., description="当前数据集版本号，下次请求时作为 since 传入")
+    full: bool = Field(False, description="无法计算增量时为 true，此时 changed 为全部记录")
+    changed: List[GroupAttitude] = Field(default_factory=list, description="新增或更新的记录")
+    deleted: List[str] = Field(default_factory=list, description="已删除的群组ID")
+
+class SearchHit(BaseModel):
+    """搜索命中模型"""
+    score: float = Field(..., description="相关度得分，越大越相关")
+    record: Union[UserAttitude, GroupAttitude] = Field(..., description="命中的记录")
+
+class SearchResult(BaseModel):
+    """搜索结果模型"""
+    total: int = Field(..., description="命中总数")
+    took_ms: float = Field(..., description="搜索耗时（毫秒）")
+    hits: List[SearchHit] = Field(default_factory=list, description="当前页的命中记录，按相关度降序排列")
+
+class ChangeEvent(BaseModel):
+    """态度变更事件模型"""
+    kind: str = Field(..., description="记录类型: user/group")
+    key: str = Field(..., description="用户ID或群组ID")
+    op: str = Field(..., description="操作: upsert/delete")
+    version: int = Field(..., description="变更后的记录版本号")
+    fields: Dict[str, Any] = Field(default_factory=dict, description="发生变化的字段及其新值，旧值未知时为全部字段，删除时为空")
+
+class HistoryEntry(BaseModel):
+    """态度变更历史条目模型"""
+    id: int = Field(..., description="条目ID，按写入顺序递增，翻页时作为 before 传入")
+    time: float = Field(..., description="变更时间（Unix 时间戳，秒）")
+    source: str = Field(..., description="变更来源: tool/webui/sync")
+    op: str = Field(..., description="操作: upsert/delete")
+    version: int = Field(0, description="变更后的记录版本号，删除时为 0")
+    fields: Dict[str, Any] = Field(default_factory=dict, description="发生变化的字段及其新值，旧值未知时为全部字段，删除时为空")
+
+class HistoryPage(BaseModel):
+    """变更历史分页模型"""
+    entries: List[HistoryEntry] = Field(default_factory=list, description="按时间倒序排列的历史条目")
+    next_before: Optional[int] = Field(None, description="下一页的 before 参数，没有更多条目时为 null")
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+@File: participants.py
+@Desc: 会话参与者追踪模块
+"""
+
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Iterable, List, Optional, Tuple
+
+from nonebot import on_message
+from nonebot.adapters.onebot.v11 import MessageEvent
+
+from nekro_agent.adapters.onebot_v11.tools.onebot_util import get_chat_info_old
+from nekro_agent.api.core import logger
+from nekro_agent.api.core import config as NA_config
+
+from .conf import plugin, BasicConfig
+
+config: BasicConfig = plugin.get_config(BasicConfig)
+
+
+class ParticipantTracker:
+    """按会话记录最近发言者的环形缓冲区
+
+    会话首次被查询前处于冷状态，此时返回 None，由调用方从数据库加载后调用 `seed`；
+    之后新消息通过 `record` 追加，过期的发言在查询时被过滤。
+    """
+
+    def __init__(self, max_chats: int = 4096):
+        """
+        Args:
+            max_chats: 最多追踪的会话数量，超出后淘汰最久未使用的会话
+        """
+        self.max_chats = max(1, max_chats)
+        self._chats: "OrderedDict[str, Deque[Tuple[str, float]]]" = OrderedDict()
+
+    def _new_ring(self) -> Deque[Tuple[str, float]]:
+        return deque(maxlen=max(1, NA_config.AI_CHAT_CONTEXT_MAX_LENGTH))
+
+    def seed(self, chat_key: str, entries: Iterable[Tuple[str, float]]) -> None:
+        """用数据库中的历史发言初始化会话
+
+        Args:
+            chat_key: 会话ID
+            entries: 按时间从新到旧排列的 (发送者ID, 时间戳)
+        """
+        ring = self._new_ring()
+        ring.extend((str(sender_id), float(timestamp)) for sender_id, timestamp in reversed(list(entries)))
+        self._chats[chat_key] = ring
+        self._chats.move_to_end(chat_key)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+
+    def record(self, chat_key: str, sender_id: str, timestamp: Optional[float] = None) -> None:
+        """记录一条新发言，冷状态的会话会被忽略，等待首次查询时从数据库加载"""
+        ring = self._chats.get(chat_key)
+        if ring is None:
+            return
+        ring.append((sender_id, timestamp if timestamp is not None else time.time()))
+
+    def recent(self, chat_key: str, since: float = 0.0) -> Optional[List[str]]:
+        """返回会话中时间不早于 since 的发送者ID，按时间从新到旧排列
+
+        Returns:
+            Optional[List[str]]: 发送者ID列表，会话处于冷状态时返回 None
+        """
+        ring = self._chats.get(chat_key)
+        if ring is None:
+            return None
+        self._chats.move_to_end(chat_key)
+        expire_before = max(since, time.time() - NA_config.AI_CHAT_CONTEXT_EXPIRE_SECONDS)
+        return [sender_id for sender_id, timestamp in reversed(ring) if timestamp >= expire_before]
+
+    def forget(self, chat_key: str) -> None:
+        """丢弃会话的追踪数据，下次查询时重新从数据库加载"""
+        self._chats.pop(chat_key, None)
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+
+participant_tracker = ParticipantTracker(config.CacheMaxSize)
+
+
+@on_message(priority=1, block=False).handle()
+async def track_participant(event: MessageEvent):
+    """记录收到的消息的发送者，供提示注入时确定参与者"""
+    try:
+        chat_key, _ = await get_chat_info_old(event=event)
+        participant_tracker.record(chat_key, str(event.user_id), float(event.time))
+    except Exception as e:
+        logger.debug(f"记录会话参与者失败: {e}")
@@ -3,10 +3,14 @@
 提供态度管理系统的提示注入功能。
 """
 
+import asyncio
 import time
-from typing import List, Optional, Set
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from .db_sync import SyncData
+from .data_manager import get_user_attitudes, ensure_user_attitude, ensure_group_attitude
+from .cache import user_cache, group_cache, prompt_cache
+from .metrics import metrics
+from .participants import participant_tracker
 from .conf import plugin, BasicConfig
 from .model import UserAttitude, GroupAttitude
 from .prompt_renderer import render_user_prompt, render_group_prompt
@@ -23,6 +27,28 @@ store = plugin.store
 _config: BasicConfig = plugin.get_config(BasicConfig)
 
 
+def _rank_participants(sender_ids: Iterable[str]) -> List[str]:
+    """按最近发言和发言频率对参与者排序
+
+    Args:
+        sender_ids: 按发送时间从新到旧排列的发送者ID
+
+    Returns:
+        List[str]: 排序后的用户ID，越靠前越优先注入
+    """
+    # 第 n 条（从新到旧）消息为其发送者贡献 1/(n+1) 分，越新、越频繁的发言者得分越高
+    scores: Dict[str, float] = {}
+    for position, sender_id in enumerate(sender_ids):
+        if sender_id == "-1":
+            continue
+        scores[sender_id] = scores.get(sender_id, 0.0) + 1.0 / (position + 1)
+    return sorted(scores, key=lambda sender_id: scores[sender_id], reverse=True)
+
+
+def _record_error(stage: str, e: BaseException) -> None:
+    metrics.inc("prompt_errors_total", stage=stage, error=type(e).__name__)
+
+
 @plugin.mount_prompt_inject_method(
     name="attitude",
     description="向 AI 注入当前会话的状态信息和可用工具提示。"
@@ -30,14 +56,18 @@ _config: BasicConfig = plugin.get_config(BasicConfig)
 async def attitude(_ctx: AgentCtx) -> str:
     """生成并返回需要注入到主提示词中的字符串。
 
+    各阶段耗时、注入的用户数和字符数以及错误次数均记录在运行指标中。
+
     Returns:
         str: 需要注入的提示词文本。
-        
-    Raises:
-        RuntimeError: 当提示生成过程中发生错误时抛出
-    """   
+    """
+    with metrics.timer("prompt_stage_seconds", stage="total"):
+        injected_prompt = await _build_prompt(_ctx)
+    metrics.inc("prompt_chars_total", len(injected_prompt))
+    return injected_prompt
 
 
+async def _build_prompt(_ctx: AgentCtx) -> str:
     try:
         logger.debug("开始生成态度管理提示")
         
@@ -125,84 +155,159 @@ async def attitude(_ctx: AgentCtx) -> str:
         logger.debug("------------------------------")
 
         try:
-            db_chat_channel: DBChatChannel = await DBChatChannel.get_channel(chat_key=_ctx.from_chat_key)
-            recent_chat_messages: List[DBChatMessage] = await (
-                DBChatMessage.filter(
-                    send_timestamp__gte=max(int(time.time() - NA_config.AI_CHAT_CONTEXT_EXPIRE_SECONDS), db_chat_channel.conversation_start_time.timestamp()),
-                    chat_key=_ctx.from_chat_key,
-                )
-                .order_by("-send_timestamp")
-                .limit(NA_config.AI_CHAT_CONTEXT_MAX_LENGTH)
-            )
+            # 每次都读取会话的开始时间，重置会话后不再注入重置之前的发言者
+            with metrics.timer("prompt_stage_seconds", stage="channel_lookup"):
+                db_chat_channel: DBChatChannel = await DBChatChannel.get_channel(chat_key=_ctx.from_chat_key)
+            conversation_start = db_chat_channel.conversation_start_time.timestamp()
+            sender_ids: Optional[List[str]] = participant_tracker.recent(_ctx.from_chat_key, since=conversation_start)
+            if sender_ids is None:
+                # 会话首次构建提示词时，从数据库加载最近发言者初始化追踪器，只查询需要的列
+                with metrics.timer("prompt_stage_seconds", stage="message_query"):
+                    recent_senders: List[Tuple[str, int]] = await (
+                        DBChatMessage.filter(
+                            send_timestamp__gte=max(int(time.time() - NA_config.AI_CHAT_CONTEXT_EXPIRE_SECONDS), conversation_start),
+                            chat_key=_ctx.from_chat_key,
+                        )
+                        .order_by("-send_timestamp")
+                        .limit(NA_config.AI_CHAT_CONTEXT_MAX_LENGTH)
+                        .values_list("sender_id", "send_timestamp")
+                    )
+                participant_tracker.seed(_ctx.from_chat_key, recent_senders)
+                sender_ids = [str(sender_id) for sender_id, _ in recent_senders]
         except (OperationalError, IntegrityError) as e:
             logger.error(f"获取聊天消息时数据库错误: chat_key={_ctx.from_chat_key}, error={e}")
+            _record_error("participants", e)
+            metrics.inc("prompt_injections_total", result="fallback")
             # 数据库错误时返回基础提示
             return attitude_instruction
         except DoesNotExist as e:
             logger.warning(f"聊天频道不存在: chat_key={_ctx.from_chat_key}")
+            _record_error("participants", e)
+            metrics.inc("prompt_injections_total", result="fallback")
             # 频道不存在时返回基础提示
             return attitude_instruction
         except Exception as e:
             logger.error(f"获取聊天数据时发生未知错误: chat_key={_ctx.from_chat_key}, error={e}")
+            _record_error("participants", e)
+            metrics.inc("prompt_injections_total", result="fallback")
             return attitude_instruction
 
-        # 提取用户ID
-        user_ids: Set[str] = set()
-        for message in recent_chat_messages:
-            if message.sender_id != "-1":
-                user_ids.add(message.sender_id)
+        # 提取用户ID，按最近发言和发言频率排序后只保留前若干位
+        ranked_user_ids: List[str] = _rank_participants(sender_ids)
+        if _config.PromptMaxUsers > 0:
+            user_ids: List[str] = ranked_user_ids[:_config.PromptMaxUsers]
+        else:
+            user_ids = ranked_user_ids
+        dropped_count: int = len(ranked_user_ids) - len(user_ids)
 
         logger.debug(f"提取到用户ID: {user_ids}")
 
-        # 为每个用户渲染个人提示词
-        for user_key in user_ids:
-            try:
-                stored_user_json: Optional[str] = await store.get(user_key=user_key, store_key="user_info")
-                if stored_user_json:
-                    user_attitude: UserAttitude = UserAttitude.model_validate_json(stored_user_json)
-                    prompt_parts.append(render_user_prompt(user_attitude))
-                    logger.debug(f"加载用户态度数据: {user_key}")
-                else:
-                    await SyncData(plugin.store)
-                    stored_user_json: Optional[str] = await store.get(user_key=user_key, store_key="user_info")
-                    user_attitude: UserAttitude = UserAttitude.model_validate_json(stored_user_json)
-                    prompt_parts.append(render_user_prompt(user_attitude))
-                    logger.debug(f"创建新的用户态度数据: {user_key}")
-            except ValidationError as e:
-                logger.error(f"用户态度数据格式错误: user_key={user_key}, error={e}")
-                continue
-            except (OperationalError, IntegrityError) as e:
-                logger.error(f"获取用户态度数据时数据库错误: user_key={user_key}, error={e}")
-                continue
-            except Exception as e:
-                logger.error(f"获取用户态度数据时发生未知错误: user_key={user_key}, error={e}")
-                continue
+        # 参与者及其记录版本均未变化时，直接复用上次渲染的提示词
+        group_key: str = _ctx.from_chat_key.split("-")[1]
+        signature = (
+            _config.PromptLanguage,
+            _config.PromptMaxUsers,
+            _config.PromptMaxChars,
+            frozenset((user_key, user_cache.version(user_key)) for user_key in user_ids),
+            group_cache.version(group_key),
+        )
+        cached_prompt = prompt_cache.get(_ctx.from_chat_key)
+        if cached_prompt is not None and cached_prompt[0] == signature:
+            logger.debug(f"会话 {_ctx.from_chat_key} 的态度数据未变化，复用已渲染的提示词")
+            if cached_prompt[2]:
+                metrics.inc("prompt_participants_dropped_total", cached_prompt[2])
+            metrics.inc("prompt_participants_total", cached_prompt[3])
+            metrics.inc("prompt_injections_total", result="cached")
+            return cached_prompt[1]
+        # 出现错误时渲染结果不完整，不写入缓存
+        cacheable: bool = True
+
+        # 批量获取所有用户的态度数据并渲染个人提示词
+        try:
+            with metrics.timer("prompt_stage_seconds", stage="user_fetch"):
+                user_attitudes: Dict[str, UserAttitude] = await get_user_attitudes(store, user_ids)
+                missing_user_ids: List[str] = [user_key for user_key in user_ids if user_key not in user_attitudes]
+                if missing_user_ids:
+                    # 仅为缺失的用户按需创建记录，避免在提示构建中全量同步
+                    created = await asyncio.gather(
+                        *(ensure_user_attitude(store, user_key) for user_key in missing_user_ids),
+                        return_exceptions=True,
+                    )
+                    for user_key, result in zip(missing_user_ids, created):
+                        if isinstance(result, BaseException):
+                            logger.error(f"创建用户态度数据失败: user_key={user_key}, error={result}")
+                            _record_error("user_fetch", result)
+                            cacheable = False
+                        elif result is not None:
+                            user_attitudes[user_key] = result
+                            logger.debug(f"创建新的用户态度数据: {user_key}")
+        except (OperationalError, IntegrityError) as e:
+            logger.error(f"获取用户态度数据时数据库错误: user_keys={user_ids}, error={e}")
+            _record_error("user_fetch", e)
+            user_attitudes = {}
+            cacheable = False
+        except Exception as e:
+            logger.error(f"获取用户态度数据时发生未知错误: user_keys={user_ids}, error={e}")
+            _record_error("user_fetch", e)
+            user_attitudes = {}
+            cacheable = False
+
+        used_chars: int = 0
+        injected_users: int = 0
+        with metrics.timer("prompt_stage_seconds", stage="render"):
+            for index, user_key in enumerate(user_ids):
+                user_attitude: Optional[UserAttitude] = user_attitudes.get(user_key)
+                if user_attitude is None:
+                    continue
+                user_prompt: str = render_user_prompt(user_attitude)
+                if _config.PromptMaxChars > 0 and used_chars + len(user_prompt) > _config.PromptMaxChars:
+                    dropped_count += len(user_ids) - index
+                    break
+                used_chars += len(user_prompt)
+                injected_users += 1
+                prompt_parts.append(user_prompt)
+                logger.debug(f"加载用户态度数据: {user_key}")
+
+        if dropped_count:
+            logger.debug(f"会话 {_ctx.from_chat_key} 超出提示词预算，省略 {dropped_count} 位用户")
+            metrics.inc("prompt_participants_dropped_total", dropped_count)
+        metrics.inc("prompt_participants_total", injected_users)
 
         # 渲染群组提示词
         try:
-            stored_group_json: Optional[str] = await store.get(chat_key=_ctx.from_chat_key.split("-")[1], store_key="group_info")
-            if stored_group_json:
-                group_attitude: GroupAttitude = GroupAttitude.model_validate_json(stored_group_json)
+            with metrics.timer("prompt_stage_seconds", stage="group_fetch"):
+                group_attitude: Optional[GroupAttitude] = await ensure_group_attitude(store, group_key)
+            if group_attitude:
                 prompt_parts.append(render_group_prompt(group_attitude))
                 logger.debug(f"加载群组态度数据: {_ctx.from_chat_key}")
             else:
                 logger.debug(f"群组态度数据 {_ctx.from_chat_key} 不存在，跳过加载。")
         except ValidationError as e:
             logger.error(f"群组态度数据格式错误: chat_key={_ctx.from_chat_key}, error={e}")
+            _record_error("group_fetch", e)
+            cacheable = False
         except (OperationalError, IntegrityError) as e:
             logger.error(f"获取群组态度数据时数据库错误: chat_key={_ctx.from_chat_key}, error={e}")
+            _record_error("group_fetch", e)
+            cacheable = False
         except Exception as e:
             logger.error(f"获取群组态度数据时发生未知错误: chat_key={_ctx.from_chat_key}, error={e}")
+            _record_error("group_fetch", e)
+            cacheable = False
 
         # 最终注入的提示词
         injected_prompt: str = "\n".join(prompt_parts)
-        logger.debug(f"为会话 {_ctx.from_chat_key} 注入提示: \n{injected_prompt}")
+        if cacheable:
+            prompt_cache.set(_ctx.from_chat_key, (signature, injected_prompt, dropped_count, injected_users))
+        # 只记录长度，避免每次注入都格式化整段提示词
+        logger.debug(f"为会话 {_ctx.from_chat_key} 注入提示: {injected_users} 位用户，{len(injected_prompt)} 字符")
+        metrics.inc("prompt_injections_total", result="rendered" if cacheable else "partial")
 
-        logger.debug("------------------------------")
-       
         return injected_prompt
         
     except Exception as e:
         logger.error(f"态度管理提示注入发生未知错误: error={e}", exc_info=True)
+        _record_error("unknown", e)
+        metrics.inc("prompt_injections_total", result="error")
         # 对于提示注入失败，我们返回空字符串而不是抛出异常，以免影响正常对话
-        return ""
\ No newline at end of file
+        return ""
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+@File: reconcile.py
+@Desc: 启动数据校验模块，一次遍历完成验证、修复和同步
+"""
+
+import asyncio
+import time
+from contextlib import suppress
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from nekro_agent.api.core import logger
+from nekro_agent.models.db_plugin_data import DBPluginData
+from nekro_agent.models.db_user import DBUser
+from nekro_agent.models.db_chat_channel import DBChatChannel
+
+from .conf import plugin
+from .model import UserAttitude, GroupAttitude, ReconcileCounts, ReconcileReport, ReconcileProgress
+from .cache import user_cache, group_cache
+from .codec import decode_record, encode_record, load_fields
+from .db_sync import write_staged_records, get_user_data, get_group_data
+from .locks import user_locks, group_locks
+from .history import SOURCE_RECONCILE, recording_source
+
+# 同时执行的批量写入事务数量上限
+RECONCILE_CONCURRENCY = 4
+
+# 后台校验的进度，供路由查询
+progress = ReconcileProgress()
+_reconcile_task: Optional["asyncio.Task[None]"] = None
+
+
+def _load_old_data(model: type, stored_json: str, entity: str) -> Dict[str, Any]:
+    """尽可能从格式错误的旧数据中恢复字段"""
+    old_data = load_fields(model, stored_json)
+    if old_data is None:
+        logger.error(f"无法解析{entity}的旧数据，将使用默认值。")
+        return {}
+    return old_data
+
+
+def _reconcile_record(
+    model: type,
+    stored_json: Optional[str],
+    fresh: BaseModel,
+    synced_fields: Tuple[str, ...],
+    kept_fields: Tuple[str, ...],
+    entity: str,
+    counts: ReconcileCounts,
+) -> Optional[BaseModel]:
+    """校验单条记录，返回需要写回的记录，无需写回时返回 None
+
+    Args:
+        model: 记录的 Pydantic 模型
+        stored_json: store 中的原始数据
+        fresh: 根据数据库当前信息构建的默认记录
+        synced_fields: 需要与数据库保持一致的字段
+        kept_fields: 需要从旧数据中保留的字段
+        entity: 日志中使用的实体描述
+        counts: 计数对象
+    """
+    counts.total += 1
+
+    if not stored_json:
+        logger.debug(f"{entity}在 store 中不存在，正在添加...")
+        counts.added += 1
+        return fresh
+
+    try:
+        stored = decode_record(model, stored_json)
+    except ValidationError as e:
+        logger.warning(f"{entity}的数据需要修复: {e}")
+        old_data = _load_old_data(model, stored_json, entity)
+        repaired_data = fresh.model_dump()
+        repaired_data.update({field: old_data.get(field, "") for field in kept_fields})
+        # 修复同样是一次写入，能读出旧版本号时在其基础上递增
+        old_version = old_data.get("version")
+        repaired_data["version"] = old_version + 1 if type(old_version) is int else 0
+        try:
+            repaired = model.model_validate(repaired_data)
+        except ValidationError as repair_e:
+            logger.error(f"修复{entity}的数据失败: {repair_e}")
+            counts.failed += 1
+            return None
+        counts.repaired += 1
+        return repaired
+
+    if any(getattr(stored, field) != getattr(fresh, field) for field in synced_fields):
+        logger.debug(f"{entity}的数据不一致，正在更新...")
+        counts.updated += 1
+        return fresh.model_copy(update={
+            **{field: getattr(stored, field) for field in kept_fields},
+            "version": stored.version + 1,
+        })
+
+    counts.unchanged += 1
+    return None
+
+
+def build_user_record(
+    user_key: str,
+    user_id: int,
+    username: str,
+    stored_json: Optional[str],
+    counts: Optional[ReconcileCounts] = None,
+) -> Optional[UserAttitude]:
+    """按数据库中的用户信息校验 store 中的用户记录
+
+    Args:
+        user_key: 用户ID（platform_userid）
+        user_id: 用户在数据库中的ID
+        username: 用户在数据库中的用户名
+        stored_json: store 中的原始数据
+        counts: 可选的计数对象
+
+    Returns:
+        Optional[UserAttitude]: 需要写回的记录，无需写回或修复失败时返回 None
+    """
+    fresh = UserAttitude(
+        id=user_id,
+        user_id=user_key,
+        username=username,
+        nickname="",
+        attitude="",
+        relationship="",
+        other="",
+    )
+    return _reconcile_record(
+        UserAttitude,
+        stored_json,
+        fresh,
+        synced_fields=("username",),
+        kept_fields=("nickname", "attitude", "relationship", "other"),
+        entity=f"用户 {user_key} ",
+        counts=counts if counts is not None else ReconcileCounts(),
+    )
+
+
+def build_group_record(
+    chat_key: str,
+    group_id: int,
+    channel_name: str,
+    stored_json: Optional[str],
+    counts: Optional[ReconcileCounts] = None,
+) -> Optional[GroupAttitude]:
+    """按数据库中的群组信息校验 store 中的群组记录，参数与返回值含义同 `build_user_record`"""
+    fresh = GroupAttitude(
+        id=group_id,
+        group_id=chat_key,
+        channel_name=channel_name,
+        attitude="",
+        other="",
+    )
+    return _reconcile_record(
+        GroupAttitude,
+        stored_json,
+        fresh,
+        synced_fields=("channel_name",),
+        kept_fields=("attitude", "other"),
+        entity=f"群组 {chat_key} ",
+        counts=counts if counts is not None else ReconcileCounts(),
+    )
+
+
+async def reconcile_data(
+    store,
+    concurrency: int = RECONCILE_CONCURRENCY,
+    progress: Optional[ReconcileProgress] = None,
+) -> ReconcileReport:
+    """
+    一次遍历完成数据验证、修复和同步。
+
+    用户表、群组表和插件数据各只读取一次，在内存中逐条校验：
+    缺失的记录新增，格式错误的记录修复，信息不一致的记录更新，
+    最后以有限并发的分块批量写入落库。写入时持有相关键的锁并重新读取，
+    不会覆盖校验期间其他路径（按需修复、工具和 WebUI 更新）写入的记录。
+
+    Args:
+        store: 插件数据存储对象。
+        concurrency: 同时执行的批量写入事务数量上限。
+        progress: 可选的进度对象，校验过程中会实时更新。
+
+    Returns:
+        ReconcileReport: 各类处理结果的计数和耗时。
+    """
+    started = time.perf_counter()
+    report = ReconcileReport()
+    progress = progress or ReconcileProgress()
+    progress.phase = "loading"
+    logger.debug("开始校验 Attitude 插件的数据...")
+
+    users_raw_data, groups_raw_data, rows = await asyncio.gather(
+        get_user_data(),
+        get_group_data(),
+        DBPluginData.filter(
+            plugin_key=plugin.key,
+            data_key__in=["user_info", "group_info"],
+        ).order_by("-id"),
+    )
+
+    existing_users: Dict[str, DBPluginData] = {}
+    existing_groups: Dict[str, DBPluginData] = {}
+    for row in rows:
+        # 按 id 倒序遍历，重复记录中保留 id 最小的一条，与 store.get 的行为一致
+        if row.data_key == "user_info" and not row.target_chat_key:
+            existing_users[row.target_user_key] = row
+        elif row.data_key == "group_info" and not row.target_user_key:
+            existing_groups[row.target_chat_key] = row
+
+    # 同一平台ID可能对应多条数据库记录，以最后一条为准
+    users_by_key = {user_data["platform_userid"]: user_data for user_data in users_raw_data}
+    groups_by_key = {group_data["channel_id"]: group_data for group_data in groups_raw_data}
+    progress.phase = "checking"
+    progress.total = len(users_by_key) + len(groups_by_key)
+
+    # 需要写回的记录: 键 -> (快照中的原始数据, 校验后的记录)
+    staged_users: Dict[str, Tuple[Optional[str], UserAttitude]] = {}
+    staged_groups: Dict[str, Tuple[Optional[str], GroupAttitude]] = {}
+
+    # 1. 校验用户数据
+    for user_data in users_by_key.values():
+        progress.checked += 1
+        user_key = user_data["platform_userid"]
+        row = existing_users.get(user_key)
+        stored_json = row.data_value if row else None
+        record = build_user_record(user_key, user_data["id"], user_data["username"], stored_json, report.users)
+        if record is not None:
+            staged_users[user_key] = (stored_json, record)
+
+    # 2. 校验群组数据
+    for group_data in groups_by_key.values():
+        progress.checked += 1
+        group_key = group_data["channel_id"]
+        row = existing_groups.get(group_key)
+        stored_json = row.data_value if row else None
+        record = build_group_record(group_key, group_data["id"], group_data["channel_name"], stored_json, report.groups)
+        if record is not None:
+            staged_groups[group_key] = (stored_json, record)
+
+    # 3. 分块写回
+    progress.phase = "writing"
+    progress.to_write = len(staged_users) + len(staged_groups)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def on_written(count: int) -> None:
+        progress.written += count
+
+    def rebuild_user(user_key: str, stored_json: Optional[str]) -> Optional[UserAttitude]:
+        user_data = users_by_key[user_key]
+        return build_user_record(user_key, user_data["id"], user_data["username"], stored_json)
+
+    def rebuild_group(group_key: str, stored_json: Optional[str]) -> Optional[GroupAttitude]:
+        group_data = groups_by_key[group_key]
+        return build_group_record(group_key, group_data["id"], group_data["channel_name"], stored_json)
+
+    # 全量校验的写入不记入变更历史，否则首次启动时每条记录都会产生一条历史
+    with recording_source(SOURCE_RECONCILE):
+        await asyncio.gather(
+            write_staged_records(
+                "user_info", "target_user_key", staged_users, rebuild_user, user_locks, user_cache, semaphore, on_written
+            ),
+            write_staged_records(
+                "group_info", "target_chat_key", staged_groups, rebuild_group, group_locks, group_cache, semaphore, on_written
+            ),
+        )
+
+    report.elapsed = time.perf_counter() - started
+    for entity, counts in (("用户", report.users), ("群组", report.groups)):
+        logger.info(
+            f"Attitude 插件{entity}数据校验完成: 共 {counts.total}，新增 {counts.added}，"
+            f"修复 {counts.repaired}，更新 {counts.updated}，未变化 {counts.unchanged}，失败 {counts.failed}"
+        )
+    logger.info(f"Attitude 插件数据校验耗时 {report.elapsed:.3f} 秒")
+    return report
+
+
+async def _run_background_reconcile(store) -> None:
+    """执行后台校验并记录结果"""
+    progress.state = "running"
+    progress.started_at = time.time()
+    try:
+        report = await reconcile_data(store, progress=progress)
+    except Exception as e:
+        progress.state = "failed"
+        progress.error = str(e)
+        logger.error(f"Attitude 插件后台数据校验失败: {e}", exc_info=True)
+        return
+    finally:
+        progress.finished_at = time.time()
+
+    progress.report = report
+    if report.success:
+        progress.state = "ready"
+        logger.info("Attitude 插件数据模型验证通过。")
+    else:
+        progress.state = "failed"
+        progress.error = "部分数据自动修复失败"
+        logger.error("Attitude 插件数据模型自动修复失败，相关数据将在访问时再次尝试修复。")
+
+
+def start_background_reconcile(store) -> "asyncio.Task[None]":
+    """在后台启动数据校验，已有校验在运行时直接返回该任务
+
+    Args:
+        store: 插件数据存储对象。
+
+    Returns:
+        asyncio.Task: 后台校验任务。
+    """
+    global _reconcile_task, progress
+    if _reconcile_task is not None and not _reconcile_task.done():
+        return _reconcile_task
+    progress = ReconcileProgress()
+    _reconcile_task = asyncio.create_task(_run_background_reconcile(store))
+    return _reconcile_task
+
+
+async def stop_background_reconcile() -> None:
+    """取消正在运行的后台校验并等待其结束，用于插件卸载"""
+    if _reconcile_task is None or _reconcile_task.done():
+        return
+    _reconcile_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await _reconcile_task
+
+
+def get_progress() -> ReconcileProgress:
+    """获取后台数据校验的进度"""
+    return progress
+
+
+def is_ready() -> bool:
+    """后台数据校验是否已完成"""
+    return progress.ready
+
+
+async def reconcile_user(store, user_key: str) -> Optional[UserAttitude]:
+    """只校验单个用户的数据，缺失时创建，格式错误时修复
+
+    Args:
+        store: 插件数据存储对象。
+        user_key: 用户ID（platform_userid）。
+
+    Returns:
+        Optional[UserAttitude]: 有效的用户态度数据，用户不存在或修复失败时返回 None。
+    """
+    stored_user_json = await store.get(user_key=user_key, store_key="user_info")
+    if stored_user_json:
+        try:
+            user_attitude = decode_record(UserAttitude, stored_user_json)
+        except ValidationError:
+            pass
+        else:
+            user_cache.set(user_key, user_attitude)
+            return user_attitude
+
+    user = await DBUser.filter(platform_userid=user_key, id__not=1).first()
+    if user is None:
+        logger.debug(f"用户 {user_key} 不存在于数据库中，跳过同步。")
+        return None
+
+    record = build_user_record(user_key, user.id, user.username, stored_user_json)
+    if record is None:
+        return None
+    await store.set(user_key=user_key, store_key="user_info", value=encode_record(record))
+    user_cache.write(user_key, record)
+    return record
+
+
+async def reconcile_group(store, chat_key: str) -> Optional[GroupAttitude]:
+    """只校验单个群组的数据，缺失时创建，格式错误时修复
+
+    Args:
+        store: 插件数据存储对象。
+        chat_key: 群组ID（channel_id）。
+
+    Returns:
+        Optional[GroupAttitude]: 有效的群组态度数据，群组不存在或修复失败时返回 None。
+    """
+    stored_group_json = await store.get(chat_key=chat_key, store_key="group_info")
+    if stored_group_json:
+        try:
+            group_attitude = decode_record(GroupAttitude, stored_group_json)
+        except ValidationError:
+            pass
+        else:
+            group_cache.set(chat_key, group_attitude)
+            return group_attitude
+
+    group = await DBChatChannel.filter(channel_id=chat_key, channel_type="group").first()
+    if group is None:
+        logger.debug(f"群组 {chat_key} 不存在于数据库中，跳过同步。")
+        return None
+
+    record = build_group_record(chat_key, group.id, group.channel_name, stored_group_json)
+    if record is None:
+        return None
+    await store.set(chat_key=chat_key, store_key="group_info", value=encode_record(record))
+    group_cache.write(chat_key, record)
+    return record
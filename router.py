@@ -6,19 +6,82 @@
 @Desc: 态度插件路由模块
 """
 
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, Dict, List, Optional, Type, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
-import os
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import asyncio
+import csv
+import io
+import time
+import zlib
 
-from nekro_agent.models.db_plugin_data import DBPluginData
-
-from .model import UserAttitude, GroupAttitude
-from .data_manager import update_user_attitude, update_group_attitude, delete_user_attitude, delete_group_attitude
+from .model import (
+    UserAttitude,
+    GroupAttitude,
+    UserAttitudeDelta,
+    GroupAttitudeDelta,
+    ReconcileProgress,
+    BatchItemResult,
+    SearchHit,
+    SearchResult,
+    HistoryPage,
+)
+from .data_manager import (
+    get_user_attitude,
+    get_group_attitude,
+    get_user_attitudes,
+    get_group_attitudes,
+    query_user_attitudes,
+    query_group_attitudes,
+    get_user_changes,
+    get_group_changes,
+    search_user_attitudes,
+    search_group_attitudes,
+    iter_user_attitudes,
+    iter_group_attitudes,
+    update_user_attitude,
+    update_group_attitude,
+    delete_user_attitude,
+    delete_group_attitude,
+    bulk_update_user_attitudes,
+    bulk_update_group_attitudes,
+    bulk_delete_user_attitudes,
+    bulk_delete_group_attitudes,
+    VersionConflictError,
+)
+from .assets import load_assets
+from .cache import cache_stats, user_cache, group_cache
+from .events import change_feed
+from .history import SOURCE_WEBUI, change_source, user_history, group_history
+from .metrics import metrics
+from .reconcile import get_progress
 from .conf import plugin
 
-router = APIRouter()
+
+async def _mark_webui_source() -> None:
+    # 异步依赖与路由函数在同一上下文中执行，路由内的写入都会记为来自 WebUI
+    change_source.set(SOURCE_WEBUI)
+
+
+router = APIRouter(dependencies=[Depends(_mark_webui_source)])
+
+# 列表接口单页最大数量
+MAX_PAGE_SIZE = 500
+# 列表接口可用的排序字段
+USER_SORT_FIELDS = ("id", "user_id", "username", "nickname", "attitude", "relationship")
+GROUP_SORT_FIELDS = ("id", "group_id", "channel_name", "attitude")
+# 变更事件流的心跳间隔（秒），用于保持连接并及时发现断开的客户端
+EVENT_HEARTBEAT_INTERVAL = 15
+# 变更历史单页最大条目数
+MAX_HISTORY_PAGE_SIZE = 200
+# 批量接口单次请求最多包含的记录数
+MAX_BATCH_SIZE = 1000
+# 导出格式对应的响应类型
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
 
 # 请求和响应模型
 class UserAttitudeUpdate(BaseModel):
@@ -28,59 +91,120 @@ class UserAttitudeUpdate(BaseModel):
     attitude: Optional[str] = None
     relationship: Optional[str] = None
     other: Optional[str] = None
+    # 读取记录时得到的版本号，提供时与当前版本不一致则返回 409
+    version: Optional[int] = None
 
 class GroupAttitudeUpdate(BaseModel):
     """群组态度更新请求模型"""
     attitude: Optional[str] = None
     other: Optional[str] = None
+    version: Optional[int] = None
+
+class UserAttitudeBatchItem(UserAttitudeUpdate):
+    """用户态度批量更新请求项"""
+    user_id: str
+
+class GroupAttitudeBatchItem(GroupAttitudeUpdate):
+    """群组态度批量更新请求项"""
+    group_id: str
+
+class BatchDeleteRequest(BaseModel):
+    """批量删除请求模型"""
+    ids: List[str]
+
+
+# WebUI 静态资源在路由创建时一次性加载到内存
+web_assets = load_assets()
 
-@router.get("/")
-async def webui():  
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # 构建web.html的完整路径
-    html_path = os.path.join(current_dir, "web", "index.html")
-    
-    # 返回HTML文件
-    return FileResponse(html_path, media_type="text/html")
-
-@router.get("/style.css")
-async def webui():
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # 构建web.html的完整路径
-    html_path = os.path.join(current_dir, "web", "style.css")
-    
-    # 返回HTML文件
-    return FileResponse(html_path, media_type="text/css")
-
-@router.get("/script.js")
-async def webui():
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # 构建web.html的完整路径
-    html_path = os.path.join(current_dir, "web", "script.js")
-    
-    # 返回HTML文件
-    return FileResponse(html_path, media_type="text/js")
+@router.get("/", summary="WebUI 页面")
+async def webui_index(request: Request):
+    return web_assets["index.html"].response(request)
+
+@router.get("/style.css", summary="WebUI 样式")
+async def webui_style(request: Request):
+    return web_assets["style.css"].response(request)
+
+@router.get("/script.js", summary="WebUI 脚本")
+async def webui_script(request: Request):
+    return web_assets["script.js"].response(request)
+
+
+def _list_etag(request: Request, version: int) -> str:
+    """列表响应的 ETag 由数据集版本号和查询参数共同决定"""
+    return f'W/"{version}-{zlib.crc32(str(request.url.query).encode()):08x}"'
+
+
+def _check_not_modified(request: Request, response: Response, version: int) -> Optional[Response]:
+    """设置版本相关的响应头，客户端缓存仍然有效时返回 304 响应"""
+    etag = _list_etag(request, version)
+    headers = {
+        "ETag": etag,
+        "X-Dataset-Version": str(version),
+        # 要求浏览器每次都带 If-None-Match 重新验证，未变化时只需一个 304
+        "Cache-Control": "no-cache",
+        "Access-Control-Expose-Headers": "X-Total-Count, X-Dataset-Version, ETag",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 # 用户态度相关路由
-@router.get("/users", response_model=List[UserAttitude], summary="获取所有用户态度列表")
-async def get_all_users():
-    """获取所有用户态度列表"""
+@router.get("/users", response_model=Union[List[UserAttitude], UserAttitudeDelta], summary="获取所有用户态度列表")
+async def get_all_users(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, description="只返回该数据集版本之后变更或删除的用户，此时忽略其他参数"),
+    ids: Optional[str] = Query(None, description="以逗号分隔的用户ID列表，仅返回这些用户"),
+    page: int = Query(1, ge=1, description="页码，从 1 开始"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不传则返回全部"),
+    search: Optional[str] = Query(None, description="在QQ号、用户名、称呼和关系中搜索"),
+    username: Optional[str] = Query(None, description="按用户名筛选"),
+    nickname: Optional[str] = Query(None, description="按称呼筛选"),
+    attitude: Optional[str] = Query(None, description="按态度筛选"),
+    relationship: Optional[str] = Query(None, description="按关系筛选"),
+    sort: Optional[str] = Query(None, description=f"排序字段: {', '.join(USER_SORT_FIELDS)}"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向: asc 或 desc"),
+):
+    """获取用户态度列表，支持服务端分页、筛选和排序，总数通过 X-Total-Count 响应头返回
+
+    响应带有 ETag 和 X-Dataset-Version，数据未变化时对 If-None-Match 返回 304。
+    """
+    if sort is not None and sort not in USER_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+    # 先读取版本号再查询数据，查询期间发生的写入只会让客户端下次多取一次
+    version = user_cache.dataset_version()
+    not_modified = _check_not_modified(request, response, version)
+    if not_modified is not None:
+        return not_modified
     try:
-        users_data = []
-        # 从数据库中获取所有用户态度数据
-        db_data = await DBPluginData.filter(
-            plugin_key=plugin.key,
-            data_key="user_info"
-        ).all()
-        
-        for data in db_data:
-            if data.data_value:
-                user_attitude = UserAttitude.model_validate_json(data.data_value)
-                users_data.append(user_attitude)
+        if since is not None:
+            changes = await get_user_changes(plugin.store, since)
+            if changes is None:
+                _, users_data = await query_user_attitudes(plugin.store)
+                return UserAttitudeDelta(version=version, full=True, changed=users_data)
+            changed, deleted = changes
+            return UserAttitudeDelta(version=version, changed=changed, deleted=deleted)
+
+        if ids:
+            user_ids = [user_id for user_id in dict.fromkeys(ids.split(",")) if user_id]
+            user_attitudes = await get_user_attitudes(plugin.store, user_ids)
+            users_data = [user_attitudes[user_id] for user_id in user_ids if user_id in user_attitudes]
+            response.headers["X-Total-Count"] = str(len(users_data))
+            return users_data
+
+        total, users_data = await query_user_attitudes(
+            plugin.store,
+            search=search,
+            filters={"username": username, "nickname": nickname, "attitude": attitude, "relationship": relationship},
+            sort=sort,
+            descending=order == "desc",
+            offset=(page - 1) * limit if limit else 0,
+            limit=limit,
+        )
+        response.headers["X-Total-Count"] = str(total)
         return users_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取用户态度列表失败: {e}")
@@ -89,22 +213,34 @@ async def get_all_users():
 async def get_user(user_id: str):
     """获取指定用户的态度信息"""
     try:
-        user_json = await plugin.store.get(user_key=user_id, store_key="user_info")
-        if not user_json:
+        user_attitude = await get_user_attitude(plugin.store, user_id)
+        if not user_attitude:
             raise HTTPException(status_code=404, detail=f"用户 {user_id} 不存在")
-        return UserAttitude.model_validate_json(user_json)
+        return user_attitude
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取用户态度信息失败: {e}")
 
+@router.get("/users/{user_id}/history", response_model=HistoryPage, summary="获取指定用户的态度变更历史")
+async def get_user_history(
+    user_id: str,
+    before: Optional[int] = Query(None, description="只返回ID小于该值的条目，取上一页响应中的 next_before"),
+    limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE_SIZE, description="每页条目数"),
+):
+    """按时间倒序分页获取用户的态度变更历史，用户已删除时仍可查询"""
+    try:
+        entries, next_before = await user_history.read(user_id, before=before, limit=limit)
+        return HistoryPage(entries=entries, next_before=next_before)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取用户态度变更历史失败: {e}")
+
 @router.put("/users/{user_id}", response_model=UserAttitude, summary="更新指定用户的态度信息")
 async def update_user(user_id: str, update_data: UserAttitudeUpdate):
     """更新指定用户的态度信息"""
     try:
         # 检查用户是否存在
-        user_json = await plugin.store.get(user_key=user_id, store_key="user_info")
-        if not user_json:
+        if not await get_user_attitude(plugin.store, user_id):
             raise HTTPException(status_code=404, detail=f"用户 {user_id} 不存在")
         
         # 更新用户态度
@@ -115,33 +251,71 @@ async def update_user(user_id: str, update_data: UserAttitudeUpdate):
             nickname=update_data.nickname,
             attitude=update_data.attitude,
             relationship=update_data.relationship,
-            other=update_data.other
+            other=update_data.other,
+            expected_version=update_data.version,
         )
         
         # 返回更新后的数据
-        updated_user_json = await plugin.store.get(user_key=user_id, store_key="user_info")
-        return UserAttitude.model_validate_json(updated_user_json)
+        return await get_user_attitude(plugin.store, user_id)
     except HTTPException:
         raise
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新用户态度信息失败: {e}")
 
 # 群组态度相关路由
-@router.get("/groups", response_model=List[GroupAttitude], summary="获取所有群组态度列表")
-async def get_all_groups():
-    """获取所有群组态度列表"""
+@router.get("/groups", response_model=Union[List[GroupAttitude], GroupAttitudeDelta], summary="获取所有群组态度列表")
+async def get_all_groups(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, description="只返回该数据集版本之后变更或删除的群组，此时忽略其他参数"),
+    ids: Optional[str] = Query(None, description="以逗号分隔的群组ID列表，仅返回这些群组"),
+    page: int = Query(1, ge=1, description="页码，从 1 开始"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不传则返回全部"),
+    search: Optional[str] = Query(None, description="在群号和群组名称中搜索"),
+    channel_name: Optional[str] = Query(None, description="按群组名称筛选"),
+    attitude: Optional[str] = Query(None, description="按态度筛选"),
+    sort: Optional[str] = Query(None, description=f"排序字段: {', '.join(GROUP_SORT_FIELDS)}"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向: asc 或 desc"),
+):
+    """获取群组态度列表，支持服务端分页、筛选和排序，总数通过 X-Total-Count 响应头返回
+
+    响应带有 ETag 和 X-Dataset-Version，数据未变化时对 If-None-Match 返回 304。
+    """
+    if sort is not None and sort not in GROUP_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+    # 先读取版本号再查询数据，查询期间发生的写入只会让客户端下次多取一次
+    version = group_cache.dataset_version()
+    not_modified = _check_not_modified(request, response, version)
+    if not_modified is not None:
+        return not_modified
     try:
-        groups_data = []
-        # 从数据库中获取所有群组态度数据
-        db_data = await DBPluginData.filter(
-            plugin_key=plugin.key,
-            data_key="group_info"
-        ).all()
-        
-        for data in db_data:
-            if data.data_value:
-                group_attitude = GroupAttitude.model_validate_json(data.data_value)
-                groups_data.append(group_attitude)
+        if since is not None:
+            changes = await get_group_changes(plugin.store, since)
+            if changes is None:
+                _, groups_data = await query_group_attitudes(plugin.store)
+                return GroupAttitudeDelta(version=version, full=True, changed=groups_data)
+            changed, deleted = changes
+            return GroupAttitudeDelta(version=version, changed=changed, deleted=deleted)
+
+        if ids:
+            group_ids = [group_id for group_id in dict.fromkeys(ids.split(",")) if group_id]
+            group_attitudes = await get_group_attitudes(plugin.store, group_ids)
+            groups_data = [group_attitudes[group_id] for group_id in group_ids if group_id in group_attitudes]
+            response.headers["X-Total-Count"] = str(len(groups_data))
+            return groups_data
+
+        total, groups_data = await query_group_attitudes(
+            plugin.store,
+            search=search,
+            filters={"channel_name": channel_name, "attitude": attitude},
+            sort=sort,
+            descending=order == "desc",
+            offset=(page - 1) * limit if limit else 0,
+            limit=limit,
+        )
+        response.headers["X-Total-Count"] = str(total)
         return groups_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取群组态度列表失败: {e}")
@@ -150,22 +324,34 @@ async def get_all_groups():
 async def get_group(group_id: str):
     """获取指定群组的态度信息"""
     try:
-        group_json = await plugin.store.get(chat_key=group_id, store_key="group_info")
-        if not group_json:
+        group_attitude = await get_group_attitude(plugin.store, group_id)
+        if not group_attitude:
             raise HTTPException(status_code=404, detail=f"群组 {group_id} 不存在")
-        return GroupAttitude.model_validate_json(group_json)
+        return group_attitude
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取群组态度信息失败: {e}")
 
+@router.get("/groups/{group_id}/history", response_model=HistoryPage, summary="获取指定群组的态度变更历史")
+async def get_group_history(
+    group_id: str,
+    before: Optional[int] = Query(None, description="只返回ID小于该值的条目，取上一页响应中的 next_before"),
+    limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE_SIZE, description="每页条目数"),
+):
+    """按时间倒序分页获取群组的态度变更历史，群组已删除时仍可查询"""
+    try:
+        entries, next_before = await group_history.read(group_id, before=before, limit=limit)
+        return HistoryPage(entries=entries, next_before=next_before)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取群组态度变更历史失败: {e}")
+
 @router.put("/groups/{group_id}", response_model=GroupAttitude, summary="更新指定群组的态度信息")
 async def update_group(group_id: str, update_data: GroupAttitudeUpdate):
     """更新指定群组的态度信息"""
     try:
         # 检查群组是否存在
-        group_json = await plugin.store.get(chat_key=group_id, store_key="group_info")
-        if not group_json:
+        if not await get_group_attitude(plugin.store, group_id):
             raise HTTPException(status_code=404, detail=f"群组 {group_id} 不存在")
         
         # 更新群组态度
@@ -173,14 +359,16 @@ async def update_group(group_id: str, update_data: GroupAttitudeUpdate):
             plugin.store,
             group_id,
             attitude=update_data.attitude,
-            other=update_data.other
+            other=update_data.other,
+            expected_version=update_data.version,
         )
         
         # 返回更新后的数据
-        updated_group_json = await plugin.store.get(chat_key=group_id, store_key="group_info")
-        return GroupAttitude.model_validate_json(updated_group_json)
+        return await get_group_attitude(plugin.store, group_id)
     except HTTPException:
         raise
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新群组态度信息失败: {e}")
 
@@ -215,4 +403,185 @@ async def delete_group(group_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"删除群组态度信息失败: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除群组态度信息失败: {e}")
+
+
+def _csv_line(values: List[object]) -> str:
+    """将一行数据编码为 CSV 文本"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+async def _export_lines(records: AsyncIterator[BaseModel], model: Type[BaseModel], export_format: str) -> AsyncIterator[str]:
+    """逐条编码导出记录，不在内存中保留完整数据集"""
+    if export_format == "csv":
+        fields = list(model.model_fields)
+        # 带 BOM 以便 Excel 正确识别 UTF-8 编码的中文
+        yield "\ufeff" + _csv_line(fields)
+        async for record in records:
+            yield _csv_line([getattr(record, field) for field in fields])
+    else:
+        async for record in records:
+            yield record.model_dump_json() + "\n"
+
+
+def _export_response(records: AsyncIterator[BaseModel], model: Type[BaseModel], name: str, export_format: str) -> StreamingResponse:
+    return StreamingResponse(
+        _export_lines(records, model, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+
+@router.get("/export/users", summary="流式导出全部用户态度")
+async def export_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式: ndjson 或 csv")):
+    """以 NDJSON 或 CSV 格式分批读取并流式返回全部用户态度，内存占用不随记录数增长"""
+    return _export_response(iter_user_attitudes(plugin.store), UserAttitude, "users", format)
+
+
+@router.get("/export/groups", summary="流式导出全部群组态度")
+async def export_groups(format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式: ndjson 或 csv")):
+    """以 NDJSON 或 CSV 格式分批读取并流式返回全部群组态度，内存占用不随记录数增长"""
+    return _export_response(iter_group_attitudes(plugin.store), GroupAttitude, "groups", format)
+
+
+def _check_batch_size(size: int) -> None:
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次批量操作最多 {MAX_BATCH_SIZE} 条，实际 {size} 条")
+
+
+@router.patch("/users", response_model=List[BatchItemResult], summary="批量新增或更新用户态度")
+async def batch_update_users(items: List[UserAttitudeBatchItem]):
+    """批量新增或更新用户态度，所有写入在同一个事务中执行，返回逐项结果
+
+    提供 version 的项在版本号不一致时不写入，action 为 conflict
+    store 和数据库中都不存在的用户不会创建，action 为 not_found
+    """
+    _check_batch_size(len(items))
+    updates: Dict[str, Dict[str, Optional[str]]] = {}
+    expected_versions: Dict[str, int] = {}
+    for item in items:
+        # 同一用户出现多次时按顺序合并，后出现的字段覆盖先出现的
+        updates.setdefault(item.user_id, {}).update(item.model_dump(exclude={"user_id", "version"}, exclude_none=True))
+        if item.version is not None:
+            expected_versions.setdefault(item.user_id, item.version)
+    try:
+        return await bulk_update_user_attitudes(plugin.store, updates, expected_versions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量更新用户态度失败: {e}")
+
+@router.delete("/users", response_model=List[BatchItemResult], summary="批量删除用户态度")
+async def batch_delete_users(request: BatchDeleteRequest):
+    """批量删除用户态度，所有删除在同一个事务中执行，返回逐项结果"""
+    _check_batch_size(len(request.ids))
+    try:
+        return await bulk_delete_user_attitudes(plugin.store, request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量删除用户态度失败: {e}")
+
+@router.patch("/groups", response_model=List[BatchItemResult], summary="批量新增或更新群组态度")
+async def batch_update_groups(items: List[GroupAttitudeBatchItem]):
+    """批量新增或更新群组态度，所有写入在同一个事务中执行，返回逐项结果
+
+    store 和数据库中都不存在的群组不会创建，action 为 not_found
+    """
+    _check_batch_size(len(items))
+    updates: Dict[str, Dict[str, Optional[str]]] = {}
+    expected_versions: Dict[str, int] = {}
+    for item in items:
+        # 同一群组出现多次时按顺序合并，后出现的字段覆盖先出现的
+        updates.setdefault(item.group_id, {}).update(item.model_dump(exclude={"group_id", "version"}, exclude_none=True))
+        if item.version is not None:
+            expected_versions.setdefault(item.group_id, item.version)
+    try:
+        return await bulk_update_group_attitudes(plugin.store, updates, expected_versions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量更新群组态度失败: {e}")
+
+@router.delete("/groups", response_model=List[BatchItemResult], summary="批量删除群组态度")
+async def batch_delete_groups(request: BatchDeleteRequest):
+    """批量删除群组态度，所有删除在同一个事务中执行，返回逐项结果"""
+    _check_batch_size(len(request.ids))
+    try:
+        return await bulk_delete_group_attitudes(plugin.store, request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量删除群组态度失败: {e}")
+
+
+@router.get("/search", response_model=SearchResult, summary="按相关度搜索用户或群组态度")
+async def search(
+    q: str = Query(..., min_length=1, description="搜索词，不区分大小写"),
+    scope: str = Query("users", pattern="^(users|groups)$", description="搜索范围: users 或 groups"),
+    page: int = Query(1, ge=1, description="页码，从 1 开始"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="每页数量"),
+):
+    """在内存搜索索引中查找记录，用户在QQ号、用户名、称呼、关系、态度和其他信息中匹配，群组在群号、名称、态度和其他信息中匹配"""
+    search_attitudes = search_user_attitudes if scope == "users" else search_group_attitudes
+    try:
+        started = time.perf_counter()
+        total, hits = await search_attitudes(plugin.store, q, offset=(page - 1) * limit, limit=limit)
+        took_ms = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索失败: {e}")
+    return SearchResult(
+        total=total,
+        took_ms=took_ms,
+        hits=[SearchHit(score=score, record=record) for record, score in hits],
+    )
+
+
+@router.get("/events", summary="订阅态度变更事件 (SSE)")
+async def events(request: Request):
+    """以 Server-Sent Events 推送用户和群组态度的变更
+
+    每条 change 事件的数据为 ChangeEvent，事件 id 为变更后的记录版本号；
+    收到 resync 事件（事件有丢失或断线重连）时，客户端应以 /users?since= 等接口重新同步。
+    """
+    async def stream():
+        queue = change_feed.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            if request.headers.get("last-event-id"):
+                yield "event: resync\ndata: {}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield f"id: {event.version}\nevent: change\ndata: {event.model_dump_json()}\n\n"
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats", summary="获取态度记录缓存统计")
+async def get_cache_stats():
+    """获取用户和群组态度缓存的命中、未命中和淘汰统计"""
+    return cache_stats()
+
+
+@router.get("/status", response_model=ReconcileProgress, summary="获取后台数据校验进度")
+async def get_status():
+    """获取插件启动时后台数据校验的状态和进度"""
+    return get_progress()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="获取 Prometheus 格式的运行指标")
+async def get_metrics():
+    """以 Prometheus 文本格式导出插件运行指标"""
+    for cache_name, stats in cache_stats().items():
+        for field in ("size", "hits", "misses", "evictions", "expirations"):
+            metrics.set(f"cache_{field}", stats[field], cache=cache_name)
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+@File: search_index.py
+@Desc: 态度记录的内存 n-gram 搜索索引
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from .cache import user_cache, group_cache
+from .model import UserAttitude, GroupAttitude
+
+T = TypeVar("T")
+
+# 缓存的排序结果数量，翻页和重复查询直接复用
+RESULT_CACHE_SIZE = 32
+
+# 各字段在排序中的权重
+USER_FIELD_WEIGHTS = {
+    "user_id": 6.0,
+    "username": 4.0,
+    "nickname": 4.0,
+    "relationship": 3.0,
+    "attitude": 2.0,
+    "other": 1.0,
+}
+GROUP_FIELD_WEIGHTS = {
+    "group_id": 6.0,
+    "channel_name": 4.0,
+    "attitude": 2.0,
+    "other": 1.0,
+}
+
+
+def _grams(text: str) -> Set[str]:
+    """返回文本的全部二元和三元片段，中文常见的两字搜索词通过二元片段命中"""
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    return grams
+
+
+def _query_grams(term: str) -> Set[str]:
+    return {term[i:i + 3] for i in range(len(term) - 2)} if len(term) >= 3 else {term}
+
+
+class SearchIndex(Generic[T]):
+    """记录字段上的 n-gram 倒排索引
+
+    候选记录由查询词各片段的倒排表求交集得到，再逐条做包含匹配确认并打分，
+    因此结果与不区分大小写的子串匹配完全一致。单字查询无法利用索引，退化为遍历。
+    索引通过缓存的写入/删除回调保持最新，首次使用前需调用 `ensure_built` 从数据库加载。
+    """
+
+    def __init__(self, key_field: str, weights: Dict[str, float]):
+        """
+        Args:
+            key_field: 记录中作为键的字段
+            weights: 参与索引的字段及其排序权重
+        """
+        self.key_field = key_field
+        self.weights = weights
+        self._docs: Dict[Hashable, Tuple[T, Dict[str, str]]] = {}
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self.ready = False
+        self._lock = asyncio.Lock()
+        # 构建期间被写入或删除过的键，构建时不能用数据库中读到的旧值覆盖它们
+        self._building = False
+        self._touched: Set[Hashable] = set()
+        # 索引内容每次变化都递增，用于判断缓存的排序结果是否仍然有效
+        self._generation = 0
+        self._results: "OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[int, List[Tuple[float, str, Hashable]]]]" = OrderedDict()
+
+    def _texts(self, record: T) -> Dict[str, str]:
+        return {field: str(getattr(record, field, "") or "").lower() for field in self.weights}
+
+    def _put(self, key: Hashable, record: T) -> None:
+        self._remove(key)
+        self._generation += 1
+        texts = self._texts(record)
+        self._docs[key] = (record, texts)
+        for gram in set().union(*(_grams(text) for text in texts.values())):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: Hashable) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._generation += 1
+        for gram in set().union(*(_grams(text) for text in doc[1].values())):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def on_change(self, key: Hashable, record: Optional[T], previous: Optional[T] = None) -> None:
+        """缓存写入/删除回调，record 为 None 表示记录已删除"""
+        if self._building:
+            self._touched.add(key)
+        if record is None:
+            self._remove(key)
+        else:
+            self._put(key, record)
+
+    async def ensure_built(self, loader: Callable[[], AsyncIterator[T]]) -> None:
+        """首次调用时从 loader 加载全部记录建立索引，并发调用只会构建一次"""
+        if self.ready:
+            return
+        async with self._lock:
+            if self.ready:
+                return
+            self._building = True
+            self._touched.clear()
+            try:
+                async for record in loader():
+                    key = getattr(record, self.key_field)
+                    if key not in self._touched:
+                        self._put(key, record)
+                self.ready = True
+            finally:
+                self._building = False
+                self._touched.clear()
+
+    def _candidates(self, term: str) -> Iterable[Hashable]:
+        if len(term) < 2:
+            return list(self._docs)
+        postings = []
+        for gram in _query_grams(term):
+            keys = self._postings.get(gram)
+            if not keys:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def _score(self, term: str, texts: Dict[str, str], fields: Iterable[str]) -> float:
+        score = 0.0
+        for field in fields:
+            text = texts[field]
+            if term in text:
+                # 完全匹配优先于前缀匹配，前缀匹配优先于其他位置的匹配
+                quality = 3.0 if text == term else 2.0 if text.startswith(term) else 1.0
+                score += self.weights[field] * quality
+        return score
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Tuple[int, List[Tuple[T, float]]]:
+        """按相关度搜索记录
+
+        Args:
+            query: 搜索词，不区分大小写
+            offset: 跳过的结果数量
+            limit: 返回的最大数量，None 表示全部
+            fields: 只在这些字段中匹配，默认为全部索引字段
+
+        Returns:
+            Tuple[int, List[Tuple[T, float]]]: (命中总数, 当前页的 (记录, 得分) 列表)，按得分降序排列
+        """
+        term = query.strip().lower()
+        if not term:
+            return 0, []
+        fields = tuple(fields) if fields is not None else tuple(self.weights)
+        cache_key = (term, fields)
+        cached = self._results.get(cache_key)
+        if cached is not None and cached[0] == self._generation:
+            self._results.move_to_end(cache_key)
+            hits = cached[1]
+        else:
+            hits = []
+            for key in self._candidates(term):
+                score = self._score(term, self._docs[key][1], fields)
+                if score > 0:
+                    hits.append((-score, str(key), key))
+            hits.sort()
+            self._results[cache_key] = (self._generation, hits)
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        page = hits[offset:offset + limit] if limit is not None else hits[offset:]
+        return len(hits), [(self._docs[key][0], -neg_score) for neg_score, _, key in page]
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+user_index: SearchIndex[UserAttitude] = SearchIndex("user_id", USER_FIELD_WEIGHTS)
+group_index: SearchIndex[GroupAttitude] = SearchIndex("group_id", GROUP_FIELD_WEIGHTS)
+user_cache.add_listener(user_index.on_change)
+group_cache.add_listener(group_index.on_change)
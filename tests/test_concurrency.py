@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+@File: test_concurrency.py
+@Desc: 同一记录的并发读取与写入，在替身环境中运行，无需 NekroAgent 实例
+
+用法:
+    python -m pytest tests
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import environment  # noqa: E402
+
+environment.load_plugin()
+
+from nekro_plugin_attitude import data_manager  # noqa: E402
+from nekro_plugin_attitude.cache import user_cache, group_cache  # noqa: E402
+from nekro_plugin_attitude.conf import plugin  # noqa: E402
+
+
+def run(scenario) -> None:
+    async def main() -> None:
+        user_cache.clear()
+        group_cache.clear()
+        await environment.init_database()
+        try:
+            await scenario()
+        finally:
+            await environment.close_database()
+
+    asyncio.run(main())
+
+
+class SlowStoreGet:
+    """让 store.get 对指定用户的第一次读取在查询完成后再等待一段时间，模拟读取期间发生写入"""
+
+    def __init__(self, store, user_key: str, delay: float = 0.2):
+        self.store = store
+        self.user_key = user_key
+        self.delay = delay
+        self.original = store.get
+
+    async def get(self, **kwargs):
+        value = await self.original(**kwargs)
+        if self.delay and kwargs.get("user_key") == self.user_key:
+            delay, self.delay = self.delay, 0
+            await asyncio.sleep(delay)
+        return value
+
+    def __enter__(self):
+        self.store.get = self.get
+        return self
+
+    def __exit__(self, *exc_info):
+        self.store.get = self.original
+
+
+def test_read_during_write_does_not_restore_old_record():
+    async def scenario() -> None:
+        store = plugin.store
+        dataset = await environment.seed_dataset(3, [])
+        user_key = dataset.user_keys[0]
+        await data_manager.update_user_attitude(store, user_key, attitude="初始")
+        user_cache.clear()
+
+        with SlowStoreGet(store, user_key):
+            reader = asyncio.create_task(data_manager.get_user_attitude(store, user_key))
+            await asyncio.sleep(0.05)
+            await data_manager.update_user_attitude(store, user_key, attitude="友好")
+            written = (await data_manager.get_user_attitude(store, user_key)).version
+            await reader
+
+        cached = user_cache.get(user_key)
+        assert cached is not None and cached.attitude == "友好" and cached.version == written
+
+        # 基于最新版本号的更新不应冲突，不带版本号的更新不应覆盖其他字段
+        await data_manager.update_user_attitude(store, user_key, relationship="朋友", expected_version=written)
+        await data_manager.update_user_attitude(store, user_key, nickname="小明")
+        stored = await data_manager.get_user_attitude(store, user_key)
+        assert (stored.attitude, stored.relationship, stored.nickname) == ("友好", "朋友", "小明")
+        assert stored.version == written + 2
+
+    run(scenario)
+
+
+def test_locked_update_ignores_stale_cache():
+    async def scenario() -> None:
+        store = plugin.store
+        dataset = await environment.seed_dataset(3, [])
+        user_key = dataset.user_keys[1]
+        await data_manager.update_user_attitude(store, user_key, attitude="初始")
+        stale = await data_manager.get_user_attitude(store, user_key)
+        await data_manager.update_user_attitude(store, user_key, attitude="友好")
+        current = await data_manager.get_user_attitude(store, user_key)
+
+        # 即使缓存中残留旧记录，锁内的读-改-写仍以数据库中的记录为准
+        user_cache.set(user_key, stale)
+        await data_manager.update_user_attitude(store, user_key, other="备注", expected_version=current.version)
+        stored = await store.get(user_key=user_key, store_key="user_info")
+        assert "友好" in stored and "备注" in stored
+
+    run(scenario)
+
+
+def test_batched_read_during_write_does_not_restore_old_record():
+    async def scenario() -> None:
+        store = plugin.store
+        dataset = await environment.seed_dataset(3, [])
+        user_key = dataset.user_keys[2]
+        await data_manager.update_user_attitude(store, user_key, attitude="初始")
+        user_cache.clear()
+
+        started = asyncio.Event()
+        resume = asyncio.Event()
+        original_filter = data_manager.DBPluginData.filter
+
+        class PausedQuery:
+            def __init__(self, queryset):
+                self.queryset = queryset
+
+            async def values_list(self, *args, **kwargs):
+                rows = await self.queryset.values_list(*args, **kwargs)
+                started.set()
+                await resume.wait()
+                return rows
+
+        data_manager.DBPluginData.filter = lambda **kwargs: PausedQuery(original_filter(**kwargs))
+        try:
+            reader = asyncio.create_task(data_manager.get_user_attitudes(store, [user_key]))
+            await started.wait()
+        finally:
+            data_manager.DBPluginData.filter = original_filter
+        await data_manager.update_user_attitude(store, user_key, attitude="友好")
+        resume.set()
+        await reader
+
+        cached = user_cache.get(user_key)
+        assert cached is not None and cached.attitude == "友好"
+
+    run(scenario)
@@ -12,9 +12,10 @@ from nonebot.matcher import Matcher
 from nonebot.params import CommandArg
 
 from .conf import plugin, config
-from .data_manager import update_user_attitude, update_group_attitude
+from .data_manager import queue_user_attitude_update, queue_group_attitude_update, get_user_attitudes, get_group_attitude
 from .model import UserAttitude, GroupAttitude
 from .decorators import retry_on_failure
+from .history import SOURCE_TOOL, recording_source
 
 from nekro_agent.adapters.onebot_v11.tools.onebot_util import get_chat_info_old
 from nekro_agent.api.plugin import SandboxMethodType
@@ -45,7 +46,7 @@ store = plugin.store
     method_type=SandboxMethodType.TOOL,
     name="update_user_attitude",
     description="更新用户态度数据。")
-@retry_on_failure(max_retries=3, delay=1.0)
+@retry_on_failure(max_retries=3, delay=0.5, deadline=3.0)
 async def update_user_attitude_tool(
     _ctx: AgentCtx,
     user_key: str,
@@ -75,13 +76,15 @@ async def update_user_attitude_tool(
         logger.info(f"开始更新用户态度数据: user_key={user_key}, attitude={attitude}, relationship={relationship}")
         
         # 执行更新操作
-        await update_user_attitude(store, user_key, attitude, relationship, other)
+        with recording_source(SOURCE_TOOL):
+            await queue_user_attitude_update(store, user_key, attitude=attitude, relationship=relationship, other=other)
         
         logger.info(f"成功更新用户态度数据: user_key={user_key}")
         
     except DoesNotExist:
         logger.warning(f"用户 {user_key} 不存在，将尝试创建新记录并更新。")
-        await update_user_attitude(store, user_key, attitude, relationship, other)
+        with recording_source(SOURCE_TOOL):
+            await queue_user_attitude_update(store, user_key, attitude=attitude, relationship=relationship, other=other)
     except Exception as e:
         _handle_attitude_update_exception(e, "用户", user_key)
 
@@ -90,7 +93,7 @@ async def update_user_attitude_tool(
     method_type=SandboxMethodType.TOOL,
     name="update_group_attitude",
     description="更新群组态度数据。")
-@retry_on_failure(max_retries=3, delay=1.0)
+@retry_on_failure(max_retries=3, delay=0.5, deadline=3.0)
 async def update_group_attitude_tool(
     _ctx: AgentCtx,
     chat_key: str, 
@@ -119,13 +122,15 @@ async def update_group_attitude_tool(
         logger.info(f"开始更新群组态度数据: chat_key={chat_key}, attitude={attitude}")
         
         # 执行更新操作
-        await update_group_attitude(store, chat_key.split("-")[1], attitude, other)
+        with recording_source(SOURCE_TOOL):
+            await queue_group_attitude_update(store, chat_key.split("-")[1], attitude=attitude, other=other)
         
         logger.info(f"成功更新群组态度数据: chat_key={chat_key}")
         
     except DoesNotExist:
         logger.warning(f"群组 {chat_key} 不存在，将尝试创建新记录并更新。")
-        await update_group_attitude(store, chat_key.split("-")[1], attitude, other)
+        with recording_source(SOURCE_TOOL):
+            await queue_group_attitude_update(store, chat_key.split("-")[1], attitude=attitude, other=other)
     except Exception as e:
         _handle_attitude_update_exception(e, "群组", chat_key)
 
@@ -137,11 +142,10 @@ async def query_attitude(matcher: Matcher, event: MessageEvent, bot: Bot, arg: M
         if chat_key.split("_")[1] != "v11-group":
             await matcher.finish(f"请在群聊中使用此命令查询群组态度。")
 
-        group_info_json = await store.get(chat_key=chat_key.split("-")[1], store_key="group_info")
-        if not group_info_json:
+        group_attitude = await get_group_attitude(store, chat_key.split("-")[1])
+        if group_attitude is None:
             await matcher.finish("尚未记录该群组的态度信息。")
 
-        group_attitude = GroupAttitude.model_validate_json(group_info_json)
         reply_msg = (
             f"群组【{group_attitude.channel_name}】的态度信息：\n"
             f"- 态度: {group_attitude.attitude}\n"
@@ -149,18 +153,23 @@ async def query_attitude(matcher: Matcher, event: MessageEvent, bot: Bot, arg: M
         )
         await matcher.finish(reply_msg)
 
-    else:  # 查询用户
-        user_id = cmd_content.strip()
-        user_info_json = await store.get(user_key=user_id, store_key="user_info")
-        if not user_info_json:
-            await matcher.finish(f"尚未记录用户【{user_id}】的态度信息。")
-
-        user_attitude = UserAttitude.model_validate_json(user_info_json)
-        reply_msg = (
-            f"用户【{user_attitude.username} ({user_attitude.user_id})】的态度信息：\n"
-            f"称呼: {user_attitude.nickname}\n"
-            f"- 态度: {user_attitude.attitude}\n"
-            f"- 关系: {user_attitude.relationship}\n"
-            f"- 其他: {user_attitude.other or '无'}"
-        )
-        await matcher.finish(reply_msg)
\ No newline at end of file
+    else:  # 查询用户，支持以空格分隔一次查询多个用户
+        user_ids = list(dict.fromkeys(cmd_content.split()))
+        user_attitudes = await get_user_attitudes(store, user_ids)
+        if not user_attitudes:
+            await matcher.finish(f"尚未记录用户【{'、'.join(user_ids)}】的态度信息。")
+
+        reply_parts = []
+        for user_id in user_ids:
+            user_attitude = user_attitudes.get(user_id)
+            if user_attitude is None:
+                reply_parts.append(f"尚未记录用户【{user_id}】的态度信息。")
+                continue
+            reply_parts.append(
+                f"用户【{user_attitude.username} ({user_attitude.user_id})】的态度信息：\n"
+                f"称呼: {user_attitude.nickname}\n"
+                f"- 态度: {user_attitude.attitude}\n"
+                f"- 关系: {user_attitude.relationship}\n"
+                f"- 其他: {user_attitude.other or '无'}"
+            )
+        await matcher.finish("\n\n".join(reply_parts))
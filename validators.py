@@ -5,12 +5,14 @@
 @File: validators.py
 @Desc: 数据验证模块
 """
-import json
 from pydantic import ValidationError
 from nekro_agent.api.core import logger
 from nekro_agent.models.db_user import DBUser
 from nekro_agent.models.db_chat_channel import DBChatChannel
 from .model import UserAttitude, GroupAttitude
+from .cache import user_cache, group_cache
+from .locks import user_locks, group_locks
+from .codec import decode_record, encode_record, load_fields
 
 async def validate_data_with_models(store) -> bool:
     """
@@ -32,7 +34,7 @@ async def validate_data_with_models(store) -> bool:
         stored_user_json = await store.get(user_key=user_key, store_key="user_info")
         if stored_user_json:
             try:
-                UserAttitude.model_validate_json(stored_user_json)
+                decode_record(UserAttitude, stored_user_json)
             except ValidationError as e:
                 logger.error(f"用户 {user_key} 的数据验证失败: {e}")
                 all_valid = False
@@ -49,7 +51,7 @@ async def validate_data_with_models(store) -> bool:
         stored_group_json = await store.get(chat_key=group_key, store_key="group_info")
         if stored_group_json:
             try:
-                GroupAttitude.model_validate_json(stored_group_json)
+                decode_record(GroupAttitude, stored_group_json)
             except ValidationError as e:
                 logger.error(f"群组 {group_key} 的数据验证失败: {e}")
                 all_valid = False
@@ -69,6 +71,8 @@ async def repair_data_models(store) -> bool:
     """
     验证并修复存储中的用户和群组数据。
 
+    每条记录的读取、修复和写入在该键的锁内完成，修复后的版本号在旧数据的基础上递增。
+
     Args:
         store: 插件数据存储对象。
 
@@ -81,91 +85,113 @@ async def repair_data_models(store) -> bool:
     # 1. 修复用户数据
     users_from_db = await DBUser.filter(id__not=1)
     for user in users_from_db:
-        user_key = user.platform_userid
-        stored_user_json = await store.get(user_key=user_key, store_key="user_info")
-        
-        try:
-            if stored_user_json:
-                # 尝试验证，如果失败则进入修复流程
-                UserAttitude.model_validate_json(stored_user_json)
-            else:
-                # 如果数据不存在，直接触发修复（创建）
-                raise ValueError("用户数据不存在")
-        except (ValidationError, ValueError) as e:
-            logger.warning(f"用户 {user_key} 的数据需要修复: {e}")
-            try:
-                # 尝试从旧数据恢复
-                old_data = {}
-                if stored_user_json:
-                    try:
-                        old_data = json.loads(stored_user_json)
-                    except json.JSONDecodeError:
-                        logger.error(f"无法解析用户 {user_key} 的旧数据，将使用默认值。")
-                        old_data = {}
-
-                # 创建新的模型实例，并填充数据
-                repaired_user = UserAttitude(
-                    id=user.id,
-                    user_id=user.platform_userid,
-                    username=user.username,
-                    nickname=old_data.get("nickname", ""),
-                    attitude=old_data.get("attitude", ""),
-                    relationship=old_data.get("relationship", ""),
-                    other=old_data.get("other", ""),
-                )
-                
-                await store.set(
-                    user_key=user_key,
-                    store_key="user_info",
-                    value=repaired_user.model_dump_json()
-                )
-                logger.info(f"用户 {user_key} 的数据已修复。")
-            except Exception as repair_e:
-                logger.error(f"修复用户 {user_key} 的数据失败: {repair_e}")
-                repair_successful = False
+        async with user_locks.hold(user.platform_userid):
+            repair_successful &= await _repair_user(store, user)
 
     # 2. 修复群组数据
     groups_from_db = await DBChatChannel.filter(channel_type="group")
     for group in groups_from_db:
-        group_key = group.channel_id
-        stored_group_json = await store.get(chat_key=group_key, store_key="group_info")
-
-        try:
-            if stored_group_json:
-                GroupAttitude.model_validate_json(stored_group_json)
-            else:
-                raise ValueError("群组数据不存在")
-        except (ValidationError, ValueError) as e:
-            logger.warning(f"群组 {group_key} 的数据需要修复: {e}")
-            try:
-                old_data = {}
-                if stored_group_json:
-                    try:
-                        old_data = json.loads(stored_group_json)
-                    except json.JSONDecodeError:
-                        logger.error(f"无法解析群组 {group_key} 的旧数据，将使用默认值。")
-                        old_data = {}
-
-                repaired_group = GroupAttitude(
-                    id=group.id,
-                    group_id=group.channel_id,
-                    channel_name=group.channel_name,
-                    attitude=old_data.get("attitude", ""),
-                    other=old_data.get("other", ""),
-                )
-                await store.set(
-                    chat_key=group_key,
-                    store_key="group_info",
-                    value=repaired_group.model_dump_json()
-                )
-                logger.info(f"群组 {group_key} 的数据已修复。")
-            except Exception as repair_e:
-                logger.error(f"修复群组 {group_key} 的数据失败: {repair_e}")
-                repair_successful = False
+        async with group_locks.hold(group.channel_id):
+            repair_successful &= await _repair_group(store, group)
 
     if repair_successful:
         logger.debug("Attitude 插件数据模型修复完成。")
     else:
         logger.error("Attitude 插件数据模型修复过程中出现错误。")
 
-    return repair_successful
\ No newline at end of file
+    return repair_successful
+
+
+def _repaired_version(old_data: dict) -> int:
+    """修复同样是一次写入，能读出旧版本号时在其基础上递增"""
+    old_version = old_data.get("version")
+    return old_version + 1 if type(old_version) is int else 0
+
+
+async def _repair_user(store, user: DBUser) -> bool:
+    """验证并修复单个用户的数据，调用方需持有该用户的锁"""
+    user_key = user.platform_userid
+    stored_user_json = await store.get(user_key=user_key, store_key="user_info")
+
+    try:
+        if stored_user_json:
+            # 尝试验证，如果失败则进入修复流程
+            decode_record(UserAttitude, stored_user_json)
+        else:
+            # 如果数据不存在，直接触发修复（创建）
+            raise ValueError("用户数据不存在")
+    except (ValidationError, ValueError) as e:
+        logger.warning(f"用户 {user_key} 的数据需要修复: {e}")
+        try:
+            # 尝试从旧数据恢复
+            old_data = {}
+            if stored_user_json:
+                old_data = load_fields(UserAttitude, stored_user_json)
+                if old_data is None:
+                    logger.error(f"无法解析用户 {user_key} 的旧数据，将使用默认值。")
+                    old_data = {}
+
+            # 创建新的模型实例，并填充数据
+            repaired_user = UserAttitude(
+                id=user.id,
+                user_id=user.platform_userid,
+                username=user.username,
+                nickname=old_data.get("nickname", ""),
+                attitude=old_data.get("attitude", ""),
+                relationship=old_data.get("relationship", ""),
+                other=old_data.get("other", ""),
+                version=_repaired_version(old_data),
+            )
+
+            await store.set(
+                user_key=user_key,
+                store_key="user_info",
+                value=encode_record(repaired_user)
+            )
+            user_cache.write(user_key, repaired_user)
+            logger.info(f"用户 {user_key} 的数据已修复。")
+        except Exception as repair_e:
+            logger.error(f"修复用户 {user_key} 的数据失败: {repair_e}")
+            return False
+    return True
+
+
+async def _repair_group(store, group: DBChatChannel) -> bool:
+    """验证并修复单个群组的数据，调用方需持有该群组的锁"""
+    group_key = group.channel_id
+    stored_group_json = await store.get(chat_key=group_key, store_key="group_info")
+
+    try:
+        if stored_group_json:
+            decode_record(GroupAttitude, stored_group_json)
+        else:
+            raise ValueError("群组数据不存在")
+    except (ValidationError, ValueError) as e:
+        logger.warning(f"群组 {group_key} 的数据需要修复: {e}")
+        try:
+            old_data = {}
+            if stored_group_json:
+                old_data = load_fields(GroupAttitude, stored_group_json)
+                if old_data is None:
+                    logger.error(f"无法解析群组 {group_key} 的旧数据，将使用默认值。")
+                    old_data = {}
+
+            repaired_group = GroupAttitude(
+                id=group.id,
+                group_id=group.channel_id,
+                channel_name=group.channel_name,
+                attitude=old_data.get("attitude", ""),
+                other=old_data.get("other", ""),
+                version=_repaired_version(old_data),
+            )
+            await store.set(
+                chat_key=group_key,
+                store_key="group_info",
+                value=encode_record(repaired_group)
+            )
+            group_cache.write(group_key, repaired_group)
+            logger.info(f"群组 {group_key} 的数据已修复。")
+        except Exception as repair_e:
+            logger.error(f"修复群组 {group_key} 的数据失败: {repair_e}")
+            return False
+    return True
@@ -18,6 +18,8 @@ function updateBaseUrl() {
             BASE_URL = `http://${newHost}:8021/plugins/yang208115.nekro_plugin_attitude`;
         }
         console.log('BASE_URL已更新为:', BASE_URL);
+        // 服务器地址变化后重新订阅变更事件
+        if (changeEvents) connectChangeEvents();
     }
 }
 
@@ -31,9 +33,9 @@ function showResponse(elementId, data, isError = false) {
     if (!showDevInfo) {
         // 如果是获取用户或群组的响应，更新统计数据
         if (elementId === 'users-response' && !isError) {
-            updateUserStats(data.data);
+            updateUserStats(data.data, data.total);
         } else if (elementId === 'groups-response' && !isError) {
-            updateGroupStats(data.data);
+            updateGroupStats(data.data, data.total);
         }
         return;
     }
@@ -54,18 +56,19 @@ function showResponse(elementId, data, isError = false) {
     
     // 如果是获取用户或群组的响应，更新统计数据
     if (elementId === 'users-response' && !isError) {
-        updateUserStats(data.data);
+        updateUserStats(data.data, data.total);
     } else if (elementId === 'groups-response' && !isError) {
-        updateGroupStats(data.data);
+        updateGroupStats(data.data, data.total);
     }
 }
 
 // 更新用户统计数据
-function updateUserStats(data) {
+function updateUserStats(data, total) {
     if (!Array.isArray(data)) return;
     
-    // 更新用户总数
-    document.getElementById('user-count').textContent = data.length;           
+    // 更新用户总数，搜索结果的数量不代表用户总数，此时不更新
+    if (total === null) return;
+    document.getElementById('user-count').textContent = total !== undefined ? total : data.length;           
     // 计算消极态度数 - 不再需要更新到页面，但保留计算逻辑以备将来使用
     let negativeCount = 0;
     
@@ -91,11 +94,12 @@ function updateUserStats(data) {
 }
 
 // 更新群组统计数据
-function updateGroupStats(data) {
+function updateGroupStats(data, total) {
     if (!Array.isArray(data)) return;
     
-    // 更新群组总数
-    document.getElementById('group-count').textContent = data.length;
+    // 更新群组总数，搜索结果的数量不代表群组总数，此时不更新
+    if (total === null) return;
+    document.getElementById('group-count').textContent = total !== undefined ? total : data.length;
     
     // 计算消极态度数 - 不再需要更新到页面，但保留计算逻辑以备将来使用
     let negativeCount = 0;
@@ -121,28 +125,65 @@ function updateGroupStats(data) {
     // 消极态度数卡片已被移除，不再更新
 }
 
-// 获取所有用户态度
-let allUsers = [];
-let filteredUsers = [];
+// 获取所有用户态度（分页、搜索和排序均在服务端完成）
+let currentUsers = [];
+let totalUsers = 0;
 let currentUserPage = 1;
 let usersPerPage = 10;
-let userSortColumn = 0;
+let userSortColumn = null;
 let userSortDirection = 'asc';
+let userSearchTimer = null;
+// 正在编辑的用户及读取时的版本号，提交时用于检测并发修改
+let editingUser = null;
+
+// 表头列序号到服务端排序字段的映射
+const USER_SORT_FIELDS = {
+    0: 'user_id',
+    1: 'username',
+    2: 'attitude',
+    3: 'relationship',
+    4: 'nickname'
+};
+
+// 构建用户列表的查询参数
+function buildUserQuery(paged = true) {
+    const params = new URLSearchParams();
+    const searchTerm = document.getElementById('user-search').value.trim();
+    if (searchTerm) params.set('search', searchTerm);
+    if (userSortColumn !== null) {
+        params.set('sort', USER_SORT_FIELDS[userSortColumn]);
+        params.set('order', userSortDirection);
+    }
+    if (paged) {
+        params.set('page', currentUserPage);
+        params.set('limit', usersPerPage);
+    }
+    return params.toString();
+}
 
 async function getAllUsers() {
     try {
-        const response = await fetch(`${BASE_URL}/users`);
+        const response = await fetch(`${BASE_URL}/users?${buildUserQuery()}`);
         const data = await response.json();
         
         if (response.ok) {
+            // 保存当前页数据和满足条件的总数
+            currentUsers = data;
+            totalUsers = parseInt(response.headers.get('X-Total-Count')) || data.length;
+            
+            const isSearching = document.getElementById('user-search').value.trim() !== '';
             showResponse('users-response', {
                 status: response.status,
+                total: isSearching ? null : totalUsers,
                 data: data
             });
             
-            // 保存所有用户数据
-            allUsers = data;
-            filteredUsers = [...allUsers];
+            // 当前页超出范围时（例如删除了最后一页的数据）回到最后一页
+            const totalPages = Math.ceil(totalUsers / usersPerPage) || 1;
+            if (currentUserPage > totalPages) {
+                currentUserPage = totalPages;
+                return getAllUsers();
+            }
             
             // 显示表格容器
             document.getElementById('users-table-container').style.display = 'block';
@@ -165,21 +206,21 @@ function updateUsersTable() {
     const tableBody = document.getElementById('users-table-body');
     tableBody.innerHTML = '';
     
-    // 计算当前页的数据
+    // 当前页的数据已由服务端分页返回
     const startIndex = (currentUserPage - 1) * usersPerPage;
-    const endIndex = Math.min(startIndex + usersPerPage, filteredUsers.length);
-    const currentPageData = filteredUsers.slice(startIndex, endIndex);
+    const endIndex = startIndex + currentUsers.length;
+    const currentPageData = currentUsers;
     
     // 更新显示信息
-    document.getElementById('users-showing-start').textContent = filteredUsers.length > 0 ? startIndex + 1 : 0;
+    document.getElementById('users-showing-start').textContent = currentUsers.length > 0 ? startIndex + 1 : 0;
     document.getElementById('users-showing-end').textContent = endIndex;
-    document.getElementById('users-total-count').textContent = filteredUsers.length;
+    document.getElementById('users-total-count').textContent = totalUsers;
     document.getElementById('users-current-page').textContent = currentUserPage;
-    document.getElementById('users-total-pages').textContent = Math.ceil(filteredUsers.length / usersPerPage) || 1;
+    document.getElementById('users-total-pages').textContent = Math.ceil(totalUsers / usersPerPage) || 1;
     
     // 禁用/启用分页按钮
     document.getElementById('users-prev-page').disabled = currentUserPage === 1;
-    document.getElementById('users-next-page').disabled = currentUserPage >= Math.ceil(filteredUsers.length / usersPerPage);
+    document.getElementById('users-next-page').disabled = currentUserPage >= Math.ceil(totalUsers / usersPerPage);
     
     // 填充表格数据
     currentPageData.forEach(user => {
@@ -259,6 +300,7 @@ function updateUsersTable() {
             document.getElementById('user-other').value = user.other || '';
             document.getElementById('user-username').value = user.username || ''; // 新增
             document.getElementById('user-nickname').value = user.nickname || ''; // 新增
+            editingUser = { id: user.user_id, version: user.version };
         };
         
         const deleteBtn = document.createElement('button');
@@ -278,23 +320,14 @@ function updateUsersTable() {
     });
 }
 
-// 筛选用户表格
+// 筛选用户表格（输入停止后再请求服务端，避免每次按键都发起请求）
 function filterUserTable() {
-    const searchTerm = document.getElementById('user-search').value.toLowerCase();
-    
-    filteredUsers = allUsers.filter(user => {
-        // 搜索条件 - 匹配QQ号、用户名、称呼或关系
-        const matchesSearch = (typeof user.user_id === 'string' ? user.user_id.toLowerCase().includes(searchTerm) : String(user.user_id).toLowerCase().includes(searchTerm)) ||
-                              (user.username && user.username.toLowerCase().includes(searchTerm)) ||
-                              (user.nickname && user.nickname.toLowerCase().includes(searchTerm)) ||
-                              (user.relationship && user.relationship.toLowerCase().includes(searchTerm));
-        
-        return matchesSearch;
-    });
-    
-    // 重置到第一页并更新表格
-    currentUserPage = 1;
-    updateUsersTable();
+    clearTimeout(userSearchTimer);
+    userSearchTimer = setTimeout(() => {
+        // 重置到第一页并重新获取
+        currentUserPage = 1;
+        getAllUsers();
+    }, 300);
 }
 
 // 排序用户表格
@@ -308,72 +341,63 @@ function sortUserTable(columnIndex) {
         userSortDirection = 'asc';
     }
     
-    filteredUsers.sort((a, b) => {
-        let valueA, valueB;
-        
-        if (columnIndex === 0) {
-            // 按QQ号排序
-            valueA = a.id;
-            valueB = b.id;
-        } else if (columnIndex === 1) {
-            // 按用户名称排序
-            valueA = a.username || ('用户_' + (typeof a.user_id === 'string' ? a.user_id.substring(0, 5) : a.user_id));
-            valueB = b.username || ('用户_' + (typeof b.user_id === 'string' ? b.user_id.substring(0, 5) : b.user_id));
-        } else if (columnIndex === 4) {
-            // 按称呼排序
-            valueA = a.nickname || a.username || '无称呼';
-            valueB = b.nickname || b.username || '无称呼';
-        } else if (columnIndex === 2) {
-            // 按态度值排序，将null值视为最小
-            valueA = a.attitude === null ? -Infinity : parseFloat(a.attitude);
-            valueB = b.attitude === null ? -Infinity : parseFloat(b.attitude);
-        } else if (columnIndex === 3) {
-            // 按关系排序
-            valueA = a.relationship || '';
-            valueB = b.relationship || '';
-        }
-        
-        // 根据排序方向比较
-        if (userSortDirection === 'asc') {
-            return valueA > valueB ? 1 : -1;
-        } else {
-            return valueA < valueB ? 1 : -1;
-        }
-    });
-    
-    updateUsersTable();
+    currentUserPage = 1;
+    getAllUsers();
 }
 
 // 更改每页显示数量
 function changeUsersPerPage() {
     usersPerPage = parseInt(document.getElementById('users-per-page').value);
     currentUserPage = 1; // 重置到第一页
-    updateUsersTable();
+    getAllUsers();
 }
 
 // 上一页
 function prevUsersPage() {
     if (currentUserPage > 1) {
         currentUserPage--;
-        updateUsersTable();
+        getAllUsers();
     }
 }
 
 // 下一页
 function nextUsersPage() {
-    if (currentUserPage < Math.ceil(filteredUsers.length / usersPerPage)) {
+    if (currentUserPage < Math.ceil(totalUsers / usersPerPage)) {
         currentUserPage++;
-        updateUsersTable();
+        getAllUsers();
     }
 }
 
-// 导出用户数据
-function exportUserData() {
+// 导出全部用户数据为CSV（由服务端流式生成，浏览器直接下载，不经过页面内存）
+function exportUserCsv() {
+    const link = document.createElement("a");
+    link.setAttribute("href", `${BASE_URL}/export/users?format=csv`);
+    link.setAttribute("download", "用户态度数据.csv");
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// 导出用户数据（导出满足当前搜索条件的全部用户，而不仅是当前页）
+async function exportUserData() {
+    let users;
+    try {
+        const response = await fetch(`${BASE_URL}/users?${buildUserQuery(false)}`);
+        users = await response.json();
+        if (!response.ok) {
+            showToast(`导出失败: ${users.detail || response.status}`);
+            return;
+        }
+    } catch (error) {
+        showToast(`导出失败: ${error.message}`);
+        return;
+    }
+    
     // 创建JSON数据
     const jsonData = {
         version: "0.0.2",
         type: "users",
-        data: filteredUsers.map(user => ({
+        data: users.map(user => ({
             user_id: user.user_id,
             username: user.username || null,
             nickname: user.nickname || null,
@@ -421,7 +445,9 @@ async function updateUser() {
     requestBody.other = other;
     requestBody.username = username;
     requestBody.nickname = nickname;
-
+    if (editingUser && editingUser.id === userId && editingUser.version !== undefined) {
+        requestBody.version = editingUser.version;
+    }
     
     try {
         const response = await fetch(`${BASE_URL}/users/${userId}`, {
@@ -440,9 +466,19 @@ async function updateUser() {
                 message: '用户态度更新成功',
                 data: data
             });
+            editingUser = { id: data.user_id, version: data.version };
             
             // 更新后刷新用户列表
             getAllUsers();
+        } else if (response.status === 409) {
+            // 记录在编辑期间被其他人修改，刷新后让用户重新编辑
+            editingUser = null;
+            showResponse('user-update-response', {
+                status: response.status,
+                error: data
+            }, true);
+            showToast('记录已被其他人修改，列表已刷新，请重新编辑后提交');
+            getAllUsers();
         } else {
             showResponse('user-update-response', {
                 status: response.status,
@@ -456,27 +492,61 @@ async function updateUser() {
 }
 
 // 获取所有群组态度
-let allGroups = [];
-let filteredGroups = [];
+let currentGroups = [];
+let totalGroups = 0;
 let currentGroupPage = 1;
 let groupsPerPage = 10;
-let groupSortColumn = 0;
+let groupSortColumn = null;
 let groupSortDirection = 'asc';
+let groupSearchTimer = null;
+let editingGroup = null;
+
+// 表头列序号到服务端排序字段的映射
+const GROUP_SORT_FIELDS = {
+    0: 'group_id',
+    1: 'channel_name',
+    2: 'attitude'
+};
+
+// 构建群组列表的查询参数
+function buildGroupQuery(paged = true) {
+    const params = new URLSearchParams();
+    const searchTerm = document.getElementById('group-search').value.trim();
+    if (searchTerm) params.set('search', searchTerm);
+    if (groupSortColumn !== null) {
+        params.set('sort', GROUP_SORT_FIELDS[groupSortColumn]);
+        params.set('order', groupSortDirection);
+    }
+    if (paged) {
+        params.set('page', currentGroupPage);
+        params.set('limit', groupsPerPage);
+    }
+    return params.toString();
+}
 
 async function getAllGroups() {
     try {
-        const response = await fetch(`${BASE_URL}/groups`);
+        const response = await fetch(`${BASE_URL}/groups?${buildGroupQuery()}`);
         const data = await response.json();
         
         if (response.ok) {
+            // 保存当前页数据和满足条件的总数
+            currentGroups = data;
+            totalGroups = parseInt(response.headers.get('X-Total-Count')) || data.length;
+            
+            const isSearching = document.getElementById('group-search').value.trim() !== '';
             showResponse('groups-response', {
                 status: response.status,
+                total: isSearching ? null : totalGroups,
                 data: data
             });
             
-            // 保存所有群组数据
-            allGroups = data;
-            filteredGroups = [...allGroups];
+            // 当前页超出范围时（例如删除了最后一页的数据）回到最后一页
+            const totalPages = Math.ceil(totalGroups / groupsPerPage) || 1;
+            if (currentGroupPage > totalPages) {
+                currentGroupPage = totalPages;
+                return getAllGroups();
+            }
             
             // 显示表格容器
             document.getElementById('groups-table-container').style.display = 'block';
@@ -499,21 +569,21 @@ function updateGroupsTable() {
     const tableBody = document.getElementById('groups-table-body');
     tableBody.innerHTML = '';
     
-    // 计算当前页的数据
+    // 当前页的数据已由服务端分页返回
     const startIndex = (currentGroupPage - 1) * groupsPerPage;
-    const endIndex = Math.min(startIndex + groupsPerPage, filteredGroups.length);
-    const currentPageData = filteredGroups.slice(startIndex, endIndex);
+    const endIndex = startIndex + currentGroups.length;
+    const currentPageData = currentGroups;
     
     // 更新显示信息
-    document.getElementById('groups-showing-start').textContent = filteredGroups.length > 0 ? startIndex + 1 : 0;
+    document.getElementById('groups-showing-start').textContent = currentGroups.length > 0 ? startIndex + 1 : 0;
     document.getElementById('groups-showing-end').textContent = endIndex;
-    document.getElementById('groups-total-count').textContent = filteredGroups.length;
+    document.getElementById('groups-total-count').textContent = totalGroups;
     document.getElementById('groups-current-page').textContent = currentGroupPage;
-    document.getElementById('groups-total-pages').textContent = Math.ceil(filteredGroups.length / groupsPerPage) || 1;
+    document.getElementById('groups-total-pages').textContent = Math.ceil(totalGroups / groupsPerPage) || 1;
     
     // 禁用/启用分页按钮
     document.getElementById('groups-prev-page').disabled = currentGroupPage === 1;
-    document.getElementById('groups-next-page').disabled = currentGroupPage >= Math.ceil(filteredGroups.length / groupsPerPage);
+    document.getElementById('groups-next-page').disabled = currentGroupPage >= Math.ceil(totalGroups / groupsPerPage);
     
     // 填充表格数据
     currentPageData.forEach(group => {
@@ -576,6 +646,7 @@ function updateGroupsTable() {
         editBtn.onclick = function() {
             document.getElementById('group-id').value = group.group_id;
             document.getElementById('group-attitude').value = group.attitude !== null ? group.attitude : '';
+            editingGroup = { id: group.group_id, version: group.version };
         };
         
         const deleteBtn = document.createElement('button');
@@ -595,29 +666,14 @@ function updateGroupsTable() {
     });
 }
 
-// 筛选群组表格
+// 筛选群组表格（输入停止后再请求服务端，避免每次按键都发起请求）
 function filterGroupTable() {
-    const searchTerm = document.getElementById('group-search').value.toLowerCase();
-    
-    filteredGroups = allGroups.filter(group => {
-        // 搜索条件 - 匹配群号或群组名称
-        const groupName = group.channel_name || ('group_' + (typeof group.group_id === 'string' ? group.group_id.substring(0, 5) : group.group_id));
-        
-        // 处理群号搜索 - 如果group_id是group_开头的格式，提取后面的数字部分进行匹配
-        let searchableGroupId = group.group_id;
-        if (typeof group.group_id === 'string' && group.group_id.startsWith('group_')) {
-            searchableGroupId = group.group_id.substring(6); // 去掉'group_'前缀
-        }
-        
-        const matchesSearch = (typeof searchableGroupId === 'string' ? searchableGroupId.toLowerCase() : String(searchableGroupId).toLowerCase()).includes(searchTerm) ||
-                                (typeof groupName === 'string' ? groupName.toLowerCase() : String(groupName).toLowerCase()).includes(searchTerm);
-        
-        return matchesSearch;
-    });
-    
-    // 重置到第一页并更新表格
-    currentGroupPage = 1;
-    updateGroupsTable();
+    clearTimeout(groupSearchTimer);
+    groupSearchTimer = setTimeout(() => {
+        // 重置到第一页并重新获取
+        currentGroupPage = 1;
+        getAllGroups();
+    }, 300);
 }
 
 // 排序群组表格
@@ -631,64 +687,63 @@ function sortGroupTable(columnIndex) {
         groupSortDirection = 'asc';
     }
     
-    filteredGroups.sort((a, b) => {
-        let valueA, valueB;
-        
-        if (columnIndex === 0) {
-            // 按群号排序
-            valueA = a.group_id;
-            valueB = b.group_id;
-        } else if (columnIndex === 1) {
-            // 按群组名称排序
-            valueA = a.channel_name || ('group_' + (typeof a.group_id === 'string' ? a.group_id.substring(0, 5) : a.group_id));
-            valueB = b.channel_name || ('group_' + (typeof b.group_id === 'string' ? b.group_id.substring(0, 5) : b.group_id));
-        } else if (columnIndex === 2) {
-            // 按态度值排序，将null值视为最小
-            valueA = a.attitude === null ? -Infinity : parseFloat(a.attitude);
-            valueB = b.attitude === null ? -Infinity : parseFloat(b.attitude);
-        }
-        
-        // 根据排序方向比较
-        if (groupSortDirection === 'asc') {
-            return valueA > valueB ? 1 : -1;
-        } else {
-            return valueA < valueB ? 1 : -1;
-        }
-    });
-    
-    updateGroupsTable();
+    currentGroupPage = 1;
+    getAllGroups();
 }
 
 // 更改每页显示数量
 function changeGroupsPerPage() {
     groupsPerPage = parseInt(document.getElementById('groups-per-page').value);
     currentGroupPage = 1; // 重置到第一页
-    updateGroupsTable();
+    getAllGroups();
 }
 
 // 上一页
 function prevGroupsPage() {
     if (currentGroupPage > 1) {
         currentGroupPage--;
-        updateGroupsTable();
+        getAllGroups();
     }
 }
 
 // 下一页
 function nextGroupsPage() {
-    if (currentGroupPage < Math.ceil(filteredGroups.length / groupsPerPage)) {
+    if (currentGroupPage < Math.ceil(totalGroups / groupsPerPage)) {
         currentGroupPage++;
-        updateGroupsTable();
+        getAllGroups();
     }
 }
 
-// 导出群组数据
-function exportGroupData() {
+// 导出全部群组数据为CSV（由服务端流式生成，浏览器直接下载，不经过页面内存）
+function exportGroupCsv() {
+    const link = document.createElement("a");
+    link.setAttribute("href", `${BASE_URL}/export/groups?format=csv`);
+    link.setAttribute("download", "群组态度数据.csv");
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// 导出群组数据（导出满足当前搜索条件的全部群组，而不仅是当前页）
+async function exportGroupData() {
+    let groups;
+    try {
+        const response = await fetch(`${BASE_URL}/groups?${buildGroupQuery(false)}`);
+        groups = await response.json();
+        if (!response.ok) {
+            showToast(`导出失败: ${groups.detail || response.status}`);
+            return;
+        }
+    } catch (error) {
+        showToast(`导出失败: ${error.message}`);
+        return;
+    }
+    
     // 创建JSON数据
     const jsonData = {
         version: "0.0.2",
         type: "groups",
-        data: filteredGroups.map(group => ({
+        data: groups.map(group => ({
             id: group.group_id,
             name: group.channel_name || ('group_' + (typeof group.group_id === 'string' ? group.group_id.substring(0, 5) : group.group_id)),
             attitude: group.attitude === null ? null : group.attitude,
@@ -728,6 +783,9 @@ async function updateGroup() {
     const requestBody = {};
     if (attitude !== null) requestBody.attitude = attitude;
     if (other) requestBody.other = other;
+    if (editingGroup && editingGroup.id === groupId && editingGroup.version !== undefined) {
+        requestBody.version = editingGroup.version;
+    }
     
     try {
         const response = await fetch(`${BASE_URL}/groups/${groupId}`, {
@@ -746,9 +804,19 @@ async function updateGroup() {
                 message: '群组态度更新成功',
                 data: data
             });
+            editingGroup = { id: data.group_id, version: data.version };
             
             // 更新后刷新群组列表
             getAllGroups();
+        } else if (response.status === 409) {
+            // 记录在编辑期间被其他人修改，刷新后让用户重新编辑
+            editingGroup = null;
+            showResponse('group-update-response', {
+                status: response.status,
+                error: data
+            }, true);
+            showToast('记录已被其他人修改，列表已刷新，请重新编辑后提交');
+            getAllGroups();
         } else {
             showResponse('group-update-response', {
                 status: response.status,
@@ -871,6 +939,48 @@ async function runAllTests() {
     getAllGroups();
 }
 
+// 订阅服务端的态度变更事件，使多个打开的管理页面无需轮询即可保持同步
+let changeEvents = null;
+let usersRefreshTimer = null;
+let groupsRefreshTimer = null;
+
+// 短时间内的多次变更合并为一次刷新
+function scheduleUsersRefresh() {
+    clearTimeout(usersRefreshTimer);
+    usersRefreshTimer = setTimeout(getAllUsers, 300);
+}
+
+function scheduleGroupsRefresh() {
+    clearTimeout(groupsRefreshTimer);
+    groupsRefreshTimer = setTimeout(getAllGroups, 300);
+}
+
+function applyChangeEvent(change) {
+    const isUser = change.kind === 'user';
+    const rows = isUser ? currentUsers : currentGroups;
+    const keyField = isUser ? 'user_id' : 'group_id';
+    const row = rows.find(item => item[keyField] === change.key);
+    if (change.op === 'upsert' && row) {
+        // 当前页中的记录直接就地更新
+        Object.assign(row, change.fields);
+        isUser ? updateUsersTable() : updateGroupsTable();
+    } else {
+        // 新增、删除或不在当前页的记录可能影响分页和排序，重新获取当前页
+        isUser ? scheduleUsersRefresh() : scheduleGroupsRefresh();
+    }
+}
+
+function connectChangeEvents() {
+    if (changeEvents) changeEvents.close();
+    changeEvents = new EventSource(`${BASE_URL}/events`);
+    changeEvents.addEventListener('change', event => applyChangeEvent(JSON.parse(event.data)));
+    // 事件有丢失或断线重连后重新获取当前页
+    changeEvents.addEventListener('resync', () => {
+        scheduleUsersRefresh();
+        scheduleGroupsRefresh();
+    });
+}
+
 // 页面加载完成后执行
 window.addEventListener('load', () => {
     // 从地址栏获取主机名并设置到IP输入框
@@ -892,6 +1002,7 @@ window.addEventListener('load', () => {
 
     getAllUsers();
     getAllGroups();
+    connectChangeEvents();
 
     // 默认打开用户管理标签页
     document.getElementById('users-tab').style.display = 'block';